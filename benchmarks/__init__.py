@@ -0,0 +1,16 @@
+"""Benchmarks for the tracker, analytics and Flask routes.
+
+    python -m benchmarks generate --months 12 --expenses 5000 --categories 40 --out data/
+    python -m benchmarks run --expenses 5000 --output results.json
+    python -m benchmarks compare baseline.json results.json --threshold 0.2
+    python -m benchmarks storage --expenses 5000
+
+Every run builds its dataset in a fresh temporary directory, so the working
+copy's data.json and analytics.db are never touched.
+"""
+import os
+import sys
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "server")
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
@@ -0,0 +1,80 @@
+import argparse
+import sys
+
+from benchmarks import compare, dataset, payloads, storage, suite
+
+def _add_scale(parser):
+    parser.add_argument("--months", type=int, default=12,
+                        help=f"months of history, from January {dataset.START_YEAR}")
+    parser.add_argument("--expenses", type=int, default=1000, help="expenses per month")
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="write data.json and CSVs for a synthetic dataset")
+    _add_scale(generate)
+    generate.add_argument("--out", default=".", help="directory to write into")
+
+    run = commands.add_parser("run", help="time every case and write JSON results")
+    _add_scale(run)
+    run.add_argument("--repeat", type=int, default=suite.REPEAT)
+    run.add_argument("--only", help="only run cases whose name contains this")
+    run.add_argument("--output", default="benchmark-results.json")
+    run.add_argument("--baseline", help="compare against this result file afterwards")
+    run.add_argument("--threshold", type=float, default=0.2)
+
+    memory = commands.add_parser(
+        "storage", help="bytes per expense and total accuracy against dicts of floats")
+    _add_scale(memory)
+    memory.add_argument("--updates", type=int, default=storage.UPDATES)
+
+    check = commands.add_parser("compare", help="compare two result files; exit 1 on regression")
+    check.add_argument("baseline")
+    check.add_argument("current")
+    check.add_argument("--threshold", type=float, default=0.2,
+                       help="allowed slowdown as a fraction (0.2 = 20%%)")
+    check.add_argument("--metric", default="median", choices=("min", "median", "mean", "p95"))
+
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        dataset.write_dataset(args.out, args.months, args.expenses, args.categories, args.seed)
+        print(f"Wrote data.json (with data.partitions), expenses.csv, categories.csv "
+              f"and budgets.csv to {args.out}")
+        return 0
+
+    if args.command == "storage":
+        data = dataset.generate(args.months, args.expenses, args.categories, args.seed)
+        print(storage.format_storage(storage.measure(data[0], args.updates, args.seed)))
+        return 0
+
+    if args.command == "run":
+        results = suite.run(args.months, args.expenses, args.categories, args.seed,
+                            args.repeat, args.only)
+        suite.write_results(results, args.output)
+        print(storage.format_storage(results["storage"]))
+        print(payloads.format_sizes(results["payloads"]))
+        print(f"Wrote {len(results['results'])} results to {args.output}")
+        if not args.baseline:
+            return 0
+        baseline, current = compare.load_results(args.baseline), results
+        threshold, metric = args.threshold, "median"
+    else:
+        baseline, current = compare.load_results(args.baseline), compare.load_results(args.current)
+        threshold, metric = args.threshold, args.metric
+
+    if baseline["meta"]["dataset"] != current["meta"]["dataset"]:
+        print("Warning: the two runs used different datasets", file=sys.stderr)
+    rows = compare.compare(baseline, current, threshold, metric)
+    print(compare.format_rows(rows))
+    failed = compare.regressions(rows)
+    if failed:
+        print(f"{len(failed)} case(s) regressed by more than {threshold:.0%}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""Compare two result files and flag regressions"""
+import json
+
+# Differences below this many milliseconds are timer noise, whatever the ratio
+MIN_DELTA_MS = 0.05
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+def compare(baseline, current, threshold=0.2, metric="median", min_delta=MIN_DELTA_MS):
+    """Return rows of (name, baseline ms, current ms, ratio, status).
+
+    status is "regressed" when current exceeds baseline by more than threshold
+    (a fraction) and by more than min_delta ms, "improved" for the mirror case,
+    "new"/"missing" for cases in only one file, else "ok".
+    """
+    rows = []
+    before, after = baseline["results"], current["results"]
+    for name in sorted(set(before) | set(after)):
+        if name not in before:
+            rows.append((name, None, after[name][metric], None, "new"))
+            continue
+        if name not in after:
+            rows.append((name, before[name][metric], None, None, "missing"))
+            continue
+        old, new = before[name][metric], after[name][metric]
+        ratio = new / old if old else float("inf")
+        status = "ok"
+        if new - old > min_delta and ratio > 1 + threshold:
+            status = "regressed"
+        elif old - new > min_delta and ratio < 1 / (1 + threshold):
+            status = "improved"
+        rows.append((name, old, new, ratio, status))
+    return rows
+
+def format_rows(rows):
+    def ms(value):
+        return "-" if value is None else f"{value:.3f}"
+
+    lines = [f"{'case':70s} {'baseline':>10s} {'current':>10s} {'ratio':>7s}  status"]
+    for name, old, new, ratio, status in rows:
+        lines.append(f"{name:70s} {ms(old):>10s} {ms(new):>10s} "
+                     f"{'-' if ratio is None else f'{ratio:.2f}':>7s}  {status}")
+    return "\n".join(lines)
+
+def regressions(rows):
+    return [row for row in rows if row[4] == "regressed"]
@@ -0,0 +1,61 @@
+"""Synthetic datasets: months x expenses per month x categories"""
+import os
+import random
+
+import tracker
+
+# A tenth of expense names stay uncategorized, like real data
+UNCATEGORIZED_SHARE = 0.1
+# Generated history runs month by month from January of this year
+START_YEAR = 2020
+
+def periods(months):
+    """The first months "YYYY-MM" periods from START_YEAR on"""
+    return [f"{START_YEAR + i // 12:04d}-{i % 12 + 1:02d}" for i in range(months)]
+
+def generate(months=12, expenses=1000, categories=20, seed=0):
+    """Return (expenses, categories, budgets) as plain dicts keyed by period.
+
+    Each month draws its expenses from a shared pool of names half again as
+    large, so names recur across months the way they do in real data.
+    """
+    if months < 1:
+        raise ValueError("months must be at least 1")
+    rnd = random.Random(seed)
+    pool = [f"expense {i}" for i in range(expenses * 3 // 2 or 1)]
+
+    data = {}
+    for month in periods(months):
+        data[month] = {name: round(rnd.uniform(1, 500), 2)
+                       for name in rnd.sample(pool, min(expenses, len(pool)))}
+
+    category_names = [f"category {i}" for i in range(categories)]
+    category_data = {name: [] for name in category_names}
+    if category_names:
+        for name in pool:
+            if rnd.random() >= UNCATEGORIZED_SHARE:
+                category_data[rnd.choice(category_names)].append(name)
+
+    budgets = {month: round(sum(month_expenses.values()) * rnd.uniform(0.8, 1.2), 2)
+               for month, month_expenses in data.items()}
+    return data, category_data, budgets
+
+def write_data_json(path, expenses, categories, budgets):
+    """Write data.json and its partition files, as the tracker would"""
+    tracker.compact(expenses, categories, budgets, path)
+
+def write_csvs(directory, expenses, categories, budgets):
+    """Write expenses.csv, categories.csv and budgets.csv in the import format"""
+    for kind in ("expenses", "categories", "budgets"):
+        with open(os.path.join(directory, f"{kind}.csv"), "w", newline="") as f:
+            for chunk in tracker.export_csv(expenses, categories, budgets, kind):
+                f.write(chunk)
+
+def write_dataset(directory, months=12, expenses=1000, categories=20, seed=0):
+    """Generate a dataset and write data.json (with its partitions) plus the
+    three CSVs into directory"""
+    os.makedirs(directory, exist_ok=True)
+    data = generate(months, expenses, categories, seed)
+    write_data_json(os.path.join(directory, "data.json"), *data)
+    write_csvs(directory, *data)
+    return data
@@ -0,0 +1,66 @@
+"""JSON engines and content codings compared on the payloads of large read routes"""
+import json
+
+ENCODINGS = ("identity", "gzip", "br")
+
+def paths(month):
+    return {
+        "/bootstrap": "/bootstrap",
+        "/list_expense/<month>": f"/list_expense/{month}",
+        "/check_all_budgets": "/check_all_budgets",
+        "/analytics/search_expenses": "/analytics/search_expenses?query=expense&limit=1000",
+        "/analytics/get_analytics_summary": "/analytics/get_analytics_summary",
+    }
+
+def load(app_module):
+    """route name -> the object its view serializes, read back from an identity response"""
+    client = app_module.app.test_client()
+    objects = {}
+    for name, path in paths(next(iter(app_module.expenses))).items():
+        response = client.get(path, headers={"Accept-Encoding": "identity"})
+        assert response.status_code == 200, (path, response.status_code)
+        objects[name] = json.loads(response.get_data())
+    return objects
+
+def engines(app_module):
+    """JSON_ENGINE value -> the provider app.py would install for it"""
+    flask_app = app_module.app
+    available = {"stdlib": app_module.TimedJSONProvider(flask_app)}
+    if app_module.orjson is not None:
+        available["orjson"] = app_module.OrjsonProvider(flask_app)
+    return available
+
+def _encode(app_module, provider, obj):
+    with app_module.app.app_context():
+        return provider.response(obj).get_data()
+
+def cases(app_module, objects):
+    """Serialization time of every payload under every available engine"""
+    def encode(provider, obj):
+        return lambda: _encode(app_module, provider, obj)
+
+    return {f"json {name} ({engine})": encode(provider, obj)
+            for name, obj in objects.items()
+            for engine, provider in engines(app_module).items()}
+
+def sizes(app_module, objects):
+    """Bytes on the wire of every payload, by engine and content coding, encoded
+    the way compress_response does it (br only when brotli is installed)"""
+    results = {}
+    for name, obj in objects.items():
+        for engine, provider in engines(app_module).items():
+            body = _encode(app_module, provider, obj)
+            row = results.setdefault(name, {})[engine] = {"identity": len(body)}
+            for encoding in ENCODINGS[1:]:
+                if encoding == "br" and app_module.brotli is None:
+                    continue
+                row[encoding] = len(app_module.compress(body, encoding))
+    return results
+
+def format_sizes(sizes):
+    lines = [f"{'payload bytes':44s} {'engine':8s}" + "".join(f" {e:>10s}" for e in ENCODINGS)]
+    for name, by_engine in sizes.items():
+        for engine, row in by_engine.items():
+            lines.append(f"{name:44s} {engine:8s}" + "".join(
+                f" {row[e]:10d}" if e in row else f" {'-':>10s}" for e in ENCODINGS))
+    return "\n".join(lines)
@@ -0,0 +1,76 @@
+"""Memory use and sum accuracy of tracker.Expenses against plain dicts of floats"""
+import json
+import random
+import tracemalloc
+from decimal import Decimal
+
+import tracker
+
+UPDATES = 100000
+
+def _allocated(build):
+    """(result of build(), bytes it still holds once built)"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        value = build()
+        return value, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+def _exact(amounts):
+    return sum((Decimal(repr(amount)) for amount in amounts), Decimal(0))
+
+def _error(total, amounts):
+    return float(abs(Decimal(total) - _exact(amounts)))
+
+def _running_totals(expenses, updates, seed):
+    """Apply random updates to one month, keeping a running total the way
+    both representations do; returns (float total, compact total, amounts)"""
+    rnd = random.Random(seed)
+    month = next(iter(expenses))
+    amounts = dict(expenses[month])
+    names = list(amounts)
+    compact = tracker.Expenses({month: amounts})
+    running = sum(amounts.values())
+    for _ in range(updates):
+        name = rnd.choice(names)
+        amount = round(rnd.uniform(1, 500), 2)
+        running += amount - amounts[name]
+        amounts[name] = amount
+        compact.set_amount(month, name, amount)
+    return running, compact.total(month), amounts.values()
+
+def measure(expenses, updates=UPDATES, seed=0):
+    """Bytes per expense, the worst monthly total error and the error of a
+    running total after `updates` edits, for both representations"""
+    count = sum(len(month_expenses) for month_expenses in expenses.values()) or 1
+    # As json.load returns each month: its own copy of every name
+    texts = {month: json.dumps(month_expenses) for month, month_expenses in expenses.items()}
+    plain, plain_bytes = _allocated(
+        lambda: {month: json.loads(text) for month, text in texts.items()})
+    compact, compact_bytes = _allocated(
+        lambda: tracker.Expenses({month: json.loads(text) for month, text in texts.items()}))
+
+    running, compact_running, amounts = _running_totals(plain, updates, seed)
+    return {
+        "dict": {
+            "bytes_per_expense": plain_bytes / count,
+            "total_error": max(_error(sum(month_expenses.values()), month_expenses.values())
+                               for month_expenses in plain.values()),
+            "running_total_error": _error(running, amounts),
+        },
+        "compact": {
+            "bytes_per_expense": compact_bytes / count,
+            "total_error": max(_error(compact.total(month), plain[month].values())
+                               for month in plain),
+            "running_total_error": _error(compact_running, amounts),
+        },
+    }
+
+def format_storage(storage):
+    lines = [f"{'storage':10s} {'bytes/expense':>14s} {'total error':>12s} {'running error':>14s}"]
+    for name, row in storage.items():
+        lines.append(f"{name:10s} {row['bytes_per_expense']:14.1f} "
+                     f"{row['total_error']:12.3g} {row['running_total_error']:14.3g}")
+    return "\n".join(lines)
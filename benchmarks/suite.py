@@ -0,0 +1,263 @@
+"""The benchmark cases and the timing harness"""
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import dataset, payloads, storage
+
+REPEAT = 20
+WARMUP = 2
+
+def measure(func, repeat=REPEAT, setup=None):
+    """Time func() repeat times after a warmup; returns stats in milliseconds.
+
+    setup() runs untimed before every call, e.g. to undo what func did.
+    """
+    for _ in range(WARMUP):
+        if setup:
+            setup()
+        func()
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "min": timings[0],
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "p95": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "repeat": repeat,
+    }
+
+def _tracker_cases(tracker, expenses, categories, budgets):
+    month = next(iter(expenses))
+    year = int(month[:4])
+    name = next(iter(expenses[month]))
+    category = next(iter(categories), "none")
+
+    def add_then_delete():
+        tracker.add_expense(expenses, month, "benchmark expense", 1.0)
+        tracker.delete_expense(expenses, month, "benchmark expense")
+
+    def category_round_trip():
+        tracker.add_category(categories, "benchmark category")
+        tracker.add_expense_to_category(categories, "benchmark category", name)
+        tracker.delete_category(categories, "benchmark category")
+
+    return {
+        "tracker.add_expense+delete_expense": add_then_delete,
+        "tracker.update_expense": lambda: tracker.update_expense(
+            expenses, month, name, expenses[month][name]),
+        "tracker.list_expenses": lambda: tracker.list_expenses(expenses, month),
+        "tracker.monthly_summary": lambda: tracker.monthly_summary(expenses, month),
+        "tracker.add_category+add_expense_to_category+delete_category": category_round_trip,
+        "tracker.filter_by_category": lambda: tracker.filter_by_category(categories, category),
+        "tracker.category_expenses": lambda: tracker.category_expenses(
+            expenses, categories, category),
+        "tracker.set_budget": lambda: tracker.set_budget(budgets, month, budgets.get(month, 0)),
+        "tracker.check_budget": lambda: tracker.check_budget(expenses, budgets, month),
+        "tracker.check_all_budgets": lambda: tracker.check_all_budgets(expenses, budgets),
+        "tracker.bootstrap_data": lambda: tracker.bootstrap_data(expenses, categories, budgets),
+        "tracker.bootstrap_data(one year)": lambda: tracker.bootstrap_data(
+            expenses, categories, budgets, year, year),
+        "tracker.apply_batch(100)": lambda: tracker.apply_batch(expenses, categories, budgets, [
+            {"op": "update_expense", "month": month, "name": item, "amount": amount}
+            for item, amount in list(expenses[month].items())[:100]
+        ]),
+    }
+
+def _persistence_cases(tracker, expenses, categories, budgets):
+    month = next(iter(expenses))
+    name = next(iter(expenses[month]))
+
+    def save():
+        tracker.update_expense(expenses, month, name, expenses[month][name])
+        tracker.save_data(expenses, categories, budgets, durable=True)
+
+    return {
+        "tracker.save_data(durable)": save,
+        "tracker.compact": lambda: tracker.compact(expenses, categories, budgets),
+        "tracker.load_data": tracker.load_data,
+    }
+
+def _analytics_cases(tracker, analytics, expenses, categories):
+    month = next(iter(expenses))
+    year = int(month[:4])
+    name = next(iter(expenses[month]))
+    category = next(iter(categories), "none")
+
+    def full_sync():
+        tracker.mark_full_resync()
+        analytics.sync_data_to_analytics(expenses, categories)
+
+    def incremental_sync():
+        tracker.update_expense(expenses, month, name, expenses[month][name] + 1)
+        analytics.sync_data_to_analytics(expenses, categories)
+
+    return {
+        "analytics.sync_data_to_analytics(full)": full_sync,
+        "analytics.sync_data_to_analytics(incremental)": incremental_sync,
+        "analytics.get_monthly_trends": analytics.get_monthly_trends,
+        "analytics.get_monthly_trends(one year)": lambda: analytics.get_monthly_trends(year, year),
+        "analytics.get_category_breakdown": analytics.get_category_breakdown,
+        "analytics.get_category_breakdown(one year)": lambda: (
+            analytics.get_category_breakdown(year, year)),
+        "analytics.get_spending_insights": analytics.get_spending_insights,
+        "analytics.get_expense_trends_by_category": analytics.get_expense_trends_by_category,
+        "analytics.get_expense_trends_by_category(one)": lambda: (
+            analytics.get_expense_trends_by_category(category)),
+        "analytics.search_expenses(query)": lambda: analytics.search_expenses("expense 1"),
+        "analytics.search_expenses(filters)": lambda: analytics.search_expenses(
+            category=category, month=month, min_amount=100, max_amount=400),
+        "analytics.get_analytics_summary": analytics.get_analytics_summary,
+    }
+
+def _csv_cases(tracker, directory, expenses, categories, budgets):
+    def import_kind(kind):
+        def run():
+            with open(os.path.join(directory, f"{kind}.csv"), newline="") as f:
+                tracker.import_csv_stream(tracker.Expenses(), tracker.Categories(), {}, kind, f)
+        return run
+
+    def drain(chunks):
+        return lambda: sum(len(chunk) for chunk in chunks())
+
+    return {
+        "tracker.import_csv_stream(expenses)": import_kind("expenses"),
+        "tracker.import_csv_stream(categories)": import_kind("categories"),
+        "tracker.export_csv(expenses)": drain(
+            lambda: tracker.export_csv(expenses, categories, budgets)),
+        "tracker.export_ndjson": drain(
+            lambda: tracker.export_ndjson(expenses, categories, budgets)),
+    }
+
+def _route_cases(app_module):
+    client = app_module.app.test_client()
+    month = next(iter(app_module.expenses))
+    category = next(iter(app_module.categories), "none")
+
+    def get(path, **headers):
+        def run():
+            response = client.get(path, headers=headers)
+            response.get_data()
+            assert response.status_code == 200, (path, response.status_code)
+        return run
+
+    def add_expense():
+        client.post("/add_expense", data={"month": month, "name": "benchmark route", "amount": "1"})
+
+    paths = {
+        "/bootstrap": "/bootstrap",
+        "/bootstrap?year=<year>": f"/bootstrap?year={month[:4]}",
+        "/list_expense/<month>": f"/list_expense/{month}",
+        "/list_categories": "/list_categories",
+        "/category_expenses/<category>": f"/category_expenses/{category}",
+        "/check_all_budgets": "/check_all_budgets",
+        "/analytics/monthly_trends": "/analytics/monthly_trends",
+        "/analytics/category_breakdown": "/analytics/category_breakdown",
+        "/analytics/category_trends": "/analytics/category_trends",
+        "/analytics/search_expenses": "/analytics/search_expenses?query=expense&limit=1000",
+        "/analytics/get_analytics_summary": "/analytics/get_analytics_summary",
+    }
+    cases = {}
+    for name, path in paths.items():
+        cases[f"route {name}"] = get(path)
+        cases[f"route {name} (gzip)"] = get(path, **{"Accept-Encoding": "gzip"})
+        if app_module.brotli is not None:
+            cases[f"route {name} (br)"] = get(path, **{"Accept-Encoding": "br"})
+    # Exports run as jobs; waiting for it times the whole export
+    cases["route /export_to_csv"] = get("/export_to_csv?wait=60")
+    cases["route POST /add_expense"] = add_expense
+    return cases
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(months=12, expenses=1000, categories=20, seed=0, repeat=REPEAT, only=None):
+    """Measure the storage of a generated dataset (see benchmarks.storage),
+    then write it to a temporary directory and time every case.
+
+    Route cases run with the response cache disabled, so they time the views.
+    The payloads of large routes are also encoded with each JSON engine, and
+    their sizes recorded per engine and content coding (see benchmarks.payloads).
+    only is an optional substring filter on case names.
+    """
+    workdir = tempfile.mkdtemp(prefix="tracker-bench-")
+    generated = dataset.write_dataset(workdir, months, expenses, categories, seed)
+    # Before app starts any threads, which would allocate while it traces
+    storage_results = storage.measure(generated[0], seed=seed)
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        # app loads data.json from the working directory when imported
+        import tracker
+        import analytics
+        import app as app_module
+
+        data = (app_module.expenses, app_module.categories, app_module.budgets)
+        analytics.sync_data_to_analytics(data[0], data[1])
+        app_module.RESPONSE_CACHE_ENTRIES = 0
+        objects = payloads.load(app_module)
+        payload_sizes = payloads.sizes(app_module, objects)
+
+        groups = [
+            _tracker_cases(tracker, *data),
+            _analytics_cases(tracker, analytics, data[0], data[1]),
+            _route_cases(app_module),
+            payloads.cases(app_module, objects),
+            _persistence_cases(tracker, *data),
+            # Imports journal their rows, so they go last
+            _csv_cases(tracker, workdir, *data),
+        ]
+        results = {}
+        quiet = io.StringIO()
+        for cases in groups:
+            for name, func in cases.items():
+                if only and only not in name:
+                    continue
+                # analytics prints a line per sync
+                stdout, sys.stdout = sys.stdout, quiet
+                try:
+                    results[name] = measure(func, repeat)
+                finally:
+                    sys.stdout = stdout
+                print(f"{name:70s} {results[name]['median']:10.3f} ms", file=sys.stderr)
+        tracker.flush()
+        analytics.close_connections()
+    finally:
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "dataset": {"months": months, "expenses": expenses,
+                        "categories": categories, "seed": seed},
+            "repeat": repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "commit": _git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+        "storage": storage_results,
+        "payloads": payload_sizes,
+    }
+
+def write_results(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
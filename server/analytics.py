@@ -1,246 +1,779 @@
+import os
 import sqlite3
+import threading
+import base64
+import re
+import time
+from contextlib import contextmanager
 from datetime import datetime
 import json
 
-def setup_analytics_db():
-    """Create analytics database and tables"""
-    conn = sqlite3.connect('analytics.db')
+import tracker
+import metrics
+
+DB_FILE = 'analytics.db'
+POOL_SIZE = 8
+
+# Applied to every pooled connection. WAL lets readers keep working off the
+# last committed snapshot while the sync writer holds the write lock.
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-32000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA busy_timeout=5000',
+)
+
+# Idle connections are kept open so sqlite3's per-connection statement cache
+# (keyed by SQL text) turns every query below into a reused prepared statement.
+_pool_lock = threading.Lock()
+_pool = []
+_pool_local = threading.local()
+_schema_ready = False
+
+# Bumped whenever setup_analytics_db gains a migration step
+SCHEMA_VERSION = 6
+
+SEARCH_LIMIT = 100
+MAX_SEARCH_LIMIT = 1000
+
+# Year bounds standing in for an open end of a year range, so every query
+# keeps a single SQL text (and cached statement)
+MIN_YEAR, MAX_YEAR = 1, 9999
+
+# Summary tables kept in step with expense_analytics by triggers:
+# table -> (key columns, carried columns). Each also stores total and
+# expense_count, and a row is dropped once its count reaches zero.
+AGGREGATE_TABLES = {
+    'month_totals': (('month',), ('year',)),
+    'category_totals': (('category',), ()),
+    'category_month_totals': (('category', 'month'), ('year',)),
+}
+
+# Single-flight sync state: the data version analytics.db reflects, and
+# whether a sync is running. Requests wait on _sync_cond instead of starting
+# a second sync for a version that is already being applied.
+_sync_cond = threading.Condition()
+_sync_in_flight = False
+_synced_version = 0
+
+def _open_connection():
+    conn = sqlite3.connect(DB_FILE, check_same_thread=False, cached_statements=256)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def _acquire():
+    with _pool_lock:
+        if _pool:
+            return _pool.pop()
+    return _open_connection()
+
+def _release(conn):
+    if conn.in_transaction:
+        conn.rollback()
+    with _pool_lock:
+        if len(_pool) < POOL_SIZE:
+            _pool.append(conn)
+            return
+    conn.close()
+
+def _forget_connections():
+    """A forked worker must not touch its parent's SQLite connections"""
+    global _pool_lock
+    _pool_lock = threading.Lock()
+    _pool.clear()
+    _pool_local.conn = None
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_connections)
+
+def close_connections():
+    """Close every idle pooled connection"""
+    with _pool_lock:
+        while _pool:
+            _pool.pop().close()
+
+@contextmanager
+def _connection(conn=None):
+    """Use the caller's connection, else the one this thread already holds, else one from the pool"""
+    if conn is not None:
+        yield conn
+        return
+    held = getattr(_pool_local, 'conn', None)
+    if held is not None:
+        yield held
+        return
+    conn = _acquire()
+    _pool_local.conn = conn
+    try:
+        yield conn
+    finally:
+        _pool_local.conn = None
+        _release(conn)
+
+def _migrate_analytics_db(conn, version):
+    """Upgrade an analytics DB created by an older release"""
+    if version < 4:
+        # Months became "YYYY-MM" periods. The rows are rewritten by the next
+        # full sync; the derived tables and old indexes are recreated below.
+        _drop_triggers(conn)
+        for table in AGGREGATE_TABLES:
+            conn.execute(f'DROP TABLE IF EXISTS {table}')
+        conn.execute('DROP INDEX IF EXISTS idx_expense_analytics_month')
+        conn.execute('DROP INDEX IF EXISTS idx_expense_analytics_category_month')
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(expense_analytics)')]
+        if 'year' not in columns:
+            conn.execute('ALTER TABLE expense_analytics ADD COLUMN year INTEGER')
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(analytics_meta)')]
+        if 'position' not in columns:
+            conn.execute('ALTER TABLE analytics_meta ADD COLUMN position TEXT')
+        conn.execute('DELETE FROM expense_analytics')
+        conn.execute('DELETE FROM analytics_meta')
+    if version < 5:
+        # Summary tables became WITHOUT ROWID; they are rebuilt below
+        _drop_triggers(conn)
+        for table in AGGREGATE_TABLES:
+            conn.execute(f'DROP TABLE IF EXISTS {table}')
+    if version < 6:
+        # "YYYY-MM" periods sort by themselves, so nothing reads month_num.
+        # DROP COLUMN needs SQLite 3.35; older ones keep it, unused and NULL.
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(expense_analytics)')]
+        if 'month_num' in columns and sqlite3.sqlite_version_info >= (3, 35, 0):
+            _drop_triggers(conn)
+            conn.execute('ALTER TABLE expense_analytics DROP COLUMN month_num')
+
+def _create_aggregate_table(conn, table, keys, extras):
+    columns = keys + extras
+    key_list = ', '.join(keys)
+    column_list = ', '.join(columns)
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            {', '.join(f'{column} {"INTEGER" if column == "year" else "TEXT"}' for column in columns)},
+            total REAL NOT NULL,
+            expense_count INTEGER NOT NULL,
+            PRIMARY KEY ({key_list})
+        ) WITHOUT ROWID
+    ''')
+
+    def add(row):
+        return f'''
+            INSERT INTO {table} ({column_list}, total, expense_count)
+            VALUES ({', '.join(f'{row}.{column}' for column in columns)}, {row}.amount, 1)
+            ON CONFLICT ({key_list}) DO UPDATE SET
+                total = total + excluded.total,
+                expense_count = expense_count + 1;
+        '''
+
+    def remove(row):
+        match = ' AND '.join(f'{key} = {row}.{key}' for key in keys)
+        return f'''
+            UPDATE {table} SET total = total - {row}.amount, expense_count = expense_count - 1
+            WHERE {match};
+            DELETE FROM {table} WHERE {match} AND expense_count <= 0;
+        '''
+
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON expense_analytics
+        BEGIN {add('NEW')} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON expense_analytics
+        BEGIN {remove('OLD')} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_update
+        AFTER UPDATE OF month, year, amount, category ON expense_analytics
+        BEGIN {remove('OLD')} {add('NEW')} END
+    ''')
+
+def _aggregate_select(table):
+    """The GROUP BY over expense_analytics a summary table is rebuilt from.
+
+    Grouping by the carried columns too (a month fixes its year) lets it read
+    the covering (year, month, amount) indexes in order, without a temp B-tree.
+    """
+    keys, extras = AGGREGATE_TABLES[table]
+    columns = ', '.join(keys + extras)
+    return f'''
+        SELECT {columns}, SUM(amount), COUNT(*)
+        FROM expense_analytics
+        GROUP BY {columns}
+    '''
+
+def _rebuild_aggregate_tables(conn):
+    """Recompute every summary table from expense_analytics"""
+    for table, (keys, extras) in AGGREGATE_TABLES.items():
+        conn.execute(f'DELETE FROM {table}')
+        conn.execute(f'''
+            INSERT INTO {table} ({', '.join(keys + extras)}, total, expense_count)
+            {_aggregate_select(table)}
+        ''')
+
+def _create_search_index(conn):
+    """FTS5 index over expense names, kept in step with expense_analytics"""
     conn.execute('''
-        CREATE TABLE IF NOT EXISTS expense_analytics (
-            id INTEGER PRIMARY KEY,
-            month TEXT,
-            expense_name TEXT,
-            amount REAL,
-            category TEXT,
-            date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        CREATE VIRTUAL TABLE IF NOT EXISTS expense_search USING fts5(
+            expense_name,
+            content='expense_analytics',
+            content_rowid='id',
+            prefix='2 3'
         )
     ''')
-    conn.commit()
-    return conn
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS expense_search_insert AFTER INSERT ON expense_analytics
+        BEGIN
+            INSERT INTO expense_search (rowid, expense_name) VALUES (NEW.id, NEW.expense_name);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS expense_search_delete AFTER DELETE ON expense_analytics
+        BEGIN
+            INSERT INTO expense_search (expense_search, rowid, expense_name)
+            VALUES ('delete', OLD.id, OLD.expense_name);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS expense_search_update
+        AFTER UPDATE OF expense_name ON expense_analytics
+        BEGIN
+            INSERT INTO expense_search (expense_search, rowid, expense_name)
+            VALUES ('delete', OLD.id, OLD.expense_name);
+            INSERT INTO expense_search (rowid, expense_name) VALUES (NEW.id, NEW.expense_name);
+        END
+    ''')
 
-def sync_data_to_analytics(expenses, categories):
-    """Copy JSON data to SQL for analytics"""
-    conn = setup_analytics_db()
-    
-    # Clear existing data to avoid duplicates
-    conn.execute('DELETE FROM expense_analytics')
-    
-    # Find which category each expense belongs to
+def _create_derived_tables(conn):
+    """Summary tables, search index and the triggers that maintain them"""
+    for table, (keys, extras) in AGGREGATE_TABLES.items():
+        _create_aggregate_table(conn, table, keys, extras)
+    _create_search_index(conn)
+
+def _drop_triggers(conn):
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'expense_analytics'"
+    )]
+    for name in names:
+        conn.execute(f'DROP TRIGGER {name}')
+
+def setup_analytics_db():
+    """Create analytics database and tables, once per process"""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _connection() as conn, conn:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS expense_analytics (
+                id INTEGER PRIMARY KEY,
+                month TEXT,
+                expense_name TEXT,
+                amount REAL,
+                category TEXT,
+                date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                year INTEGER
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS analytics_meta (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL,
+                position TEXT
+            )
+        ''')
+        _migrate_analytics_db(conn, version)
+        _create_derived_tables(conn)
+        if version < 5:
+            _rebuild_aggregate_tables(conn)
+        if version < 4:
+            conn.execute("INSERT INTO expense_search (expense_search) VALUES ('rebuild')")
+
+        # One row per expense per month; also serves category reassignment by name
+        conn.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_expense_analytics_name_month
+            ON expense_analytics (expense_name, month)
+        ''')
+        # Covering indexes: group-bys over a year range read (year, month,
+        # amount) straight from the index in period order, without touching
+        # the table or building a temp B-tree for the sort.
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_expense_analytics_year_month
+            ON expense_analytics (year, month, amount)
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_expense_analytics_category_year_month
+            ON expense_analytics (category, year, month, amount)
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_expense_analytics_amount
+            ON expense_analytics (amount)
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_expense_analytics_date_added
+            ON expense_analytics (date_added)
+        ''')
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    _schema_ready = True
+
+def _expense_to_category(categories):
+    """Map each expense name to the category it belongs to"""
     expense_to_category = {}
     for category_name, expense_list in categories.items():
         for expense_name in expense_list:
             expense_to_category[expense_name] = category_name
-    
-    # Insert expenses into analytics DB
-    for month, month_expenses in expenses.items():
-        for expense_name, amount in month_expenses.items():
-            category = expense_to_category.get(expense_name, 'Uncategorized')
-            
+    return expense_to_category
+
+def _period_year(period):
+    return int(period[:4])
+
+def _years(from_year, to_year):
+    return (MIN_YEAR if from_year is None else from_year,
+            MAX_YEAR if to_year is None else to_year)
+
+def _full_sync(conn, expenses, categories, progress=None):
+    expense_to_category = _expense_to_category(categories)
+    conn.execute('DELETE FROM expense_analytics')
+    count = 0
+    months = list(expenses)
+    # One partition at a time, so a full sync never needs all of them resident
+    for done, month in enumerate(months, 1):
+        year = _period_year(month)
+        rows = [
+            (month, year, expense_name, float(amount),
+             expense_to_category.get(expense_name, 'Uncategorized'))
+            for expense_name, amount in expenses.get(month, {}).items()
+        ]
+        conn.executemany('''
+            INSERT INTO expense_analytics (month, year, expense_name, amount, category)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+        count += len(rows)
+        if progress:
+            progress(len(rows), done / len(months))
+    return count
+
+UPSERT_EXPENSE = '''
+    INSERT INTO expense_analytics (month, year, expense_name, amount, category)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (expense_name, month) DO UPDATE SET
+        amount = excluded.amount,
+        category = excluded.category
+'''
+
+def _incremental_sync(conn, expenses, categories, changes):
+    upserts = []
+    deletes = []
+    for month, expense_name in changes["expenses"]:
+        amount = expenses.get(month, {}).get(expense_name)
+        if amount is None:
+            deletes.append((expense_name, month))
+        else:
+            category = tracker.category_of(categories, expense_name, 'Uncategorized')
+            upserts.append((month, _period_year(month), expense_name, float(amount), category))
+
+    conn.executemany(
+        'DELETE FROM expense_analytics WHERE expense_name = ? AND month = ?', deletes
+    )
+    conn.executemany(UPSERT_EXPENSE, upserts)
+    conn.executemany(
+        'UPDATE expense_analytics SET category = ? WHERE expense_name = ?',
+        ((tracker.category_of(categories, name, 'Uncategorized'), name) for name in changes["names"])
+    )
+    return len(upserts) + len(deletes) + len(changes["names"])
+
+def _query(conn, name, sql, params=()):
+    """Run a named read query and return all its rows, recording its timing"""
+    if not metrics.ENABLED:
+        return conn.execute(sql, params).fetchall()
+    start = time.perf_counter()
+    rows = conn.execute(sql, params).fetchall()
+    metrics.observe_query(name, time.perf_counter() - start, len(rows), sql, params)
+    return rows
+
+def explain(sql, params=()):
+    """EXPLAIN QUERY PLAN for sql, one line per plan step"""
+    setup_analytics_db()
+    with _connection() as conn:
+        return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+def _stored_position(conn):
+    row = conn.execute('SELECT position FROM analytics_meta WHERE id = 1').fetchone()
+    return row[0] if row else None
+
+def _apply_changes(expenses, categories, progress=None):
+    changes = None
+    if not tracker.SHARED_STATE:
+        changes = tracker.take_changes()
+        if not tracker.has_changes(changes):
+            return changes["version"]
+
+    setup_analytics_db()
+    try:
+        with _connection() as conn, conn:
+            if tracker.SHARED_STATE:
+                # Workers share analytics.db. Catching up only once this one
+                # holds the write lock means its view is at least as new as
+                # anything already written, so no row goes back to an older value.
+                conn.execute('BEGIN IMMEDIATE')
+                tracker.refresh()
+                changes = tracker.take_changes()
+                if not tracker.has_changes(changes):
+                    return changes["version"]
+            start = time.perf_counter()
+            mode = "full" if changes["full"] else "incremental"
+            if changes["full"] and changes["resume"] and changes["position"] and (
+                    _stored_position(conn) == changes["position"]):
+                # Freshly loaded data the DB already reflects, e.g. after a restart
+                mode, count = "resume", 0
+            elif changes["full"]:
+                count = _full_sync(conn, expenses, categories, progress)
+            else:
+                count = _incremental_sync(conn, expenses, categories, changes)
+                if progress:
+                    progress(count)
             conn.execute('''
-                INSERT INTO expense_analytics (month, expense_name, amount, category)
-                VALUES (?, ?, ?, ?)
-            ''', (month, expense_name, float(amount), category))
-    
-    conn.commit()
-    conn.close()
-    print(f"Synced {sum(len(month_expenses) for month_expenses in expenses.values())} expenses to analytics DB")
+                INSERT INTO analytics_meta (id, version, position) VALUES (1, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    version = excluded.version,
+                    position = excluded.position
+            ''', (changes["version"], changes["position"]))
+    except Exception:
+        if changes is not None:
+            tracker.restore_changes(changes)
+        raise
+    metrics.observe_sync(mode, time.perf_counter() - start, count)
+    print(f"Synced {count} changes to analytics DB")
+    return changes["version"]
 
-def get_monthly_trends():
-    """Get monthly spending trends from analytics DB"""
-    conn = sqlite3.connect('analytics.db')
-    cursor = conn.execute('''
-        SELECT month, SUM(amount) as total
-        FROM expense_analytics
-        GROUP BY month
-        ORDER BY 
-            CASE month
-                WHEN 'january' THEN 1
-                WHEN 'february' THEN 2
-                WHEN 'march' THEN 3
-                WHEN 'april' THEN 4
-                WHEN 'may' THEN 5
-                WHEN 'june' THEN 6
-                WHEN 'july' THEN 7
-                WHEN 'august' THEN 8
-                WHEN 'september' THEN 9
-                WHEN 'october' THEN 10
-                WHEN 'november' THEN 11
-                WHEN 'december' THEN 12
-            END
+def _claim_sync(target=None):
+    """Wait for the sync slot; False if the target version is already synced"""
+    global _sync_in_flight
+    with _sync_cond:
+        while _sync_in_flight and (target is None or _synced_version < target):
+            _sync_cond.wait()
+        if target is not None and _synced_version >= target:
+            return False
+        _sync_in_flight = True
+        return True
+
+def _release_sync(version=None):
+    global _sync_in_flight, _synced_version
+    with _sync_cond:
+        if version is not None:
+            _synced_version = max(_synced_version, version)
+        _sync_in_flight = False
+        _sync_cond.notify_all()
+
+def sync_data_to_analytics(expenses, categories, progress=None):
+    """Bring the analytics DB up to the current data version.
+
+    Concurrent callers share one in-flight sync; returns the synced version.
+    progress(rows, fraction done), if given, is called as rows are written.
+    """
+    if not _claim_sync(tracker.data_version()):
+        return _synced_version
+
+    version = None
+    try:
+        version = _apply_changes(expenses, categories, progress)
+    finally:
+        _release_sync(version)
+    return version
+
+def _bulk_upsert(conn, rows):
+    """Upsert rows of (month, year, expense_name, amount, category).
+
+    Per-row triggers dominate bulk insert cost, so they are dropped and their
+    effect on the derived tables applied set-wise: the replaced rows come off
+    the summary tables, the new ones go on, and only new ids are indexed for
+    search. Must run inside a write transaction; readers keep seeing the old
+    schema and data until it commits.
+    """
+    conn.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS import_rows (
+            month TEXT, year INTEGER, expense_name TEXT, amount REAL, category TEXT,
+            PRIMARY KEY (expense_name, month)
+        )
     ''')
+    conn.execute('DELETE FROM import_rows')
+    # A later row for the same expense and month wins, as with the upsert
+    conn.executemany('INSERT OR REPLACE INTO import_rows VALUES (?, ?, ?, ?, ?)', rows)
+    _drop_triggers(conn)
+    for table, (keys, extras) in AGGREGATE_TABLES.items():
+        columns = ', '.join(f'e.{column}' for column in keys + extras)
+        conn.execute(f'''
+            UPDATE {table}
+            SET total = {table}.total - old.total,
+                expense_count = {table}.expense_count - old.expense_count
+            FROM (
+                SELECT {columns}, SUM(e.amount) AS total, COUNT(*) AS expense_count
+                FROM import_rows JOIN expense_analytics AS e USING (expense_name, month)
+                GROUP BY {columns}
+            ) AS old
+            WHERE {' AND '.join(f'{table}.{key} = old.{key}' for key in keys)}
+        ''')
+    max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM expense_analytics').fetchone()[0]
+    conn.execute('''
+        INSERT INTO expense_analytics (month, year, expense_name, amount, category)
+        SELECT month, year, expense_name, amount, category FROM import_rows WHERE true
+        ON CONFLICT (expense_name, month) DO UPDATE SET
+            amount = excluded.amount,
+            category = excluded.category
+    ''')
+    for table, (keys, extras) in AGGREGATE_TABLES.items():
+        columns = ', '.join(keys + extras)
+        conn.execute(f'''
+            INSERT INTO {table} ({columns}, total, expense_count)
+            SELECT {columns}, SUM(amount), COUNT(*) FROM import_rows WHERE true GROUP BY {columns}
+            ON CONFLICT ({', '.join(keys)}) DO UPDATE SET
+                total = total + excluded.total,
+                expense_count = expense_count + excluded.expense_count
+        ''')
+        conn.execute(f'DELETE FROM {table} WHERE expense_count <= 0')
+    # Upserts keep the id and name of existing rows, so only new ids need indexing
+    conn.execute('''
+        INSERT INTO expense_search (rowid, expense_name)
+        SELECT id, expense_name FROM expense_analytics WHERE id > ?
+    ''', (max_id,))
+    _create_derived_tables(conn)
+
+@contextmanager
+def bulk_loader(categories):
+    """Load imported expense batches straight into expense_analytics.
+
+    Yields load(rows, apply) for batches of (month, name, amount), where
+    apply() puts the batch into the tracker. Each batch holds the sync slot
+    and one write transaction only while it loads, so syncs and readers get
+    in between batches; apply() runs under the slot, so no sync can claim
+    the batch's data version before its rows are in the DB.
+    """
+    setup_analytics_db()
+
+    def load(rows, apply):
+        _claim_sync()
+        start = time.perf_counter()
+        try:
+            apply()
+            with _connection() as conn, conn:
+                conn.execute('BEGIN IMMEDIATE')
+                _bulk_upsert(conn, [
+                    (month, _period_year(month), name, float(amount),
+                     tracker.category_of(categories, name, 'Uncategorized'))
+                    for month, name, amount in rows
+                ])
+        except Exception:
+            # The tracker may already hold the rows; rebuild analytics from it
+            tracker.mark_full_resync()
+            raise
+        finally:
+            _release_sync()
+        metrics.observe_sync("import", time.perf_counter() - start, len(rows))
+    yield load
+
+@contextmanager
+def snapshot():
+    """Read transaction over the analytics DB, yields (conn, version)"""
+    setup_analytics_db()
+    with _connection() as conn:
+        conn.execute('BEGIN')
+        try:
+            row = conn.execute('SELECT version FROM analytics_meta WHERE id = 1').fetchone()
+            yield conn, row[0] if row else 0
+        finally:
+            conn.rollback()
+
+def get_monthly_trends(from_year=None, to_year=None, conn=None):
+    """Get monthly spending trends from analytics DB"""
+    with _connection(conn) as conn:
+        results = _query(conn, 'monthly_trends', '''
+            SELECT month, total
+            FROM month_totals
+            WHERE year BETWEEN ? AND ?
+            ORDER BY month
+        ''', _years(from_year, to_year))
     
-    results = cursor.fetchall()
-    conn.close()
-    
-    return [{"month": row[0], "total": row[1]} for row in results]
+        return [{"month": row[0], "total": row[1]} for row in results]
 
-def get_category_breakdown():
-    """Get spending breakdown by category"""
-    conn = sqlite3.connect('analytics.db')
-    cursor = conn.execute('''
-        SELECT category, SUM(amount) as total
-        FROM expense_analytics
+def _category_totals(conn, name, from_year, to_year, limit=-1):
+    """(category, total) rows, largest first; the all-time totals are kept
+    precomputed, a year range is summed from the per-month totals"""
+    if from_year is None and to_year is None:
+        return _query(conn, name, '''
+            SELECT category, total
+            FROM category_totals
+            ORDER BY total DESC
+            LIMIT ?
+        ''', (limit,))
+    return _query(conn, name + '_years', '''
+        SELECT category, SUM(total) AS total
+        FROM category_month_totals
+        WHERE year BETWEEN ? AND ?
         GROUP BY category
         ORDER BY total DESC
-    ''')
-    
-    results = cursor.fetchall()
-    conn.close()
+        LIMIT ?
+    ''', (*_years(from_year, to_year), limit))
+
+def get_category_breakdown(from_year=None, to_year=None, conn=None):
+    """Get spending breakdown by category"""
+    with _connection(conn) as conn:
+        results = _category_totals(conn, 'category_breakdown', from_year, to_year)
     
-    return [{"category": row[0], "total": row[1]} for row in results]
+        return [{"category": row[0], "total": row[1]} for row in results]
 
-def get_spending_insights():
+def get_spending_insights(from_year=None, to_year=None, conn=None):
     """Get key spending insights"""
-    conn = sqlite3.connect('analytics.db')
-    
-    # Total spending
-    cursor = conn.execute('SELECT SUM(amount) FROM expense_analytics')
-    total_spending = cursor.fetchone()[0] or 0
-    
-    # Average monthly spending
-    cursor = conn.execute('SELECT COUNT(DISTINCT month) FROM expense_analytics')
-    month_count = cursor.fetchone()[0] or 1
-    avg_monthly = total_spending / month_count
-    
-    # Highest spending month
-    cursor = conn.execute('''
-        SELECT month, SUM(amount) as total
-        FROM expense_analytics
-        GROUP BY month
-        ORDER BY total DESC
-        LIMIT 1
-    ''')
-    highest_month_row = cursor.fetchone()
-    highest_month = {
-        "month": highest_month_row[0] if highest_month_row else "None",
-        "amount": highest_month_row[1] if highest_month_row else 0
-    }
+    years = _years(from_year, to_year)
+    with _connection(conn) as conn:
+        # Total spending and average monthly spending
+        total_spending, month_count = _query(conn, 'insights_total', '''
+            SELECT SUM(total), COUNT(*) FROM month_totals WHERE year BETWEEN ? AND ?
+        ''', years)[0]
+        total_spending = total_spending or 0
+        avg_monthly = total_spending / (month_count or 1)
     
-    # Top spending category
-    cursor = conn.execute('''
-        SELECT category, SUM(amount) as total
-        FROM expense_analytics
-        GROUP BY category
-        ORDER BY total DESC
-        LIMIT 1
-    ''')
-    top_category_row = cursor.fetchone()
-    top_category = {
-        "category": top_category_row[0] if top_category_row else "None",
-        "amount": top_category_row[1] if top_category_row else 0
-    }
+        # Highest spending month
+        highest_month_row = next(iter(_query(conn, 'insights_highest_month', '''
+            SELECT month, total
+            FROM month_totals
+            WHERE year BETWEEN ? AND ?
+            ORDER BY total DESC
+            LIMIT 1
+        ''', years)), None)
+        highest_month = {
+            "month": highest_month_row[0] if highest_month_row else "None",
+            "amount": highest_month_row[1] if highest_month_row else 0
+        }
     
-    conn.close()
-    
-    return {
-        "total_spending": total_spending,
-        "avg_monthly_spending": avg_monthly,
-        "highest_spending_month": highest_month,
-        "top_spending_category": top_category
-    }
+        # Top spending category
+        top_category_row = next(iter(
+            _category_totals(conn, 'insights_top_category', from_year, to_year, 1)), None)
+        top_category = {
+            "category": top_category_row[0] if top_category_row else "None",
+            "amount": top_category_row[1] if top_category_row else 0
+        }
+
+        return {
+            "total_spending": total_spending,
+            "avg_monthly_spending": avg_monthly,
+            "highest_spending_month": highest_month,
+            "top_spending_category": top_category
+        }
 
-def get_expense_trends_by_category(category=None):
+def get_expense_trends_by_category(category=None, from_year=None, to_year=None, conn=None):
     """Get expense trends for a specific category or all categories"""
-    conn = sqlite3.connect('analytics.db')
+    years = _years(from_year, to_year)
+    with _connection(conn) as conn:
+        if category:
+            results = _query(conn, 'category_trends', '''
+                SELECT month, total
+                FROM category_month_totals
+                WHERE category = ? AND year BETWEEN ? AND ?
+                ORDER BY month
+            ''', (category, *years))
+        else:
+            results = _query(conn, 'category_trends_all', '''
+                SELECT category, month, total
+                FROM category_month_totals
+                WHERE year BETWEEN ? AND ?
+                ORDER BY category, month
+            ''', years)
     
-    if category:
-        cursor = conn.execute('''
-            SELECT month, SUM(amount) as total
-            FROM expense_analytics
-            WHERE category = ?
-            GROUP BY month
-            ORDER BY 
-                CASE month
-                    WHEN 'january' THEN 1
-                    WHEN 'february' THEN 2
-                    WHEN 'march' THEN 3
-                    WHEN 'april' THEN 4
-                    WHEN 'may' THEN 5
-                    WHEN 'june' THEN 6
-                    WHEN 'july' THEN 7
-                    WHEN 'august' THEN 8
-                    WHEN 'september' THEN 9
-                    WHEN 'october' THEN 10
-                    WHEN 'november' THEN 11
-                    WHEN 'december' THEN 12
-                END
-        ''', (category,))
-    else:
-        cursor = conn.execute('''
-            SELECT category, month, SUM(amount) as total
-            FROM expense_analytics
-            GROUP BY category, month
-            ORDER BY category, 
-                CASE month
-                    WHEN 'january' THEN 1
-                    WHEN 'february' THEN 2
-                    WHEN 'march' THEN 3
-                    WHEN 'april' THEN 4
-                    WHEN 'may' THEN 5
-                    WHEN 'june' THEN 6
-                    WHEN 'july' THEN 7
-                    WHEN 'august' THEN 8
-                    WHEN 'september' THEN 9
-                    WHEN 'october' THEN 10
-                    WHEN 'november' THEN 11
-                    WHEN 'december' THEN 12
-                END
-        ''')
-    
-    results = cursor.fetchall()
-    conn.close()
-    
-    if category:
-        return [{"month": row[0], "total": row[1]} for row in results]
-    else:
-        return [{"category": row[0], "month": row[1], "total": row[2]} for row in results]
+        if category:
+            return [{"month": row[0], "total": row[1]} for row in results]
+        else:
+            return [{"category": row[0], "month": row[1], "total": row[2]} for row in results]
 
-def search_expenses(query=None, category=None, month=None, min_amount=None, max_amount=None):
-    """Advanced expense search with filters"""
-    conn = sqlite3.connect('analytics.db')
-    
-    sql = 'SELECT * FROM expense_analytics WHERE 1=1'
-    params = []
+def _encode_cursor(date_added, row_id):
+    return base64.urlsafe_b64encode(json.dumps([date_added, row_id]).encode()).decode()
+
+def _decode_cursor(cursor):
+    try:
+        date_added, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return date_added, int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def _match_expression(query):
+    """Turn free text into an FTS5 query matching every word as a prefix"""
+    tokens = re.findall(r'\w+', query)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+def search_expenses(query=None, category=None, month=None, min_amount=None, max_amount=None,
+                    limit=SEARCH_LIMIT, cursor=None, from_year=None, to_year=None, conn=None):
+    """Advanced expense search with filters.
+
+    Returns one page of results, newest first, plus an opaque cursor for the
+    next page (None on the last page).
+    """
+    limit = max(1, min(int(limit), MAX_SEARCH_LIMIT))
+    with _connection(conn) as conn:
+        sql = 'SELECT id, month, expense_name, amount, category, date_added FROM expense_analytics WHERE 1=1'
+        params = []
     
-    if query:
-        sql += ' AND expense_name LIKE ?'
-        params.append(f'%{query}%')
+        if query:
+            match = _match_expression(query)
+            if match:
+                sql += ' AND id IN (SELECT rowid FROM expense_search WHERE expense_search MATCH ?)'
+                params.append(match)
+            else:
+                sql += ' AND expense_name LIKE ?'
+                params.append(f'%{query}%')
     
-    if category:
-        sql += ' AND category = ?'
-        params.append(category)
+        if category:
+            sql += ' AND category = ?'
+            params.append(category)
     
-    if month:
-        sql += ' AND month = ?'
-        params.append(month)
+        if month:
+            sql += ' AND month = ?'
+            params.append(month)
+
+        if from_year is not None:
+            sql += ' AND year >= ?'
+            params.append(from_year)
+
+        if to_year is not None:
+            sql += ' AND year <= ?'
+            params.append(to_year)
     
-    if min_amount is not None:
-        sql += ' AND amount >= ?'
-        params.append(min_amount)
+        if min_amount is not None:
+            sql += ' AND amount >= ?'
+            params.append(min_amount)
     
-    if max_amount is not None:
-        sql += ' AND amount <= ?'
-        params.append(max_amount)
+        if max_amount is not None:
+            sql += ' AND amount <= ?'
+            params.append(max_amount)
+
+        if cursor:
+            sql += ' AND (date_added, id) < (?, ?)'
+            params.extend(_decode_cursor(cursor))
     
-    sql += ' ORDER BY date_added DESC'
+        sql += ' ORDER BY date_added DESC, id DESC LIMIT ?'
+        params.append(limit + 1)
     
-    cursor = conn.execute(sql, params)
-    results = cursor.fetchall()
-    conn.close()
+        results = _query(conn, 'search_expenses', sql, params)
+
+        next_cursor = None
+        if len(results) > limit:
+            results = results[:limit]
+            next_cursor = _encode_cursor(results[-1][5], results[-1][0])
     
-    return [{
-        "id": row[0],
-        "month": row[1],
-        "expense_name": row[2],
-        "amount": row[3],
-        "category": row[4],
-        "date_added": row[5]
-    } for row in results]
-
-def get_analytics_summary():
+        return {
+            "results": [{
+                "id": row[0],
+                "month": row[1],
+                "expense_name": row[2],
+                "amount": row[3],
+                "category": row[4],
+                "date_added": row[5]
+            } for row in results],
+            "next_cursor": next_cursor
+        }
+
+def get_analytics_summary(from_year=None, to_year=None, conn=None):
     """Get a comprehensive analytics summary"""
     return {
-        "monthly_trends": get_monthly_trends(),
-        "category_breakdown": get_category_breakdown(),
-        "insights": get_spending_insights()
+        "monthly_trends": get_monthly_trends(from_year, to_year, conn),
+        "category_breakdown": get_category_breakdown(from_year, to_year, conn),
+        "insights": get_spending_insights(from_year, to_year, conn)
     }
\ No newline at end of file
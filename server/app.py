@@ -1,12 +1,335 @@
+import io
+import os
+import time
+import zlib
+import shutil
+import tempfile
+import functools
+import threading
+from collections import OrderedDict
 import tracker
-import analytics
-from flask import Flask, render_template, request, redirect, url_for, jsonify
+import metrics
+import jobs
+import events
+
+# "sqlite" (analytics.db) or "columnar" (in-process NumPy arrays, needs numpy)
+ANALYTICS_ENGINE = os.environ.get("ANALYTICS_ENGINE", "sqlite")
+if ANALYTICS_ENGINE == "columnar":
+    import columnar as analytics
+else:
+    import analytics
+from flask import Flask, Response, g, render_template, request, redirect, url_for, jsonify, send_file, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_scss import Scss
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 Scss(app)
 
 expenses, categories, budgets = tracker.load_data()
+analytics.setup_analytics_db()
+
+# Registered ahead of the other hooks so the timing covers them: before_request
+# hooks run in registration order, after_request hooks in reverse.
+@app.before_request
+def start_request_timer():
+    if metrics.ENABLED:
+        g.request_start = time.perf_counter()
+        metrics.start_trace()
+
+@app.after_request
+def record_request(response):
+    start = g.get("request_start")
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.REQUEST_SECONDS.observe(elapsed, request.method, route, str(response.status_code))
+    trace = metrics.end_trace()
+    if trace is not None and elapsed * 1000 >= metrics.SLOW_REQUEST_MS:
+        log_slow_request(elapsed, trace)
+    return response
+
+def log_slow_request(elapsed, trace):
+    """Log a slow request with the syncs and queries it ran and their query plans"""
+    lines = [f"Slow request {request.method} {request.full_path.rstrip('?')}: {elapsed * 1000:.1f} ms"]
+    for step in trace:
+        lines.append(f"  {step['kind']} {step['name']}: {step['seconds'] * 1000:.1f} ms, "
+                     f"{step['rows']} rows")
+        if step.get("sql") and hasattr(analytics, "explain"):
+            try:
+                lines.extend(f"    {line}" for line in analytics.explain(step["sql"], step["params"]))
+            except Exception as e:
+                lines.append(f"    (no plan: {e})")
+    app.logger.warning("\n".join(lines))
+
+@app.before_request
+def refresh_shared_state():
+    """Pick up writes from other workers (TRACKER_SHARED_STATE=1)"""
+    tracker.refresh()
+
+# Local data versions restart at 1 with the process, so their ETags also name
+# the process start; shared-state versions are journal sequence numbers, which
+# persist and agree across workers.
+BOOT_ID = format(time.time_ns(), "x")
+
+def data_etag(version):
+    return str(version) if tracker.SHARED_STATE else f"{BOOT_ID}-{version}"
+
+def parse_data_etag(tag):
+    """The version a data_etag() names, 0 if another process issued it"""
+    boot, _, version = tag.rpartition("-")
+    if boot != ("" if tracker.SHARED_STATE else BOOT_ID):
+        return 0
+    return int(version)
+
+# JSON encoder behind jsonify(): orjson when it is installed, else Flask's
+# stdlib encoder. JSON_ENGINE=stdlib forces the fallback.
+JSON_ENGINE = os.environ.get("JSON_ENGINE", "orjson" if orjson else "stdlib")
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson; other types go through Flask's default()"""
+
+    def _options(self):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.compact is False or (self.compact is None and self._app.debug):
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        start = time.perf_counter()
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default,
+                            option=self._options() | orjson.OPT_APPEND_NEWLINE)
+        metrics.JSON_SECONDS.observe(time.perf_counter() - start)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's stdlib JSON provider, recording serialization time"""
+
+    def response(self, *args, **kwargs):
+        start = time.perf_counter()
+        response = super().response(*args, **kwargs)
+        metrics.JSON_SECONDS.observe(time.perf_counter() - start)
+        return response
+
+if JSON_ENGINE == "orjson":
+    app.json = OrjsonProvider(app)
+elif metrics.ENABLED:
+    app.json = TimedJSONProvider(app)
+
+# Bodies of at least COMPRESS_MIN_BYTES are sent brotli- (when installed) or
+# gzip-encoded, whichever the client accepts first in that order.
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVELS = {"br": 4, "gzip": 6}
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+def negotiate_encoding():
+    """The content coding to use for this request, or None"""
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESS_LEVELS["br"])
+    # zlib leaves the gzip mtime at zero, so equal bodies compress to equal bytes
+    compressor = zlib.compressobj(COMPRESS_LEVELS["gzip"], zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    return compressor.compress(body) + compressor.flush()
+
+def should_compress(body, mimetype):
+    return len(body) >= COMPRESS_MIN_BYTES and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+@app.after_request
+def compress_response(response):
+    """Compress large responses that the response cache did not already encode"""
+    if not response.mimetype or not response.mimetype.startswith(COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add("Accept-Encoding")
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or "Content-Encoding" in response.headers):
+        return response
+    encoding = negotiate_encoding()
+    if encoding and should_compress(response.get_data(), response.mimetype):
+        response.set_data(compress(response.get_data(), encoding))
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+# Serialized bodies of read routes, keyed by path and query string, with the
+# compressed encodings made from them so far. Every entry belongs to the
+# current data version; the first lookup after a write sees the new version
+# and drops them all. Bounded by entry count and bytes.
+RESPONSE_CACHE_ENTRIES = int(os.environ.get("RESPONSE_CACHE_ENTRIES", "256"))
+RESPONSE_CACHE_BYTES = int(os.environ.get("RESPONSE_CACHE_BYTES", str(32 * 1024 * 1024)))
+CACHED_HEADERS = ("X-Data-Version",)
+
+_response_cache = OrderedDict()
+_response_cache_lock = threading.Lock()
+_response_cache_version = None
+_response_cache_size = 0
+
+RESPONSE_CACHE_LOOKUPS = metrics.Counter(
+    "response_cache_lookups_total", "Cached read routes served, by outcome", ("result",))
+metrics.Gauge("response_cache_entries", "Entries in the response cache",
+              lambda: len(_response_cache))
+metrics.Gauge("response_cache_bytes", "Bytes held by the response cache",
+              lambda: _response_cache_size)
+metrics.Gauge("tracker_data_version", "Data version this process has applied",
+              tracker.data_version)
+
+def _entry_size(entry):
+    return len(entry["body"]) + sum(len(data) for data in entry["encoded"].values())
+
+def _cache_get(key, version):
+    global _response_cache_version, _response_cache_size
+    with _response_cache_lock:
+        if _response_cache_version != version:
+            # Only move forward; a request that read the version just before a
+            # write must not wipe entries already built for the newer one
+            if _response_cache_version is None or version > _response_cache_version:
+                _response_cache.clear()
+                _response_cache_size = 0
+                _response_cache_version = version
+            return None
+        entry = _response_cache.get(key)
+        if entry is not None:
+            _response_cache.move_to_end(key)
+        return entry
+
+def _cache_evict():
+    global _response_cache_size
+    while (len(_response_cache) > RESPONSE_CACHE_ENTRIES
+           or _response_cache_size > RESPONSE_CACHE_BYTES):
+        _, evicted = _response_cache.popitem(last=False)
+        _response_cache_size -= _entry_size(evicted)
+
+def _cache_put(key, version, entry):
+    global _response_cache_size
+    with _response_cache_lock:
+        if _response_cache_version != version or _entry_size(entry) > RESPONSE_CACHE_BYTES:
+            return
+        old = _response_cache.pop(key, None)
+        if old is not None:
+            _response_cache_size -= _entry_size(old)
+        _response_cache[key] = entry
+        _response_cache_size += _entry_size(entry)
+        _cache_evict()
+
+def _cache_encode(key, version, entry, encoding):
+    """The entry's body in encoding, compressing it once per entry"""
+    global _response_cache_size
+    data = entry["encoded"].get(encoding)
+    if data is not None:
+        return data
+    data = compress(entry["body"], encoding)
+    with _response_cache_lock:
+        if (_response_cache_version == version and _response_cache.get(key) is entry
+                and encoding not in entry["encoded"]):
+            entry["encoded"][encoding] = data
+            _response_cache_size += len(data)
+            _cache_evict()
+    return data
+
+def cached_response(view):
+    """Serve a read route from the response cache with a strong ETag of the
+    data version and content coding, answering a matching If-None-Match with 304"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        version = tracker.data_version()
+        encoding = negotiate_encoding()
+        etag = data_etag(version) + (f"-{encoding}" if encoding else "")
+        if request.if_none_match.contains(etag):
+            RESPONSE_CACHE_LOOKUPS.inc(1, "not_modified")
+            response = Response(status=304)
+        else:
+            key = request.full_path
+            entry = _cache_get(key, version)
+            RESPONSE_CACHE_LOOKUPS.inc(1, "miss" if entry is None else "hit")
+            if entry is None:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                entry = {
+                    "body": response.get_data(),
+                    "mimetype": response.mimetype,
+                    "headers": [(name, response.headers[name]) for name in CACHED_HEADERS
+                                if name in response.headers],
+                    "encoded": {},
+                }
+                # A write landed while the body was built; it may be newer than version
+                if tracker.data_version() == version:
+                    _cache_put(key, version, entry)
+            body = entry["body"]
+            headers = list(entry["headers"])
+            if encoding and should_compress(body, entry["mimetype"]):
+                body = _cache_encode(key, version, entry, encoding)
+                headers.append(("Content-Encoding", encoding))
+            response = Response(body, mimetype=entry["mimetype"], headers=headers)
+        response.set_etag(etag)
+        # Always revalidate; the ETag makes that cheap
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+    return wrapper
+
+def period(month):
+    """A month from a route or form as a "YYYY-MM" key; a month name is taken
+    to be in the request's year field, else the current year"""
+    return tracker.period_key(month, request.values.get("year")) if month else month
+
+def year_range():
+    """The from_year/to_year query arguments (year=Y for just one) as keyword arguments"""
+    year = request.args.get("year")
+    from_year = request.args.get("from_year") or year
+    to_year = request.args.get("to_year") or year
+    return {"from_year": int(from_year) if from_year else None,
+            "to_year": int(to_year) if to_year else None}
+
+@app.errorhandler(ValueError)
+def bad_value(e):
+    return jsonify({"error": str(e)}), 400
+
+@app.errorhandler(jobs.QueueFull)
+def queue_full(e):
+    return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+
+# Syncs, imports and exports run as background jobs (see jobs.py): their
+# routes answer 202 with the job right away, and /jobs/<id> reports on it.
+# ?wait=<seconds> holds the response until the job finishes or the wait
+# (at most MAX_JOB_WAIT) runs out.
+MAX_JOB_WAIT = float(os.environ.get("MAX_JOB_WAIT", "30"))
+EXPORT_DIR = os.environ.get("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "tracker-exports"))
+# Export files older than this are deleted, including those left by earlier runs
+EXPORT_MAX_AGE = float(os.environ.get("EXPORT_MAX_AGE", "86400"))
+
+def job_body(job):
+    body = job.to_dict()
+    body["url"] = url_for("get_job", job_id=job.id)
+    if job.kind == "export" and job.status == jobs.DONE:
+        body["download"] = url_for("download_export", job_id=job.id)
+    return body
+
+def job_response(job):
+    wait = request.args.get("wait", type=float)
+    if wait:
+        job.done.wait(min(wait, MAX_JOB_WAIT))
+    status = 200 if job.done.is_set() else 202
+    return jsonify(job_body(job)), status, {"Location": url_for("get_job", job_id=job.id)}
 
 @app.route("/")
 def index():
@@ -14,7 +337,7 @@ def index():
 
 @app.route("/add_expense", methods=["POST"])
 def add_expense():
-    month = request.form["month"]
+    month = period(request.form["month"])
     name = request.form["name"]
     amount = float(request.form["amount"])
     tracker.add_expense(expenses, month, name, amount)
@@ -25,26 +348,61 @@ def add_expense():
 @app.route("/update_expense/<month>/<name>", methods=["POST"])
 def update_expense(month, name):
     new_amount = float(request.form["amount"])
-    tracker.update_expense(expenses, month, name, new_amount)
+    try:
+        tracker.update_expense(expenses, period(month), name, new_amount)
+    except KeyError:
+        return jsonify({"error": f"No expenses for {month}"}), 404
     tracker.save_data(expenses, categories, budgets)
     
     return redirect(url_for("index"))
 
 @app.route("/delete_expense/<month>/<name>")
 def delete_expense(month, name):
-    tracker.delete_expense(expenses, month, name)
+    tracker.delete_expense(expenses, period(month), name)
     tracker.save_data(expenses, categories, budgets)
     
     return redirect(url_for("index"))
 
+@app.route("/batch", methods=["POST"])
+def batch():
+    """Apply a JSON list of operations (or {"operations": [...]}) atomically"""
+    operations = request.get_json(silent=True)
+    if isinstance(operations, dict):
+        operations = operations.get("operations")
+    if not isinstance(operations, list):
+        return jsonify({"error": "Expected a JSON list of operations"}), 400
+    try:
+        results = tracker.apply_batch(expenses, categories, budgets, operations)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    tracker.save_data(expenses, categories, budgets)
+
+    # The same form as /bootstrap's version and the ETags
+    return jsonify({"results": results, "version": data_etag(tracker.data_version())})
+
+@app.route("/bootstrap")
+@cached_response
+def bootstrap():
+    """Expenses, categories, budgets, monthly totals and budget status in one
+    payload, revalidated by ETag so an unchanged reload is a bare 304.
+    ?year= (or from_year/to_year) limits it to those years' partitions"""
+    version = tracker.data_version()
+    data = tracker.bootstrap_data(expenses, categories, budgets, **year_range())
+    # What to pass /events; read first, so the data is at least this new
+    data["version"] = data_etag(version)
+    return jsonify(data)
+
 @app.route("/list_expense/<month>")
+@cached_response
 def list_expenses(month):
-    month_expenses = tracker.list_expenses(expenses, month)
+    month_expenses = tracker.list_expenses(expenses, period(month))
     
     return jsonify(month_expenses)
 
 @app.route("/monthly_summary/<month>")
+@cached_response
 def monthly_summary(month):
+    month = period(month)
     total = tracker.monthly_summary(expenses, month)
 
     return jsonify({"month": month,
@@ -73,18 +431,20 @@ def delete_category(category):
     return redirect(url_for("index"))
 
 @app.route("/category_expenses/<category>")
+@cached_response
 def category_expenses(category):
-    category_expenses = tracker.category_expenses(expenses, categories, category)
+    category_expenses = tracker.category_expenses(expenses, categories, category, **year_range())
     
     return jsonify(category_expenses)
 
 @app.route("/list_categories")
+@cached_response
 def list_categories():
     return jsonify(categories or {})
 
 @app.route("/set_budget", methods=["POST"])
 def set_budget():
-    month = request.form["month"]
+    month = period(request.form["month"])
     budget = float(request.form["amount"])
     tracker.set_budget(budgets, month, budget)
     tracker.save_data(expenses, categories, budgets)
@@ -94,109 +454,206 @@ def set_budget():
 @app.route("/adjust_budget/<month>", methods=["POST"]) 
 def adjust_budget(month):
     new_budget = float(request.form["budget"])
-    tracker.adjust_budget(budgets, month, new_budget)
+    tracker.adjust_budget(budgets, period(month), new_budget)
     tracker.save_data(expenses, categories, budgets)
 
     return redirect(url_for("index"))
 
 @app.route("/get_budget/<month>")
+@cached_response
 def get_budget(month):
+    month = period(month)
     budget = tracker.get_budget(budgets, month)
     return jsonify({"month": month, "budget": budget})
 
 @app.route("/check_budget/<month>")
+@cached_response
 def check_budget(month):
-    budget_status = tracker.check_budget(expenses, budgets, month)
+    budget_status = tracker.check_budget(expenses, budgets, period(month))
 
     return jsonify(budget_status)
 
+@app.route("/check_all_budgets")
+@cached_response
+def check_all_budgets():
+    return jsonify(tracker.check_all_budgets(expenses, budgets, **year_range()))
+
 @app.route("/list_budgets")
+@cached_response
 def list_budgets():
     return jsonify(budgets or {})
 
+def analytics_response(query, *args, **kwargs):
+    """Sync, then run query against a snapshot tagged with its data version"""
+    analytics.sync_data_to_analytics(expenses, categories)
+    with analytics.snapshot() as (conn, version):
+        response = jsonify(query(*args, **kwargs, conn=conn))
+    response.headers["X-Data-Version"] = str(version)
+    return response
+
 @app.route("/sync_analytics")
 def sync_analytics():
-    try:
+    """Sync in the background; requests until the data next changes share one job"""
+    def work(job):
+        return {"version": analytics.sync_data_to_analytics(expenses, categories, job.update)}
+    return job_response(jobs.submit("sync", work, key=("sync", tracker.data_version())))
+
+# Deltas for /events. More changed rows than EVENTS_MAX_DELTA_ROWS (a bulk
+# edit or import) is sent as a resync instead.
+EVENTS_MAX_DELTA_ROWS = int(os.environ.get("EVENTS_MAX_DELTA_ROWS", "1000"))
+
+def build_delta(changes):
+    """Current values for what an "events" change log entry touched"""
+    if len(changes["expenses"]) > EVENTS_MAX_DELTA_ROWS:
+        return None
+    months = {month for month, _ in changes["expenses"]} | changes["budgets"]
+    delta = {
+        "expenses": [[month, name, expenses.get(month, {}).get(name)]
+                     for month, name in sorted(changes["expenses"])],
+        "totals": {month: tracker.monthly_summary(expenses, month) for month in months},
+        "budgets": {month: budgets.get(month) for month in changes["budgets"]},
+        "budget_status": {month: tracker.check_budget(expenses, budgets, month)
+                          for month in months},
+        "categories": {category: list(categories[category]) if category in categories else None
+                       for category in changes["categories"]},
+        "analytics": {},
+    }
+    # The dashboard's analytics are per year: resend the touched years'. A
+    # category change can move totals in any year.
+    years = {int(month[:4]) for month, _ in changes["expenses"]}
+    if changes["names"]:
+        years.update(int(period[:4]) for period in expenses)
+    if years:
         analytics.sync_data_to_analytics(expenses, categories)
-    except Exception as e:
-        return jsonify({{"error": str(e)}}), 500
+        with analytics.snapshot() as (conn, version):
+            for year in sorted(years):
+                delta["analytics"][year] = {
+                    "trends": analytics.get_monthly_trends(year, year, conn=conn),
+                    "breakdown": analytics.get_category_breakdown(year, year, conn=conn),
+                    "insights": analytics.get_spending_insights(year, year, conn=conn),
+                }
+    return delta
+
+@app.route("/events")
+def event_stream():
+    """Server-sent data deltas (see events.py). ?version= is the "version" from
+    /bootstrap; a reconnecting browser sends Last-Event-ID instead."""
+    tag = request.headers.get("Last-Event-ID") or request.args.get("version")
+    subscriber = events.subscribe(build_delta, data_etag,
+                                  parse_data_etag(tag) if tag else None)
+    # Set by the ASGI adapter, which then waits for events itself (see asgi.py)
+    subscriber.wake = request.environ.get("tracker.wakeup")
+    return Response(events.stream(subscriber, wait=subscriber.wake is None),
+                    mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.after_request
+def notify_subscribers(response):
+    events.notify()
+    return response
+
+@app.route("/jobs")
+def list_jobs():
+    return jsonify({"jobs": [job_body(job) for job in jobs.recent()]})
+
+@app.route("/jobs/<job_id>")
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return job_response(job)
+
+@app.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 @app.route("/analytics/monthly_trends")
+@cached_response
 def get_monthly_trends():
     try:
-        analytics.sync_data_to_analytics(expenses, categories)
-        trends = analytics.get_monthly_trends()
-        return jsonify(trends)
+        return analytics_response(analytics.get_monthly_trends, **year_range())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        return jsonify({{"error": str(e)}}), 500
+        return jsonify({"error": str(e)}), 500
 
 @app.route("/analytics/category_breakdown")
+@cached_response
 def get_category_breakdown():
     try:
-        analytics.sync_data_to_analytics(expenses, categories)
-        category_breakdown = analytics.get_category_breakdown()
-        return jsonify(category_breakdown)
+        return analytics_response(analytics.get_category_breakdown, **year_range())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        return jsonify({{"error": str(e)}}), 500
+        return jsonify({"error": str(e)}), 500
 
 @app.route("/analytics/insights")
+@cached_response
 def get_insights():
     try:
-        analytics.sync_data_to_analytics(expenses, categories)
-        insights = analytics.get_spending_insights()
-        return jsonify(insights)
+        return analytics_response(analytics.get_spending_insights, **year_range())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        return jsonify({{"error": str(e)}}), 500
+        return jsonify({"error": str(e)}), 500
 
 @app.route("/analytics/category_trends")
+@cached_response
 def get_category_trends():
     try:
-        analytics.sync_data_to_analytics(expenses, categories)
-        category_trends = analytics.get_expense_trends_by_category()
-        return jsonify(category_trends)
+        return analytics_response(analytics.get_expense_trends_by_category, **year_range())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        return jsonify({{"error": str(e)}}), 500
+        return jsonify({"error": str(e)}), 500
 
 @app.route("/analytics/search_expenses")
+@cached_response
 def search_expenses():
     try:
-        analytics.sync_data_to_analytics(expenses, categories)
         query = request.args.get('query')
         category = request.args.get('category')
-        month = request.args.get('month')
+        month = period(request.args.get('month'))
         min_amount = request.args.get('min_amount')
         max_amount = request.args.get('max_amount')
-        results = analytics.search_expenses(query, category, month, min_amount, max_amount)
-        return jsonify(results)
+        min_amount = float(min_amount) if min_amount else None
+        max_amount = float(max_amount) if max_amount else None
+        limit = int(request.args.get('limit', analytics.SEARCH_LIMIT))
+        cursor = request.args.get('cursor')
+        return analytics_response(analytics.search_expenses, query, category, month,
+                                  min_amount, max_amount, limit, cursor, **year_range())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        return jsonify({{"error": str(e)}}), 500
+        return jsonify({"error": str(e)}), 500
 
 @app.route("/analytics/get_analytics_summary")
+@cached_response
 def get_analytics_summary():
     try:
-        analytics.sync_data_to_analytics(expenses, categories)
-        summary = analytics.get_analytics_summary()
-        return jsonify(summary)
+        return analytics_response(analytics.get_analytics_summary, **year_range())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        return jsonify({{"error": str(e)}}), 500
+        return jsonify({"error": str(e)}), 500
 
 @app.route("/clear_expenses")
 def clear_expenses():
-    tracker.clear_expenses(expenses)
+    tracker.clear_expenses(expenses, categories, budgets)
     tracker.save_data(expenses, categories, budgets)
 
     return redirect(url_for("index"))
 
 @app.route("/clear_categories")
 def clear_categories():
-    tracker.clear_categories(categories)
+    tracker.clear_categories(expenses, categories, budgets)
     tracker.save_data(expenses, categories, budgets)
 
     return redirect(url_for("index"))
 
 @app.route("/clear_budgets")
 def clear_budgets():
-    tracker.clear_budgets(budgets)
+    tracker.clear_budgets(expenses, categories, budgets)
     tracker.save_data(expenses, categories, budgets)
 
     return redirect(url_for("index"))
@@ -204,22 +661,196 @@ def clear_budgets():
 @app.route("/clear_all_data")
 def clear_all():
     tracker.clear_all_data(expenses, categories, budgets)
-    tracker.save_data(expenses, categories, budgets)
+    tracker.save_data(expenses, categories, budgets, durable=True)
 
     return redirect(url_for("index"))
 
-@app.route("/import_from_csv")
-def import_data():
-    tracker.import_from_csv(expenses, categories, budgets)
-    tracker.save_data(expenses, categories, budgets)
+def spool(stream):
+    """Copy an upload to a temporary file, so a job can read it after the request"""
+    f = tempfile.TemporaryFile()
+    shutil.copyfileobj(stream, f)
+    f.seek(0)
+    return f
 
-    return redirect(url_for("index"))
+def import_uploads(job, uploads):
+    """Import spooled (kind, file) uploads, or the CSV files on disk if there are none"""
+    try:
+        if uploads:
+            reports = {}
+            total = sum(os.fstat(f.fileno()).st_size for _, f in uploads) or 1
+            done = 0
+            with analytics.bulk_loader(categories) as load:
+                for kind, f in uploads:
+                    def on_chunk(rows, apply, f=f):
+                        load(rows, apply)
+                        job.update(len(rows), (done + f.tell()) / total)
+                    text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+                    report = reports[kind] = tracker.import_csv_stream(
+                        expenses, categories, budgets, kind, text, on_chunk=on_chunk
+                    )
+                    done += os.fstat(f.fileno()).st_size
+                    # on_chunk only sees the expense rows that were applied
+                    counted = report["imported"] if kind == "expenses" else 0
+                    job.update(report["imported"] + report["rejected"] - counted, done / total)
+        else:
+            reports = tracker.import_from_csv(expenses, categories, budgets)
+            job.update(sum(report["imported"] + report["rejected"] for report in reports.values()))
+    except Exception:
+        # Chunks applied before the failure still get saved, but the job
+        # reports the import's own error
+        try:
+            tracker.save_data(expenses, categories, budgets, durable=True)
+        except Exception as e:
+            print(f"Error: saving data after a failed import: {e}")
+        raise
+    else:
+        tracker.save_data(expenses, categories, budgets, durable=True)
+    finally:
+        for _, f in uploads:
+            f.close()
+        events.notify()
+
+    imported = sum(report["imported"] for report in reports.values())
+    rejected = sum(report["rejected"] for report in reports.values())
+    return {
+        "message": f"Imported {imported} rows, rejected {rejected}",
+        "reports": reports
+    }
+
+@app.route("/import_from_csv", methods=["GET", "POST"])
+def import_data():
+    """Import multipart-uploaded CSVs (fields expenses, categories, budgets) or a
+    raw CSV request body (?kind=...) as a job; a bare GET imports the files on disk"""
+    uploads = []
+    if request.method == "POST":
+        if request.files:
+            # Categories first so bulk-loaded expenses land in the right category
+            uploads = [(kind, request.files[kind].stream)
+                       for kind in ("categories", "budgets", "expenses") if kind in request.files]
+        else:
+            kind = request.args.get("kind", "expenses")
+            if kind not in tracker.CSV_COLUMNS:
+                return jsonify({"error": f"Unknown import kind: {kind}"}), 400
+            uploads = [(kind, request.stream)]
+
+    uploads = [(kind, spool(stream)) for kind, stream in uploads]
+    try:
+        # Uploads are distinct imports; re-reading the files on disk is not
+        job = jobs.submit("import", lambda job: import_uploads(job, uploads),
+                          key=None if uploads else "import")
+    except jobs.QueueFull:
+        for _, f in uploads:
+            f.close()
+        raise
+    return job_response(job)
+
+def gzip_stream(chunks):
+    """Gzip a stream of text chunks as it is produced"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_response(chunks, filename, mimetype):
+    """Stream an export as a download, gzipped when ?gzip=1"""
+    if request.args.get("gzip") in ("1", "true"):
+        chunks = gzip_stream(chunks)
+        filename += ".gz"
+        mimetype = "application/gzip"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+def export_path(job):
+    return os.path.join(EXPORT_DIR, job.id)
+
+def remove_export(job):
+    try:
+        os.remove(export_path(job))
+    except FileNotFoundError:
+        pass
+
+def remove_old_exports():
+    """Delete export files past EXPORT_MAX_AGE; other workers may share EXPORT_DIR,
+    so newer files are left to the jobs that own them"""
+    cutoff = time.time() - EXPORT_MAX_AGE
+    try:
+        names = os.listdir(EXPORT_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Error: removing old export {path}: {e}")
+
+# Jobs do not survive a restart, so nothing else would delete an earlier run's files
+remove_old_exports()
+
+def write_export(job, chunks, expected, compressed):
+    """Write an export's chunks to the job's file, counting rows as they go"""
+    def counted():
+        header = 1
+        for chunk in chunks:
+            rows, header = chunk.count("\n") - header, 0
+            job.update(rows, (job.rows + rows) / expected if expected else None)
+            yield chunk
+
+    remove_old_exports()
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    job.on_forget = remove_export
+    with open(export_path(job), "wb") as f:
+        if compressed:
+            f.writelines(gzip_stream(counted()))
+        else:
+            for chunk in counted():
+                f.write(chunk.encode("utf-8"))
+        return f.tell()
 
 @app.route("/export_to_csv")
 def export_data():
-    tracker.export_to_csv(expenses, categories, budgets)
-
-    return jsonify({"message": "Data exported successfully!"})
+    """Write a CSV export as a job; once done, its "download" URL serves the file"""
+    kind = request.args.get("kind", "expenses")
+    if kind not in tracker.CSV_COLUMNS:
+        return jsonify({"error": f"Unknown export kind: {kind}"}), 400
+    month, category = period(request.args.get("month")), request.args.get("category")
+    compressed = request.args.get("gzip") in ("1", "true")
+
+    def work(job):
+        chunks = tracker.export_csv(expenses, categories, budgets, kind, month, category)
+        expected = None
+        if kind == "expenses" and category is None:
+            expected = tracker.expense_count(expenses, month)
+        size = write_export(job, chunks, expected, compressed)
+        return {"filename": f"{kind}.csv.gz" if compressed else f"{kind}.csv",
+                "mimetype": "application/gzip" if compressed else "text/csv",
+                "bytes": size}
+
+    key = ("export", kind, month, category, compressed, tracker.data_version())
+    return job_response(jobs.submit("export", work, key=key))
+
+@app.route("/jobs/<job_id>/download")
+def download_export(job_id):
+    job = jobs.get(job_id)
+    if job is None or job.kind != "export" or job.status != jobs.DONE:
+        return jsonify({"error": "No finished export with that id"}), 404
+    if not os.path.exists(export_path(job)):
+        return jsonify({"error": "That export has expired"}), 404
+    return send_file(export_path(job), mimetype=job.result["mimetype"],
+                     as_attachment=True, download_name=job.result["filename"])
+
+@app.route("/export_to_ndjson")
+def export_ndjson():
+    chunks = tracker.export_ndjson(expenses, categories, budgets,
+                                   period(request.args.get("month")), request.args.get("category"))
+    return export_response(chunks, "expenses.ndjson", "application/x-ndjson")
 
 
 
@@ -0,0 +1,200 @@
+"""ASGI serving mode: uvicorn asgi:app (run from server/)
+
+The Flask routes stay synchronous; this adapter runs each request on a bounded
+thread pool so waiting connections sit on the event loop instead of holding a
+thread. Expensive endpoints get per-endpoint concurrency limits, which are
+enforced before a thread is taken, so imports, exports, syncs and full summaries
+queue up while cheap reads like /list_budgets always find a free thread.
+
+Event streams (text/event-stream responses) hold no thread while idle: the
+app yields an empty chunk when it has nothing to send, and the adapter waits
+on the loop until the app calls environ["tracker.wakeup"], IDLE_WAIT passes,
+or the client disconnects, which closes the stream.
+"""
+import asyncio
+import contextvars
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import tracker
+import events
+from app import app as flask_app
+
+EXECUTOR_WORKERS = int(os.environ.get("ASGI_EXECUTOR_WORKERS", "12"))
+
+# Path prefix -> requests allowed to run at once; the longest matching prefix
+# applies. Keep the sum below EXECUTOR_WORKERS so unlimited routes always
+# have threads left.
+CONCURRENCY_LIMITS = {
+    "/import_from_csv": 1,
+    "/sync_analytics": 1,
+    "/export_to_": 2,
+    "/analytics/get_analytics_summary": 1,
+    "/analytics/": 2,
+}
+
+# Longest an idle event stream goes without being asked for its next chunk
+IDLE_WAIT = events.POLL
+
+_executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix="asgi")
+_limits = {}
+
+def _limit_for(path):
+    """The semaphore guarding path, or None if it is not limited"""
+    prefix = max((prefix for prefix in CONCURRENCY_LIMITS if path.startswith(prefix)),
+                 key=len, default=None)
+    if prefix is None:
+        return None
+    if prefix not in _limits:
+        # Created lazily so they bind to the server's running loop
+        _limits[prefix] = asyncio.Semaphore(CONCURRENCY_LIMITS[prefix])
+    return _limits[prefix]
+
+class _RequestBody(io.RawIOBase):
+    """wsgi.input that pulls the ASGI request body as the app reads it,
+    so uploads stream instead of being buffered up front"""
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = b""
+        self._more = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not self._buffer and self._more:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message["type"] == "http.disconnect":
+                raise ConnectionError("Client disconnected")
+            self._buffer = message.get("body", b"")
+            self._more = message.get("more_body", False)
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+def _environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BufferedReader(body),
+        # The body stream ends by itself, so chunked uploads work without a length
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": tracker.SHARED_STATE,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE" or name == "CONTENT_LENGTH":
+            key = name
+        else:
+            key = "HTTP_" + name
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+async def _disconnect(receive):
+    """Returns once the client has gone"""
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+async def _idle(wakeup, disconnected):
+    """Wait for a wakeup, IDLE_WAIT or the client going"""
+    woken = asyncio.ensure_future(wakeup.wait())
+    await asyncio.wait({woken, disconnected}, timeout=IDLE_WAIT,
+                       return_when=asyncio.FIRST_COMPLETED)
+    woken.cancel()
+
+async def _serve(scope, receive, send):
+    loop = asyncio.get_running_loop()
+    # One context per request, carried from thread to thread, so Flask's
+    # context-locals survive a streamed response resuming on another thread
+    context = contextvars.copy_context()
+
+    def run(func, *args):
+        return loop.run_in_executor(_executor, context.run, func, *args)
+
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                              for name, value in headers]
+        return lambda data: started.setdefault("written", []).append(data)
+
+    wakeup = asyncio.Event()
+    environ = _environ(scope, _RequestBody(receive, loop))
+    environ["tracker.wakeup"] = lambda: loop.call_soon_threadsafe(wakeup.set)
+    result = await run(flask_app, environ, start_response)
+    streaming = dict(started["headers"]).get(b"content-type", b"").startswith(b"text/event-stream")
+    # Only an event stream runs until the client goes; the app has read its body by now
+    disconnected = asyncio.ensure_future(_disconnect(receive)) if streaming else None
+    try:
+        await send({"type": "http.response.start", "status": started["status"],
+                    "headers": started["headers"]})
+        for data in started.get("written", []):
+            await send({"type": "http.response.body", "body": data, "more_body": True})
+        chunks = iter(result)
+        while not (streaming and disconnected.done()):
+            # Cleared first, so a wakeup while next() runs is not missed
+            wakeup.clear()
+            data = await run(next, chunks, None)
+            if data is None:
+                break
+            if data:
+                await send({"type": "http.response.body", "body": data, "more_body": True})
+            elif streaming:
+                await _idle(wakeup, disconnected)
+        else:
+            # The client has gone, so there is no body left to end
+            return
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        if disconnected is not None:
+            disconnected.cancel()
+        if hasattr(result, "close"):
+            await run(result.close)
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # Let in-flight requests finish, then make their writes durable
+            await asyncio.get_running_loop().run_in_executor(None, _executor.shutdown)
+            try:
+                if not tracker.flush(timeout=10):
+                    print("Timed out flushing tracker data on shutdown")
+            except OSError as e:
+                print(f"Error flushing tracker data on shutdown: {e}")
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        raise RuntimeError(f"Unsupported ASGI scope: {scope['type']}")
+    limit = _limit_for(scope["path"])
+    if limit is None:
+        await _serve(scope, receive, send)
+        return
+    async with limit:
+        await _serve(scope, receive, send)
@@ -0,0 +1,250 @@
+"""Vectorized in-process analytics engine.
+
+Drop-in alternative to analytics.py for read-heavy deployments: instead of
+copying expenses into analytics.db, each data version is loaded once into
+NumPy column arrays (month code, category code, name code, amount) and every
+query is a bincount/mask over those columns; a year range is one more mask. Select it with
+ANALYTICS_ENGINE=columnar.
+"""
+import re
+import time
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+import tracker
+import metrics
+from analytics import SEARCH_LIMIT, MAX_SEARCH_LIMIT, _encode_cursor, _decode_cursor
+
+_build_lock = threading.Lock()
+_frame = None
+
+class Frame:
+    """Immutable columnar copy of the expense data at one data version"""
+
+    def __init__(self, version, rows, categories):
+        self.version = version
+        months, names, amounts = [], [], []
+        for month, name, amount in rows:
+            months.append(month)
+            names.append(name)
+            amounts.append(amount)
+
+        self.months, month_codes = _encode(months)
+        self.names, name_codes = _encode(names)
+        self.categories, category_codes = _encode(
+            [tracker.category_of(categories, name, 'Uncategorized') for name in self.names]
+        )
+        self.month_codes = month_codes
+        self.name_codes = name_codes
+        # Category is a property of the name, so map through the name codes
+        self.category_codes = category_codes[name_codes] if len(name_codes) else name_codes
+        self.amounts = np.asarray(amounts, dtype=np.float64)
+        self.month_years = np.array([int(month[:4]) for month in self.months], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.amounts)
+
+def _encode(values):
+    """Dictionary-encode values into (uniques, int codes)"""
+    uniques = {}
+    codes = np.fromiter((uniques.setdefault(value, len(uniques)) for value in values),
+                        dtype=np.int64, count=len(values))
+    return list(uniques), codes
+
+def setup_analytics_db():
+    """Nothing to set up; kept for interface parity with analytics.py"""
+
+def sync_data_to_analytics(expenses, categories, progress=None):
+    """Rebuild the column arrays if the data version moved; returns the version.
+
+    progress(rows) is called once with the rows of a rebuild.
+    """
+    global _frame
+    target = tracker.data_version()
+    if _frame is not None and _frame.version >= target:
+        return _frame.version
+    with _build_lock:
+        if _frame is None or _frame.version < target:
+            # The change log only feeds the SQLite engine; drain it so it can't grow
+            tracker.take_changes()
+            version = tracker.data_version()
+            start = time.perf_counter()
+            _frame = Frame(version, tracker.iter_expenses(expenses), categories)
+            metrics.observe_sync("rebuild", time.perf_counter() - start, len(_frame))
+            if progress:
+                progress(len(_frame))
+    return _frame.version
+
+@contextmanager
+def snapshot():
+    """Yields (frame, version); frames are never mutated, so no locking is needed"""
+    frame = _frame or Frame(0, (), {})
+    yield frame, frame.version
+
+@contextmanager
+def bulk_loader(categories):
+    """Imported rows are picked up by the next rebuild, so loading only applies them"""
+    yield lambda rows, apply: apply()
+
+def _frame_or_current(conn):
+    return conn if conn is not None else (_frame or Frame(0, (), {}))
+
+def _year_mask(frame, from_year=None, to_year=None):
+    """Row mask for the year range, or None when it is unbounded"""
+    if from_year is None and to_year is None:
+        return None
+    years = frame.month_years[frame.month_codes]
+    mask = np.ones(len(frame), dtype=bool)
+    if from_year is not None:
+        mask &= years >= from_year
+    if to_year is not None:
+        mask &= years <= to_year
+    return mask
+
+def _group_totals(frame, codes, size, mask=None):
+    """(totals, row counts) of amounts grouped by codes, over the masked rows"""
+    amounts = frame.amounts if mask is None else np.where(mask, frame.amounts, 0.0)
+    present = codes if mask is None else codes[mask]
+    return (np.bincount(codes, weights=amounts, minlength=size),
+            np.bincount(present, minlength=size))
+
+def _month_totals(frame, mask=None):
+    totals, counts = _group_totals(frame, frame.month_codes, len(frame.months), mask)
+    # "YYYY-MM" keys sort chronologically
+    codes = sorted(np.flatnonzero(counts), key=lambda code: frame.months[code])
+    return [{"month": frame.months[code], "total": float(totals[code])} for code in codes]
+
+def _category_totals(frame, mask=None):
+    """(category code, total) for categories with rows, largest total first"""
+    totals, counts = _group_totals(frame, frame.category_codes, len(frame.categories), mask)
+    order = np.argsort(-totals, kind='stable')
+    return [(code, float(totals[code])) for code in order if counts[code]]
+
+def get_monthly_trends(from_year=None, to_year=None, conn=None):
+    """Get monthly spending trends"""
+    frame = _frame_or_current(conn)
+    return _month_totals(frame, _year_mask(frame, from_year, to_year))
+
+def get_category_breakdown(from_year=None, to_year=None, conn=None):
+    """Get spending breakdown by category"""
+    frame = _frame_or_current(conn)
+    return [{"category": frame.categories[code], "total": total}
+            for code, total in _category_totals(frame, _year_mask(frame, from_year, to_year))]
+
+def get_spending_insights(from_year=None, to_year=None, conn=None):
+    """Get key spending insights"""
+    frame = _frame_or_current(conn)
+    mask = _year_mask(frame, from_year, to_year)
+    months = _month_totals(frame, mask)
+    categories = _category_totals(frame, mask)
+    total_spending = sum(month["total"] for month in months)
+    avg_monthly = total_spending / (len(months) or 1)
+
+    highest_month = {"month": "None", "amount": 0}
+    if months:
+        # First of equal totals, like np.argmax
+        best = max(months, key=lambda month: month["total"])
+        highest_month = {"month": best["month"], "amount": best["total"]}
+
+    top_category = {"category": "None", "amount": 0}
+    if categories:
+        code, total = categories[0]
+        top_category = {"category": frame.categories[code], "amount": total}
+
+    return {
+        "total_spending": total_spending,
+        "avg_monthly_spending": avg_monthly,
+        "highest_spending_month": highest_month,
+        "top_spending_category": top_category
+    }
+
+def get_expense_trends_by_category(category=None, from_year=None, to_year=None, conn=None):
+    """Get expense trends for a specific category or all categories"""
+    frame = _frame_or_current(conn)
+    years = _year_mask(frame, from_year, to_year)
+    if category:
+        if category not in frame.categories:
+            return []
+        mask = frame.category_codes == frame.categories.index(category)
+        return _month_totals(frame, mask if years is None else mask & years)
+
+    n_months = len(frame.months)
+    combined = frame.category_codes * n_months + frame.month_codes
+    size = len(frame.categories) * n_months
+    totals, counts = _group_totals(frame, combined, size, years)
+    cells = [(int(cell) // n_months, int(cell) % n_months) for cell in np.flatnonzero(counts)]
+    cells.sort(key=lambda cell: (frame.categories[cell[0]], frame.months[cell[1]]))
+    return [{
+        "category": frame.categories[category_code],
+        "month": frame.months[month_code],
+        "total": float(totals[category_code * n_months + month_code])
+    } for category_code, month_code in cells]
+
+def _name_matches(frame, query):
+    """Per-name match flags: every query word must prefix a word of the name"""
+    tokens = re.findall(r'\w+', query.lower())
+    if tokens:
+        def matches(name):
+            words = re.findall(r'\w+', name.lower())
+            return all(any(word.startswith(token) for word in words) for token in tokens)
+    else:
+        needle = query.lower()
+        def matches(name):
+            return needle in name.lower()
+    return np.fromiter((matches(name) for name in frame.names), dtype=bool, count=len(frame.names))
+
+def search_expenses(query=None, category=None, month=None, min_amount=None, max_amount=None,
+                    limit=SEARCH_LIMIT, cursor=None, from_year=None, to_year=None, conn=None):
+    """Advanced expense search with filters, newest rows first"""
+    frame = _frame_or_current(conn)
+    limit = max(1, min(int(limit), MAX_SEARCH_LIMIT))
+    mask = _year_mask(frame, from_year, to_year)
+    if mask is None:
+        mask = np.ones(len(frame), dtype=bool)
+
+    if query:
+        mask &= _name_matches(frame, query)[frame.name_codes] if len(frame) else mask
+    if category:
+        if category not in frame.categories:
+            return {"results": [], "next_cursor": None}
+        mask &= frame.category_codes == frame.categories.index(category)
+    if month:
+        if month not in frame.months:
+            return {"results": [], "next_cursor": None}
+        mask &= frame.month_codes == frame.months.index(month)
+    if min_amount is not None:
+        mask &= frame.amounts >= min_amount
+    if max_amount is not None:
+        mask &= frame.amounts <= max_amount
+    if cursor:
+        mask[_decode_cursor(cursor)[1] - 1:] = False
+
+    # Row ids are positions + 1; newest (highest id) first
+    rows = np.flatnonzero(mask)[::-1][:limit + 1]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(None, int(rows[-1]) + 1)
+
+    return {
+        "results": [{
+            "id": int(row) + 1,
+            "month": frame.months[frame.month_codes[row]],
+            "expense_name": frame.names[frame.name_codes[row]],
+            "amount": float(frame.amounts[row]),
+            "category": frame.categories[frame.category_codes[row]],
+            "date_added": None
+        } for row in rows],
+        "next_cursor": next_cursor
+    }
+
+def get_analytics_summary(from_year=None, to_year=None, conn=None):
+    """Get a comprehensive analytics summary"""
+    frame = _frame_or_current(conn)
+    return {
+        "monthly_trends": get_monthly_trends(from_year, to_year, frame),
+        "category_breakdown": get_category_breakdown(from_year, to_year, frame),
+        "insights": get_spending_insights(from_year, to_year, frame)
+    }
@@ -0,0 +1,168 @@
+"""Server-sent events: deltas pushed to open dashboards as the data changes.
+
+A publisher thread, started by the first subscriber, takes the "events"
+change log whenever the data version moves and turns it into a delta with
+build(changes), which lists current values, so applying a delta twice is
+harmless. Each delta carries "since" and "version": it brings a client at any
+version from since up to version. A client further behind, whose queue
+overflowed, or after a change too broad to describe ("full", or build
+returning None), gets a resync event and reloads. Event ids are tag(version),
+and the last BACKLOG deltas are kept, so a reconnecting client catches up
+from its Last-Event-ID.
+
+A stream waits in short POLL slices and yields nothing in between. Under the
+ASGI adapter it does not wait at all: it yields nothing at once and the
+adapter waits on its event loop for subscriber.wake, so an idle dashboard
+holds no thread.
+"""
+import os
+import json
+import time
+import threading
+from collections import deque
+
+import tracker
+
+BACKLOG = int(os.environ.get("EVENTS_BACKLOG", "256"))
+QUEUE_SIZE = int(os.environ.get("EVENTS_QUEUE_SIZE", "64"))
+HEARTBEAT = float(os.environ.get("EVENTS_HEARTBEAT", "15"))
+POLL = 1.0
+
+LOG = "events"
+
+class Subscriber:
+    def __init__(self):
+        self.pending = deque()
+        # Called, with _cond held, whenever pending grows; must not block
+        self.wake = None
+
+_cond = threading.Condition()
+_subscribers = set()
+_backlog = deque(maxlen=BACKLOG)    # (since, version, event text), oldest first
+_version = None                     # where the last delta brought clients
+_build = None
+_tag = str
+_thread = None
+
+def _event(name, data, version):
+    return (f"id: {_tag(version)}\nevent: {name}\n"
+            f"data: {json.dumps(data, separators=(',', ':'))}\n\n")
+
+def _resync(version):
+    return _event("resync", {"version": version}, version)
+
+def _deliver(text):
+    for subscriber in _subscribers:
+        if len(subscriber.pending) >= QUEUE_SIZE:
+            # Too far behind to be worth catching up event by event
+            subscriber.pending.clear()
+            subscriber.pending.append(_resync(_version))
+        else:
+            subscriber.pending.append(text)
+        if subscriber.wake is not None:
+            subscriber.wake()
+    _cond.notify_all()
+
+def publish():
+    """Send whatever changed since the last delta; returns the new version"""
+    global _version
+    changes = tracker.take_changes(LOG)
+    if _version is not None and changes["version"] == _version:
+        return _version
+    with _cond:
+        subscribed = bool(_subscribers)
+    # Built outside the lock: it may sync analytics and run queries
+    try:
+        delta = _build(changes) if subscribed and not changes["full"] else None
+    except Exception:
+        # Kept for the next try, which the unchanged _version makes happen
+        tracker.restore_changes(changes, LOG)
+        raise
+    with _cond:
+        since, _version = _version, changes["version"]
+        if since is None:
+            return _version
+        if delta is None:
+            # Nobody listening or nothing describable: older clients must resync
+            _backlog.clear()
+            if subscribed:
+                _deliver(_resync(_version))
+            return _version
+        delta.update(since=since, version=_version)
+        text = _event("delta", delta, _version)
+        _backlog.append((since, _version, text))
+        _deliver(text)
+    return _version
+
+def _run():
+    while True:
+        with _cond:
+            _cond.wait(POLL)
+        # Other workers' writes only arrive through the journal
+        tracker.refresh()
+        if tracker.data_version() != _version:
+            try:
+                publish()
+            except Exception as e:
+                print(f"Error: publishing events: {e}")
+
+def notify():
+    """Wake the publisher after a write, instead of waiting for its next poll"""
+    if _thread is not None and tracker.data_version() != _version:
+        with _cond:
+            _cond.notify_all()
+
+def subscribe(build, tag, version=None):
+    """Register a subscriber that has the data as of version (None: unknown).
+
+    build and tag are taken from the first call.
+    """
+    global _build, _tag, _thread
+    with _cond:
+        if _thread is None:
+            _build, _tag = build, tag
+            tracker.open_change_log(LOG)
+            # The first take is full; it only sets the version deltas start from
+            publish()
+            _thread = threading.Thread(target=_run, name="events", daemon=True)
+            _thread.start()
+        subscriber = Subscriber()
+        _subscribers.add(subscriber)
+        if version is None:
+            return subscriber
+        # Where a reconnect resumes from if no event arrives first
+        subscriber.pending.append(f"id: {_tag(version)}\n\n")
+        missed = [(since, text) for since, delta_version, text in _backlog
+                  if delta_version > version]
+        if version < _version and (not missed or missed[0][0] > version):
+            subscriber.pending.append(_resync(_version))
+        else:
+            subscriber.pending.extend(text for _, text in missed)
+    return subscriber
+
+def unsubscribe(subscriber):
+    with _cond:
+        _subscribers.discard(subscriber)
+
+def stream(subscriber, wait=True):
+    """The subscriber's SSE body: its events, keepalive comments while idle,
+    and empty chunks in between, each after a POLL-long wait unless not wait"""
+    try:
+        yield "retry: 2000\n\n"
+        last = time.monotonic()
+        while True:
+            with _cond:
+                if wait and not subscriber.pending:
+                    _cond.wait(POLL)
+                events = list(subscriber.pending)
+                subscriber.pending.clear()
+            if events:
+                last = time.monotonic()
+                yield "".join(events)
+            elif time.monotonic() - last >= HEARTBEAT:
+                last = time.monotonic()
+                yield ": keepalive\n\n"
+            else:
+                yield ""
+    finally:
+        unsubscribe(subscriber)
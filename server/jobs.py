@@ -0,0 +1,144 @@
+"""Background jobs: work too long for a request runs on a small thread pool.
+
+submit() returns a Job at once and the work runs on one of WORKERS threads,
+reporting rows processed and progress through the job for /jobs/<id> to show.
+Jobs submitted with the same key share one run: while a job with that key is
+queued or running, submitting again returns it instead of starting another.
+Beyond QUEUE_LIMIT unfinished jobs submit() raises QueueFull. The newest
+KEEP_FINISHED finished jobs stay pollable; older ones are forgotten.
+
+Jobs live in the process that accepted them, so with several server workers
+a job is only visible to the worker that started it.
+"""
+import os
+import time
+import uuid
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+QUEUE_LIMIT = int(os.environ.get("JOB_QUEUE_LIMIT", "32"))
+KEEP_FINISHED = int(os.environ.get("JOBS_KEPT", "100"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+class QueueFull(Exception):
+    pass
+
+class Job:
+    """One unit of background work. Only its worker thread writes the counters."""
+
+    def __init__(self, kind, key=None):
+        self.id = uuid.uuid4().hex
+        self.kind, self.key = kind, key
+        self.status = QUEUED
+        self.rows = 0
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = self.finished = None
+        # Set once the job has finished, either way
+        self.done = threading.Event()
+        # Called with the job once it is forgotten, e.g. to delete its files
+        self.on_forget = None
+
+    def update(self, rows=0, progress=None):
+        """Count rows processed; progress is the fraction done, when known"""
+        self.rows += rows
+        if progress is not None:
+            self.progress = min(1.0, progress)
+
+    def duration(self):
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "rows": self.rows,
+            "duration": self.duration(),
+            "error": self.error,
+            "result": self.result,
+        }
+
+_lock = threading.Lock()
+_jobs = OrderedDict()   # id -> Job, oldest first
+_active = {}            # key -> its queued or running Job
+_unfinished = 0
+_executor = None
+
+def _pool():
+    global _executor
+    # Created on first use, so a server that forks workers starts its threads in each
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="job")
+    return _executor
+
+def submit(kind, work, key=None):
+    """Queue work(job) and return the job; its return value becomes job.result.
+
+    With a key, an unfinished job with the same key is returned instead.
+    """
+    global _unfinished
+    with _lock:
+        if key is not None and key in _active:
+            return _active[key]
+        if _unfinished >= QUEUE_LIMIT:
+            raise QueueFull(f"{_unfinished} jobs are already waiting or running")
+        job = Job(kind, key)
+        _jobs[job.id] = job
+        if key is not None:
+            _active[key] = job
+        _unfinished += 1
+        _pool().submit(_run, job, work)
+    return job
+
+def _run(job, work):
+    global _unfinished
+    job.status, job.started = RUNNING, time.time()
+    try:
+        job.result = work(job)
+        job.status = DONE
+        job.progress = 1.0
+    except Exception as e:
+        job.status, job.error = FAILED, str(e)
+        print(f"Error: {job.kind} job {job.id} failed")
+        traceback.print_exc()
+    finally:
+        job.finished = time.time()
+        with _lock:
+            if _active.get(job.key) is job:
+                del _active[job.key]
+            _unfinished -= 1
+            forgotten = _prune()
+        job.done.set()
+        metrics.JOB_SECONDS.observe(job.duration(), job.kind, job.status)
+        for old in forgotten:
+            if old.on_forget:
+                old.on_forget(old)
+
+def _prune():
+    """Drop the oldest finished jobs beyond KEEP_FINISHED; returns them"""
+    finished = [job for job in _jobs.values() if job.finished is not None]
+    forgotten = finished[:max(0, len(finished) - KEEP_FINISHED)]
+    for job in forgotten:
+        del _jobs[job.id]
+    return forgotten
+
+def get(job_id):
+    with _lock:
+        return _jobs.get(job_id)
+
+def recent(limit=20):
+    """The newest jobs first"""
+    with _lock:
+        return list(reversed(_jobs.values()))[:limit]
@@ -0,0 +1,171 @@
+"""In-process instrumentation, exposed in the Prometheus text format at /metrics.
+
+Values are per process: with several workers, scrape each one (or label them
+at the scraper). METRICS=0 turns every recording call into an early return,
+and turns off the slow-request log below.
+
+SLOW_REQUEST_MS=<ms> enables the slow-request log: each request records the
+analytics queries and syncs it ran, and requests slower than the threshold
+are logged with those timings and the query plans of their SQL queries.
+"""
+import os
+import threading
+import contextvars
+from bisect import bisect_left
+
+ENABLED = os.environ.get("METRICS", "1") != "0"
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "0"))
+
+# Seconds; the +Inf bucket is implicit
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, amount=1, *labels):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_label_text(self.labels, labels)} {_number(value)}"
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._values = {}
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        if not ENABLED:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def render(self):
+        with self._lock:
+            values = sorted((labels, (counts[:], total))
+                            for labels, (counts, total) in self._values.items())
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                text = _label_text(self.labels, labels, [("le", _number(bound))])
+                yield f"{self.name}_bucket{text} {cumulative}"
+            text = _label_text(self.labels, labels)
+            yield f"{self.name}_sum{text} {_number(total)}"
+            yield f"{self.name}_count{text} {cumulative}"
+
+class Gauge:
+    """Read from a callback at scrape time"""
+
+    def __init__(self, name, help, read):
+        self.name, self.help, self.read = name, help, read
+        _registry.append(self)
+
+    def render(self):
+        yield f"{self.name} {_number(self.read())}"
+
+def _type_of(metric):
+    return {Counter: "counter", Histogram: "histogram", Gauge: "gauge"}[type(metric)]
+
+def render():
+    """Every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {_type_of(metric)}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time to produce a response, by route",
+    ("method", "route", "status"))
+QUERY_SECONDS = Histogram(
+    "analytics_query_duration_seconds", "Analytics query time, by named query", ("query",))
+QUERY_ROWS = Counter(
+    "analytics_query_rows_total", "Rows returned by analytics queries", ("query",))
+SYNC_SECONDS = Histogram(
+    "analytics_sync_duration_seconds", "Time to bring the analytics store up to date", ("mode",))
+SYNC_ROWS = Counter(
+    "analytics_sync_rows_total", "Expense rows written by analytics syncs", ("mode",))
+PERSIST_SECONDS = Histogram(
+    "tracker_persist_duration_seconds",
+    "Time to append journal batches, write snapshots and load data", ("op",))
+PERSIST_ROWS = Counter(
+    "tracker_persist_rows_total",
+    "Journal records written or replayed on load, or expenses in snapshots written", ("op",))
+JSON_SECONDS = Histogram(
+    "json_render_duration_seconds", "Time jsonify() spends serializing a response body")
+JOB_SECONDS = Histogram(
+    "job_duration_seconds", "Background job run time, by kind and outcome", ("kind", "status"),
+    buckets=(0.01, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0))
+
+# The current request's trace, a list of dicts, while the slow log is on
+_trace = contextvars.ContextVar("metrics_trace", default=None)
+
+def start_trace():
+    if SLOW_REQUEST_MS:
+        _trace.set([])
+
+def end_trace():
+    trace = _trace.get()
+    _trace.set(None)
+    return trace
+
+def observe_query(name, seconds, rows, sql=None, params=()):
+    if not ENABLED:
+        return
+    QUERY_SECONDS.observe(seconds, name)
+    QUERY_ROWS.inc(rows, name)
+    trace = _trace.get()
+    if trace is not None:
+        trace.append({"kind": "query", "name": name, "seconds": seconds, "rows": rows,
+                      "sql": sql, "params": params})
+
+def observe_sync(mode, seconds, rows):
+    if not ENABLED:
+        return
+    SYNC_SECONDS.observe(seconds, mode)
+    SYNC_ROWS.inc(rows, mode)
+    trace = _trace.get()
+    if trace is not None:
+        trace.append({"kind": "sync", "name": mode, "seconds": seconds, "rows": rows})
+
+def observe_persist(op, seconds, rows):
+    if not ENABLED:
+        return
+    PERSIST_SECONDS.observe(seconds, op)
+    PERSIST_ROWS.inc(rows, op)
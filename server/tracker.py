@@ -1,78 +1,1420 @@
 import json
 import os
+import re
 import csv
+import uuid
+import shutil
+import threading
+import functools
+import time
+import atexit
+import math
+import sys
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:  # Windows: no shared-state mode
+    fcntl = None
+
+import metrics
 
 DATA_FILE = "data.json"
-def save_data(expenses, categories, budgets, filename=DATA_FILE):
-    data = {
-        "expenses": expenses,
-        "categories": categories,
-        "budgets": budgets
-    }
-    with open(filename, "w") as f:
-        json.dump(data, f, indent=4)
 
-def load_data(filename=DATA_FILE):
-    if not os.path.exists(filename):
-        return {}, {}, {}
+# Expenses and budgets are keyed by period, "YYYY-MM". A bare month name is
+# still accepted wherever a period is expected and means that month of the
+# current year (or of the year passed alongside it). Data written before
+# periods existed is migrated into LEGACY_YEAR, the current year by default.
+MONTHS = ('january', 'february', 'march', 'april', 'may', 'june', 'july',
+          'august', 'september', 'october', 'november', 'december')
+MONTH_NUMBERS = {month: number for number, month in enumerate(MONTHS, 1)}
+LEGACY_YEAR = int(os.environ.get("TRACKER_LEGACY_YEAR", time.localtime().tm_year))
+
+# Each period's expenses live in their own file under data.partitions/ and are
+# read on first access; data.json keeps only the list of periods with their
+# totals, plus categories and budgets. At most RESIDENT_PARTITIONS unmodified
+# partitions stay in memory, least recently used first out.
+RESIDENT_PARTITIONS = int(os.environ.get("TRACKER_RESIDENT_PARTITIONS", "24"))
+
+# Journal settings. FSYNC_POLICY is "always" (every save), "interval" (at most
+# once per FSYNC_INTERVAL seconds) or "never" (leave it to the OS).
+# COMPACT_EVERY journal records trigger a background snapshot rewrite.
+FSYNC_POLICY = os.environ.get("TRACKER_FSYNC_POLICY", "always")
+FSYNC_INTERVAL = float(os.environ.get("TRACKER_FSYNC_INTERVAL", "1.0"))
+COMPACT_EVERY = int(os.environ.get("TRACKER_COMPACT_EVERY", "1000"))
+
+# Write-behind settings. With WRITE_BEHIND on, save_data returns immediately
+# and a background writer group-commits everything saved within FLUSH_WINDOW
+# seconds, or as soon as FLUSH_MAX_PENDING records are waiting.
+WRITE_BEHIND = os.environ.get("TRACKER_WRITE_BEHIND", "1") != "0"
+FLUSH_WINDOW = float(os.environ.get("TRACKER_FLUSH_WINDOW", "0.05"))
+FLUSH_MAX_PENDING = int(os.environ.get("TRACKER_FLUSH_MAX_PENDING", "500"))
+# How long a durable save waits for the writer, and the longest pause between
+# its retries of a failed write
+DURABLE_TIMEOUT = float(os.environ.get("TRACKER_DURABLE_TIMEOUT", "30"))
+MAX_RETRY_DELAY = 5.0
+
+# Shared-state mode for running several worker processes (e.g. gunicorn -w N)
+# on one data file. Mutations are serialized across processes with a lock
+# file, each worker replays the journal records the others appended before it
+# mutates or serves a request, and journal writes are synchronous so no other
+# worker can miss a record or reuse its sequence number. Needs fcntl.
+SHARED_STATE = os.environ.get("TRACKER_SHARED_STATE") == "1"
+
+# Re-verify the Expenses/Categories indexes after every mutation (for tests)
+CHECK_INVARIANTS = os.environ.get("TRACKER_CHECK_INVARIANTS") == "1"
+
+# Change logs, by consumer: "analytics" is consumed by
+# analytics.sync_data_to_analytics, others are opened with open_change_log.
+# Keys are coalesced, so a row edited many times between syncs is only
+# written once. A log's "full" means its consumer must start over; the
+# analytics log starts out full because analytics.db may be stale relative to
+# data.json, and "resume" lets the first sync skip that rebuild when
+# analytics.db was last synced at exactly this journal position and nothing
+# has changed since startup. _data_version increases on every mutation and
+# tags the state a sync covers.
+def _new_changes(full=False, resume=False):
+    return {"full": full, "resume": resume, "expenses": set(), "names": set(),
+            "categories": set(), "budgets": set()}
+
+_changes_lock = threading.Lock()
+_change_logs = {"analytics": _new_changes(full=True, resume=True)}
+_data_version = 1
+
+def _record_expense_change(month, name):
+    global _data_version
+    with _changes_lock:
+        for changes in _change_logs.values():
+            changes["expenses"].add((month, name))
+        _data_version += 1
+
+def _record_category_change(names, category=None):
+    """names changed category; category, if given, had its member list change"""
+    global _data_version
+    with _changes_lock:
+        for changes in _change_logs.values():
+            changes["names"].update(names)
+            if category is not None:
+                changes["categories"].add(category)
+        _data_version += 1
+
+def _record_full_change():
+    global _data_version
+    with _changes_lock:
+        for changes in _change_logs.values():
+            changes["full"] = True
+        _data_version += 1
+
+def _record_bulk_change():
+    """Bump the version for rows that were loaded into analytics directly;
+    the other logs never saw those rows, so their consumers start over"""
+    global _data_version
+    with _changes_lock:
+        for log, changes in _change_logs.items():
+            if log != "analytics":
+                changes["full"] = True
+        _data_version += 1
+
+def _record_rollback():
+    """Readers may have seen a rolled-back batch half applied; what they got
+    at that version is stale now"""
+    global _data_version
+    with _changes_lock:
+        _data_version += 1
+
+def _record_budget_change(months=None):
+    """Budgets never reach analytics, but the version still has to move.
+    months=None means every budget changed."""
+    global _data_version
+    with _changes_lock:
+        for log, changes in _change_logs.items():
+            if log == "analytics":
+                continue
+            if months is None:
+                changes["full"] = True
+            else:
+                changes["budgets"].update(months)
+        _data_version += 1
+
+def mark_full_resync():
+    """Force the next analytics sync to rebuild from scratch"""
+    _record_full_change()
+
+def data_version():
+    # Journal sequence numbers are global across workers; local counters are not
+    return _committed_seq if SHARED_STATE else _data_version
+
+def journal_position():
+    """Identifies the data as of now: the data file's lineage and journal sequence"""
+    return f"{_lineage}:{_journal_seq}"
+
+def open_change_log(log):
+    """Start recording changes for another consumer; its first take is full"""
+    with _changes_lock:
+        _change_logs.setdefault(log, _new_changes(full=True))
+
+def close_change_log(log):
+    with _changes_lock:
+        _change_logs.pop(log, None)
+
+def take_changes(log="analytics"):
+    """Return the pending changes, tagged with the data version and journal
+    position they cover, and reset the log.
+
+    The position is None until the data it names is on disk: a position whose
+    records were lost in a crash would later name different data.
+    """
+    with _changes_lock:
+        changes = _change_logs[log]
+        changes["version"] = data_version()
+        durable = max(_durable_seq, _snapshot_seq) >= _journal_seq
+        changes["position"] = journal_position() if durable else None
+        changes["resume"] = changes["resume"] and _data_version == 1
+        _change_logs[log] = _new_changes()
+    return changes
+
+def restore_changes(changes, log="analytics"):
+    """Put changes back after a failed sync so they are retried"""
+    with _changes_lock:
+        pending = _change_logs[log]
+        pending["resume"] = pending["resume"] or changes["resume"]
+        pending["full"] = pending["full"] or changes["full"]
+        for key in ("expenses", "names", "categories", "budgets"):
+            pending[key].update(changes[key])
+
+def has_changes(changes):
+    return changes["full"] or any(changes[key] for key in
+                                  ("expenses", "names", "categories", "budgets"))
+
+# Journal state. Mutators append records to _pending_records under
+# _journal_lock; save_data appends them to the journal file. The snapshot
+# (data.json) stores the sequence number it covers, so replay skips records
+# that are already folded in.
+_journal_lock = threading.RLock()
+_pending_records = []
+_journal_seq = 0
+# _journal_seq as of the last release of the cross-process lock: the version
+# shared-state mode reports, so nobody sees a batch that may yet roll back
+_committed_seq = 0
+_snapshot_seq = 0
+_last_fsync = 0.0
+_compacting = False
+# Random id written into data.json, so a journal position is only ever
+# compared against positions of the same data
+_lineage = uuid.uuid4().hex
+
+# Write-behind state. _file_lock serializes journal appends with compaction;
+# _writer_cond guards the writer's wake-up flags, _durable_seq, the last
+# journal sequence number known to be on disk, and the failed-write count and
+# error that flush() hands back to callers waiting on a write.
+_file_lock = threading.Lock()
+_writer_cond = threading.Condition()
+_writer = None
+_persist_target = None
+_dirty = False
+_flush_requested = False
+_durable_seq = 0
+_write_failures = 0
+_write_error = None
+
+# Shared-state bookkeeping: the objects load_data handed out, the per-process
+# lock file (reopened after fork), how deeply this process holds it, and how
+# much of which journal file has been replayed. A journal file is identified by
+# its first line: inode numbers get recycled when compaction replaces it.
+_shared = None
+_lock_file = None
+_lock_depth = 0
+_journal_head = None
+_journal_offset = 0
+_journal_stat = None
+
+def _reset_after_fork():
+    global _lock_file, _lock_depth
+    # flock is per open file; a forked worker needs its own
+    _lock_file = None
+    _lock_depth = 0
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def lock_path(filename=DATA_FILE):
+    return os.path.splitext(filename)[0] + ".lock"
+
+@contextmanager
+def _shared_lock(filename=None, catch_up=True):
+    """Hold the cross-process lock, first catching up with other workers.
+
+    A no-op outside shared-state mode. Reentrant within a process.
+    """
+    global _lock_file, _lock_depth, _committed_seq
+    if not SHARED_STATE:
+        yield
+        return
+    if fcntl is None:
+        raise RuntimeError("TRACKER_SHARED_STATE needs fcntl, which this platform lacks")
+    with _journal_lock:
+        if _lock_depth == 0:
+            if _lock_file is None:
+                if filename is None and _shared is None:
+                    raise RuntimeError("Shared-state mode needs load_data() before any mutation")
+                _lock_file = open(lock_path(filename or _shared[3]), "a")
+            fcntl.flock(_lock_file, fcntl.LOCK_EX)
+        _lock_depth += 1
+        try:
+            if _lock_depth == 1 and catch_up and _shared is not None:
+                _catch_up()
+            yield
+        finally:
+            _lock_depth -= 1
+            if _lock_depth == 0:
+                _committed_seq = _journal_seq
+                fcntl.flock(_lock_file, fcntl.LOCK_UN)
+
+def _note_journal(path, offset):
+    """Remember which journal file has been replayed, and how far"""
+    global _journal_head, _journal_offset, _journal_stat
+    with open(path, "rb") as f:
+        _journal_head = f.readline()
+        stat = os.fstat(f.fileno())
+    _journal_offset = offset
+    _journal_stat = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+def _catch_up():
+    """Replay journal records appended by other workers since we last looked"""
+    global _journal_offset, _journal_seq, _snapshot_seq, _durable_seq
+    expenses, categories, budgets, filename = _shared
+    path = journal_path(filename)
+    try:
+        f = open(path, "rb+")
+    except FileNotFoundError:
+        return
+    with f:
+        if f.readline() != _journal_head:
+            # Another worker compacted; its journal opens with a base record
+            # naming the sequence number the new snapshot covers
+            _journal_offset = 0
+        f.seek(_journal_offset)
+        good = _journal_offset
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Torn append from a worker that died holding the lock
+                f.truncate(good)
+                break
+            good += len(line)
+            if record[1] == "base":
+                _snapshot_seq = record[0]
+                if record[0] > _journal_seq:
+                    _reload_snapshot()
+            elif record[0] > _journal_seq:
+                _record_replayed(categories, record)
+                _apply_record(expenses, categories, budgets, record)
+                _journal_seq = record[0]
+        _durable_seq = max(_durable_seq, _journal_seq)
+    _note_journal(path, good)
+
+def _reload_snapshot():
+    """Replace the shared objects' contents with the snapshot on disk, in place"""
+    global _journal_seq
+    expenses, categories, budgets, filename = _shared
     with open(filename, "r") as f:
         data = json.load(f)
-    return data.get("expenses", {}), data.get("categories", {}), data.get("budgets", {})
-# Expenses
-def add_expense(expenses, month, expense, amount):
-    month = month.lower()
+    # Partitions are read back lazily from the files that snapshot lists
+    expenses.reset(data.get("partitions", {}), data.get("names"))
+    categories.clear()
+    categories.update(data.get("categories", {}))
+    budgets.clear()
+    budgets.update(data.get("budgets", {}))
+    _journal_seq = data.get("journal_seq", 0)
+    _record_full_change()
+
+def _record_replayed(categories, record):
+    """Feed another worker's record into the change logs"""
+    op, args = record[1], record[2:]
+    if op in ("set", "del"):
+        _record_expense_change(args[0], args[1])
+    elif op == "set_many":
+        for month, name, amount in args[0]:
+            _record_expense_change(month, name)
+    elif op == "cat":
+        _record_category_change(list(categories.get(args[0], [])) + list(args[1]), args[0])
+    elif op == "cat_del":
+        _record_category_change(categories.get(args[0], []), args[0])
+    elif op == "cat_add":
+        _record_category_change([args[1]], args[0])
+    elif op == "budget":
+        _record_budget_change([_record_period(args[0])])
+    elif args == ["budgets"]:
+        _record_budget_change()
+    elif op == "clear":
+        _record_full_change()
+
+def refresh():
+    """Catch up with other workers' writes; cheap when nothing changed"""
+    if not SHARED_STATE or _shared is None:
+        return
+    try:
+        stat = os.stat(journal_path(_shared[3]))
+    except FileNotFoundError:
+        return
+    if (stat.st_ino, stat.st_size, stat.st_mtime_ns) == _journal_stat:
+        return
+    with _shared_lock():
+        pass
+
+def _mutator(func):
+    """Serialize a mutation and its journal record with compaction"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _journal_lock, _shared_lock():
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                if SHARED_STATE and _lock_depth == 1:
+                    # Other workers must see the record (a failed batch's too)
+                    # before anyone mutates again; nested mutators (batches)
+                    # leave it to the outermost one
+                    _write_pending(*_shared)
+            if CHECK_INVARIANTS:
+                for arg in args:
+                    if isinstance(arg, (Expenses, Categories)):
+                        arg.check_invariants()
+            return result
+    return wrapper
+
+def _journal(op, *args, rows=1):
+    # Sequence numbers advance by the number of rows a record carries, so the
+    # compaction threshold tracks journal size rather than record count
+    global _journal_seq
+    _journal_seq += rows
+    _pending_records.append([_journal_seq, op, *args])
+
+def journal_path(filename=DATA_FILE):
+    return os.path.splitext(filename)[0] + ".journal"
+
+def _fsync(f, force=False):
+    global _last_fsync
+    if FSYNC_POLICY == "never" and not force:
+        return
+    now = time.monotonic()
+    if FSYNC_POLICY == "interval" and not force and now - _last_fsync < FSYNC_INTERVAL:
+        return
+    f.flush()
+    os.fsync(f.fileno())
+    _last_fsync = now
+
+def _atomic_write(filename, text):
+    tmp = filename + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+        _fsync(f, force=True)
+    os.replace(tmp, filename)
+
+def _record_period(month):
+    # Records written before periods existed name a bare month
+    return period_key(month, LEGACY_YEAR)
+
+def _apply_record(expenses, categories, budgets, record):
+    # "rollback" records change nothing; they only take a failed batch's number
+    op, args = record[1], record[2:]
+    if op == "set":
+        month, name, amount = args
+        _set_expense(expenses, _record_period(month), name, amount)
+    elif op == "set_many":
+        for month, name, amount in args[0]:
+            _set_expense(expenses, _record_period(month), name, amount)
+    elif op == "del":
+        month, name = args
+        _delete_expense(expenses, _record_period(month), name)
+    elif op == "cat":
+        category, names = args
+        categories[category] = list(names)
+    elif op == "cat_del":
+        categories.pop(args[0], None)
+    elif op == "cat_add":
+        category, name = args
+        _add_to_category(categories, category, name)
+    elif op == "budget":
+        month, limit = args
+        budgets[_record_period(month)] = limit
+    elif op == "clear":
+        {"expenses": expenses, "categories": categories, "budgets": budgets}[args[0]].clear()
+
+def _write_pending(expenses, categories, budgets, filename):
+    """Append pending journal records as one batch, compacting when the journal grows"""
+    global _compacting
+    with _journal_lock:
+        records = _pending_records[:]
+        _pending_records.clear()
+        seq = _journal_seq
+        # Nothing journaled yet, but callers expect the data file to exist
+        snapshot = None
+        if not records and not os.path.exists(filename):
+            snapshot = _prepare_snapshot(expenses, categories, budgets, seq)
+
+    try:
+        with _file_lock:
+            if records:
+                start = time.perf_counter()
+                with open(journal_path(filename), "a") as f:
+                    for record in records:
+                        f.write(json.dumps(record, separators=(",", ":")) + "\n")
+                    _fsync(f)
+                    end = f.tell()
+                metrics.observe_persist("journal", time.perf_counter() - start, len(records))
+                if SHARED_STATE:
+                    # Written under the cross-process lock, right after catching up
+                    _note_journal(journal_path(filename), end)
+            elif snapshot is not None:
+                _write_snapshot(snapshot, expenses, filename)
+    except Exception:
+        with _journal_lock:
+            _pending_records[:0] = records
+        raise
+
+    with _journal_lock:
+        if _journal_seq - _snapshot_seq < COMPACT_EVERY or _compacting:
+            return seq
+        _compacting = True
+    threading.Thread(
+        target=compact, args=(expenses, categories, budgets, filename), daemon=True
+    ).start()
+    return seq
+
+def save_data(expenses, categories, budgets, filename=DATA_FILE, durable=False):
+    """Persist pending journal records.
+
+    In write-behind mode this only wakes the background writer; pass
+    durable=True (or call flush) to wait until the records are on disk.
+    """
+    global _persist_target, _dirty
+    if SHARED_STATE or not WRITE_BEHIND:
+        with _shared_lock(filename):
+            _write_pending(expenses, categories, budgets, filename)
+        return
+    with _writer_cond:
+        _persist_target = (expenses, categories, budgets, filename)
+        _dirty = True
+        _start_writer()
+        _writer_cond.notify_all()
+    if durable and not flush(DURABLE_TIMEOUT):
+        raise TimeoutError(f"Data was not saved within {DURABLE_TIMEOUT:g} seconds")
+
+def flush(timeout=None):
+    """Block until every mutation saved so far is durable; False on timeout.
+
+    Raises OSError if a write fails meanwhile. The writer keeps the records
+    and retries them, but the caller's mutations are not on disk yet.
+    """
+    global _dirty, _flush_requested
+    target = _journal_seq
+    with _writer_cond:
+        if _persist_target is None or _durable_seq >= target:
+            return True
+        failures = _write_failures
+        _dirty = True
+        _flush_requested = True
+        _writer_cond.notify_all()
+        if not _writer_cond.wait_for(
+                lambda: _durable_seq >= target or _write_failures != failures, timeout):
+            return False
+        if _durable_seq < target:
+            raise OSError(f"Saving data failed: {_write_error}") from _write_error
+        return True
+
+def _start_writer():
+    global _writer
+    if _writer is None or not _writer.is_alive():
+        _writer = threading.Thread(target=_writer_loop, name="tracker-writer", daemon=True)
+        _writer.start()
+
+def _writer_loop():
+    global _dirty, _flush_requested, _durable_seq, _write_failures, _write_error
+    retry_delay = 0
+    while True:
+        with _writer_cond:
+            _writer_cond.wait_for(lambda: _dirty)
+            # Let a burst of saves coalesce into one write
+            deadline = time.monotonic() + FLUSH_WINDOW
+            while not _flush_requested and len(_pending_records) < FLUSH_MAX_PENDING:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                _writer_cond.wait(remaining)
+            _dirty = False
+            _flush_requested = False
+            target = _persist_target
+
+        try:
+            seq = _write_pending(*target)
+        except Exception as e:
+            print(f"Error persisting data: {e}")
+            with _writer_cond:
+                _dirty = True
+                _write_failures += 1
+                _write_error = e
+                _writer_cond.notify_all()
+            # Back off while the failure persists, e.g. a full disk
+            retry_delay = min(max(retry_delay * 2, FLUSH_WINDOW, 0.05), MAX_RETRY_DELAY)
+            time.sleep(retry_delay)
+            continue
+
+        retry_delay = 0
+        with _writer_cond:
+            _durable_seq = max(_durable_seq, seq)
+            _write_error = None
+            _writer_cond.notify_all()
+
+def _flush_on_exit():
+    try:
+        if not flush(timeout=10):
+            print("Timed out flushing tracker data on shutdown")
+    except OSError as e:
+        print(f"Error flushing tracker data on shutdown: {e}")
+
+atexit.register(_flush_on_exit)
+
+def partition_dir(filename=DATA_FILE):
+    return os.path.splitext(filename)[0] + ".partitions"
+
+def _partition_path(filename, period):
+    return os.path.join(partition_dir(filename), period + ".json")
+
+def _read_partition(filename, period):
+    try:
+        with open(_partition_path(filename, period), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        # Listed by our snapshot, but another worker compacted after a clear
+        # this one has not replayed yet
+        return {}
+
+def _prepare_snapshot(expenses, categories, budgets, seq):
+    """Serialize the snapshot and copy the partitions it needs written; call
+    under _journal_lock"""
+    if isinstance(expenses, Expenses):
+        changed, manifest = expenses.take_dirty(), expenses.manifest()
+        name_index = expenses.name_index()
+    else:
+        changed = {period: dict(month_expenses) for period, month_expenses in expenses.items()}
+        # Summed in cents, as the partitions they become will store each amount
+        manifest = {period: [sum(map(to_cents, month_expenses.values())) / 100,
+                             len(month_expenses)]
+                    for period, month_expenses in changed.items()}
+        name_index = index_names(changed)
+    text = json.dumps({
+        "lineage": _lineage,
+        "partitions": manifest,
+        "names": name_index,
+        "categories": categories,
+        "budgets": budgets,
+        "journal_seq": seq
+    }, separators=(",", ":"))
+    return {"seq": seq, "text": text, "changed": changed, "periods": set(manifest)}
+
+def _write_snapshot(snapshot, expenses, filename):
+    """Write the changed partitions, then data.json listing every partition;
+    returns the number of expenses written. Call under _file_lock.
+
+    A crash in between leaves the old data.json, whose journal replay brings
+    the newer partition files back in step: every record sets or removes
+    whole values, so replaying one a partition already reflects is harmless.
+    """
+    global _snapshot_seq
+    changed = snapshot["changed"]
+    try:
+        if changed:
+            os.makedirs(partition_dir(filename), exist_ok=True)
+        for period, partition in changed.items():
+            if isinstance(partition, Partition):
+                partition = partition.to_dict()
+            _atomic_write(_partition_path(filename, period),
+                          json.dumps(partition, separators=(",", ":")))
+        _atomic_write(filename, snapshot["text"])
+    except Exception:
+        if isinstance(expenses, Expenses):
+            expenses.finish_write(changed, written=False)
+        raise
+    if isinstance(expenses, Expenses):
+        expenses.finish_write(changed, written=True)
+    _snapshot_seq = snapshot["seq"]
+
+    # Partitions of periods that no longer exist (after a clear)
+    directory = partition_dir(filename)
+    if os.path.isdir(directory):
+        for entry in os.listdir(directory):
+            period, ext = os.path.splitext(entry)
+            if ext == ".json" and period not in snapshot["periods"]:
+                os.remove(os.path.join(directory, entry))
+    return sum(len(partition) for partition in changed.values())
+
+def compact(expenses, categories, budgets, filename=DATA_FILE):
+    """Write changed partitions and the snapshot atomically, and drop journal
+    records they cover"""
+    global _compacting
+    try:
+        with _shared_lock(filename):
+            start = time.perf_counter()
+            with _journal_lock:
+                snapshot = _prepare_snapshot(expenses, categories, budgets, _journal_seq)
+            seq = snapshot["seq"]
+            with _file_lock:
+                rows = _write_snapshot(snapshot, expenses, filename)
+                path = journal_path(filename)
+                if os.path.exists(path):
+                    # The base record tells other workers which snapshot this journal follows
+                    remaining = [[seq, "base"]] + [
+                        record for record in _read_journal(path) if record[0] > seq
+                    ]
+                    _atomic_write(path, "".join(
+                        json.dumps(record, separators=(",", ":")) + "\n" for record in remaining
+                    ))
+                    if SHARED_STATE:
+                        _note_journal(path, os.path.getsize(path))
+            metrics.observe_persist("snapshot", time.perf_counter() - start, rows)
+    finally:
+        _compacting = False
+
+def _migrate_snapshot(filename, data):
+    """Split a data.json from before partitioning into partition files.
+
+    The original is kept as data.v1.json. Its months become periods of
+    LEGACY_YEAR, and so do those of journal records replayed after it.
+    """
+    backup = os.path.splitext(filename)[0] + ".v1.json"
+    if not os.path.exists(backup):
+        shutil.copyfile(filename, backup)
+
+    def periods(items):
+        for month, value in items:
+            try:
+                yield _record_period(month), value
+            except ValueError:
+                print(f"Skipping unknown month {month!r} while migrating; it is kept in {backup}")
+
+    expenses = {}
+    for period, month_expenses in periods(data.get("expenses", {}).items()):
+        expenses.setdefault(period, {}).update(month_expenses)
+    budgets = dict(periods(data.get("budgets", {}).items()))
+    snapshot = _prepare_snapshot(expenses, data.get("categories", {}), budgets,
+                                 data.get("journal_seq", 0))
+    with _file_lock:
+        _write_snapshot(snapshot, expenses, filename)
+    return json.loads(snapshot["text"])
+
+def _read_journal(path, repair=False):
+    records = []
+    with open(path, "rb+" if repair else "rb") as f:
+        good = 0
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A torn final write from a crash; everything before it is intact.
+                # Cut it off so later appends start on a fresh line.
+                if repair:
+                    f.truncate(good)
+                break
+            good += len(line)
+    return records
+
+def load_data(filename=DATA_FILE):
+    """Load the snapshot and replay journal records written after it.
+
+    Only data.json is read up front; each period's partition is read the first
+    time it is used. A data.json from before partitioning is migrated first.
+    """
+    global _journal_seq, _snapshot_seq, _durable_seq, _shared, _lineage
+    start = time.perf_counter()
+    replayed = 0
+    with _shared_lock(filename, catch_up=False):
+        data = {}
+        if os.path.exists(filename):
+            with open(filename, "r") as f:
+                data = json.load(f)
+            if "expenses" in data:
+                data = _migrate_snapshot(filename, data)
+        _lineage = data.get("lineage", _lineage)
+        expenses = Expenses(loader=functools.partial(_read_partition, filename),
+                            manifest=data.get("partitions", {}), name_index=data.get("names"))
+        categories = Categories(data.get("categories", {}))
+        budgets = data.get("budgets", {})
+        seq = data.get("journal_seq", 0)
+
+        with _journal_lock:
+            _snapshot_seq = seq
+            path = journal_path(filename)
+            if os.path.exists(path):
+                for record in _read_journal(path, repair=True):
+                    if record[0] > seq:
+                        _apply_record(expenses, categories, budgets, record)
+                        seq = record[0]
+                        replayed += 1
+                if SHARED_STATE:
+                    _note_journal(path, os.path.getsize(path))
+            _journal_seq = max(_journal_seq, seq)
+            _durable_seq = max(_durable_seq, seq)
+            if SHARED_STATE:
+                _shared = (expenses, categories, budgets, filename)
+    metrics.observe_persist("load", time.perf_counter() - start, replayed)
+    return expenses, categories, budgets
+
+# Periods. Expenses and budgets are keyed by "YYYY-MM"; month names are still
+# accepted at the edges and resolve to the given or current year.
+_PERIOD_PATTERN = re.compile(r"\d{4}-(0[1-9]|1[0-2])$")
+
+def period_key(month, year=None):
+    """The canonical "YYYY-MM" key for a period given as "YYYY-MM" or as a
+    month name (of year, default the current year)"""
+    text = str(month).strip().lower()
+    if _PERIOD_PATTERN.match(text):
+        return text
+    if text in MONTH_NUMBERS:
+        year = int(year) if year not in (None, "") else time.localtime().tm_year
+        if not 1 <= year <= 9999:
+            raise ValueError(f"Invalid year {year}")
+        return f"{year:04d}-{MONTH_NUMBERS[text]:02d}"
+    raise ValueError(f"Unknown month {month!r}, expected YYYY-MM or a month name")
+
+def in_years(period, from_year=None, to_year=None):
+    """Whether a "YYYY-MM" period falls within the (inclusive) year range"""
+    year = int(period[:4])
+    return (from_year is None or year >= from_year) and (to_year is None or year <= to_year)
+
+# Amounts are held as integer cents, so totals are exact sums rather than
+# drifting float ones; data.json and the API still use decimal amounts.
+MAX_CENTS = 2 ** 63 - 1
+
+def to_cents(amount):
+    if not math.isfinite(amount) or abs(amount) * 100 >= MAX_CENTS:
+        raise ValueError(f"Amount out of range: {amount!r}")
+    return round(amount * 100)
+
+# Indexed containers. Categories serializes exactly like the plain dict in
+# data.json; its extra indexes are rebuilt on load and kept current by the
+# functions below, so lookups cost time proportional to the result. Plain
+# dicts are still accepted everywhere and fall back to scanning.
+class Partition(Mapping):
+    """One period's expenses: name -> amount, read-only to callers.
+
+    Stored as two parallel columns sorted by name, a list of interned names
+    and an array of cents, about 16 bytes an expense plus one shared copy of
+    each name, against well over 100 for a dict of floats. Lookups bisect;
+    iteration is in name order over a copy. Expenses makes every change.
+
+    A change touches the two columns in two steps, so every read and write
+    holds lock: the owning Expenses' lock, or the partition's own.
+    """
+
+    __slots__ = ("_names", "_cents", "_lock")
+
+    def __init__(self, data=(), lock=None):
+        items = sorted((sys.intern(name), to_cents(amount))
+                       for name, amount in dict(data).items())
+        self._names = [name for name, _ in items]
+        self._cents = array("q", [cents for _, cents in items])
+        self._lock = lock if lock is not None else threading.RLock()
+
+    def _find(self, name):
+        index = bisect_left(self._names, name)
+        if index < len(self._names) and self._names[index] == name:
+            return index
+        return -1
+
+    def __getitem__(self, name):
+        with self._lock:
+            index = self._find(name)
+            if index < 0:
+                raise KeyError(name)
+            return self._cents[index] / 100
+
+    def __contains__(self, name):
+        with self._lock:
+            return self._find(name) >= 0
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._names))
+
+    def __len__(self):
+        return len(self._names)
+
+    def items(self):
+        with self._lock:
+            return [(name, cents / 100) for name, cents in zip(self._names, self._cents)]
+
+    def values(self):
+        with self._lock:
+            return [cents / 100 for cents in self._cents]
+
+    def total_cents(self):
+        with self._lock:
+            return sum(self._cents)
+
+    def set_cents(self, name, cents):
+        """Store name's amount; returns the cents it replaced, or None"""
+        with self._lock:
+            index = bisect_left(self._names, name)
+            if index < len(self._names) and self._names[index] == name:
+                previous = self._cents[index]
+                self._cents[index] = cents
+                return previous
+            self._names.insert(index, sys.intern(name))
+            self._cents.insert(index, cents)
+            return None
+
+    def remove(self, name):
+        """Drop name; returns its cents, or None if it was not there"""
+        with self._lock:
+            index = self._find(name)
+            if index < 0:
+                return None
+            del self._names[index]
+            return self._cents.pop(index)
+
+    def copy(self):
+        """An unshared copy, with a lock of its own"""
+        partition = Partition()
+        with self._lock:
+            partition._names = list(self._names)
+            partition._cents = array("q", self._cents)
+        return partition
+
+    def pick(self, names):
+        """(name, amount) for each of the set names held here, in name order"""
+        with self._lock:
+            # A bisect per name costs about as much as testing ten names in a scan
+            held, cents, size = self._names, self._cents, len(self._names)
+            if len(names) * 10 < size:
+                found = []
+                for name in names:
+                    index = bisect_left(held, name)
+                    if index < size and held[index] == name:
+                        found.append((name, cents[index] / 100))
+                found.sort()
+                return found
+            return [(name, amount / 100) for name, amount in zip(held, cents) if name in names]
+
+    def to_dict(self):
+        with self._lock:
+            return dict(zip(self._names, self.values()))
+
+def plain(month_expenses):
+    """A dict copy of one period's expenses, whether a Partition or a dict"""
+    if isinstance(month_expenses, Partition):
+        return month_expenses.to_dict()
+    return dict(month_expenses)
+
+def index_names(expenses):
+    """The name -> periods index of plain period -> {name: amount} dicts, as
+    data.json stores it: the periods in slot order, and each name's bitmask
+    of the slots holding it"""
+    slots = list(expenses)
+    masks = {}
+    for slot, period in enumerate(slots):
+        for name in expenses[period]:
+            masks[name] = masks.get(name, 0) | 1 << slot
+    return {"slots": slots, "masks": masks}
+
+class Expenses(MutableMapping):
+    """period -> {expense name: amount}, held one partition per period.
+
+    Every period's running total (in cents) and count stay in memory
+    (data.json lists them); a Partition is built from what loader returns
+    for its period on first use. Beyond
+    `resident` loaded partitions the least recently used unmodified one is
+    dropped. Modified partitions stay until compaction has written them.
+    Without a loader everything is held in memory.
+
+    A name -> periods index, also kept in data.json, lets select() load only
+    the partitions holding the names asked for. Each name maps to a bitmask
+    over period slots, about one int per distinct name. It may list a period
+    a name has left (select checks the partition), never miss one.
+    """
+
+    def __init__(self, data=None, loader=None, manifest=None, resident=RESIDENT_PARTITIONS,
+                 name_index=None):
+        self._loader = loader
+        self._resident = resident
+        self._lock = threading.RLock()
+        self._partitions = OrderedDict()
+        self._totals = {}
+        self._slots = {}            # period -> its bit in a name's mask
+        self._slot_periods = []     # bit -> period
+        self._periods_of = {}       # name -> mask of the periods holding it
+        self._load_manifest(manifest or {}, name_index)
+        self._dirty = set()
+        self._writing = set()
+        for period, month_expenses in (data or {}).items():
+            self[period] = month_expenses
+
+    def _partition(self, period):
+        """The loaded partition for period, or None for an unknown period"""
+        with self._lock:
+            partition = self._partitions.get(period)
+            if partition is not None:
+                self._partitions.move_to_end(period)
+                return partition
+            if period not in self._totals:
+                return None
+            partition = Partition(self._loader(period) if self._loader else {}, self._lock)
+            # Totals in data.json may trail partitions written just before a crash,
+            # and so may its name index
+            self._totals[period] = [partition.total_cents(), len(partition)]
+            self._note_names(period, partition)
+            self._make_room()
+            self._partitions[period] = partition
+            return partition
+
+    def _make_room(self):
+        if self._loader is None:
+            return
+        excess = len(self._partitions) + 1 - self._resident
+        for period in list(self._partitions):
+            if excess <= 0:
+                break
+            if period not in self._dirty and period not in self._writing:
+                del self._partitions[period]
+                excess -= 1
+
+    def __getitem__(self, period):
+        partition = self._partition(period)
+        if partition is None:
+            raise KeyError(period)
+        return partition
+
+    def __contains__(self, period):
+        return period in self._totals
+
+    def __iter__(self):
+        return iter(list(self._totals))
+
+    def __len__(self):
+        return len(self._totals)
+
+    def __setitem__(self, period, month_expenses):
+        with self._lock:
+            partition = Partition(month_expenses, self._lock)
+            if period in self._totals:
+                self._forget_period(period)
+            self._partitions.pop(period, None)
+            self._make_room()
+            self._partitions[period] = partition
+            self._totals[period] = [partition.total_cents(), len(partition)]
+            self._note_names(period, partition)
+            self._dirty.add(period)
+
+    def __delitem__(self, period):
+        with self._lock:
+            del self._totals[period]
+            self._forget_period(period)
+            self._partitions.pop(period, None)
+            self._dirty.discard(period)
+
+    def clear(self):
+        with self._lock:
+            self._totals.clear()
+            self._partitions.clear()
+            self._dirty.clear()
+            self._slots.clear()
+            self._slot_periods.clear()
+            self._periods_of.clear()
+
+    def reset(self, manifest, name_index=None):
+        """Forget every partition and start over from a snapshot's manifest"""
+        with self._lock:
+            self.clear()
+            self._writing.clear()
+            self._load_manifest(manifest, name_index)
+
+    def _load_manifest(self, manifest, name_index):
+        for period, (total, count) in manifest.items():
+            self._totals[period] = [to_cents(total), count]
+        if name_index is not None:
+            self._slot_periods.extend(name_index["slots"])
+            self._slots.update((period, slot) for slot, period in enumerate(self._slot_periods))
+            self._periods_of.update((sys.intern(name), mask)
+                                    for name, mask in name_index["masks"].items())
+        elif self._loader is not None:
+            # A data.json from before the index: read each partition once to build it
+            for period in self._totals:
+                self._note_names(period, self._loader(period))
+
+    def _slot(self, period):
+        slot = self._slots.get(period)
+        if slot is None:
+            slot = self._slots[period] = len(self._slot_periods)
+            self._slot_periods.append(period)
+        return slot
+
+    def _note_names(self, period, names):
+        bit = 1 << self._slot(period)
+        periods_of = self._periods_of
+        for name in names:
+            periods_of[name] = periods_of.get(name, 0) | bit
+
+    def _forget_period(self, period):
+        """Take period out of every name's mask; slots are never reused"""
+        bit = 1 << self._slot(period)
+        for name, mask in list(self._periods_of.items()):
+            if mask & bit:
+                if mask == bit:
+                    del self._periods_of[name]
+                else:
+                    self._periods_of[name] = mask & ~bit
+
+    def name_index(self):
+        """The name -> periods index in its data.json form (see index_names)"""
+        with self._lock:
+            return {"slots": list(self._slot_periods), "masks": dict(self._periods_of)}
+
+    def set_amount(self, period, name, amount):
+        cents = to_cents(amount)
+        with self._lock:
+            partition = self._partition(period)
+            if partition is None:
+                self[period] = {}
+                partition = self._partitions[period]
+            totals = self._totals[period]
+            previous = partition.set_cents(name, cents)
+            if previous is None:
+                totals[1] += 1
+                self._note_names(period, (name,))
+            else:
+                totals[0] -= previous
+            totals[0] += cents
+            self._dirty.add(period)
+
+    def delete_amount(self, period, name):
+        """Remove name from period; False if it was not there"""
+        with self._lock:
+            partition = self._partition(period)
+            previous = partition.remove(name) if partition is not None else None
+            if previous is None:
+                return False
+            totals = self._totals[period]
+            totals[0] -= previous
+            totals[1] -= 1
+            mask = self._periods_of.get(name, 0) & ~(1 << self._slots[period])
+            if mask:
+                self._periods_of[name] = mask
+            else:
+                del self._periods_of[name]
+            self._dirty.add(period)
+            return True
+
+    def select(self, names, periods=None):
+        """(period, name, amount) for each of names found in periods (default: all).
+
+        Only the partitions the name index lists for names are read.
+        """
+        wanted = {}
+        with self._lock:
+            for name in names:
+                mask = self._periods_of.get(name, 0)
+                while mask:
+                    bit = mask & -mask
+                    mask ^= bit
+                    wanted.setdefault(self._slot_periods[bit.bit_length() - 1], set()).add(name)
+        found = []
+        for period in (self if periods is None else periods):
+            if period not in wanted:
+                continue
+            with self._lock:
+                partition = self._partition(period)
+                if partition is not None:
+                    found.extend((period, name, amount)
+                                 for name, amount in partition.pick(wanted[period]))
+        return found
+
+    def total(self, period):
+        totals = self._totals.get(period)
+        return totals[0] / 100 if totals else 0
+
+    def count(self, period):
+        totals = self._totals.get(period)
+        return totals[1] if totals else 0
+
+    def manifest(self):
+        with self._lock:
+            return {period: [total / 100, count] for period, (total, count) in self._totals.items()}
+
+    def take_dirty(self):
+        """Copies of the partitions changed since they were last written. They
+        stay in memory until finish_write reports the outcome."""
+        with self._lock:
+            changed = {period: self._partitions[period].copy() for period in self._dirty}
+            self._writing.update(self._dirty)
+            self._dirty.clear()
+            return changed
+
+    def finish_write(self, periods, written):
+        with self._lock:
+            self._writing.difference_update(periods)
+            if not written:
+                self._dirty.update(period for period in periods if period in self._totals)
+
+    def check_invariants(self):
+        """Recompute the totals of loaded partitions and check the pins"""
+        with self._lock:
+            for period, partition in self._partitions.items():
+                if self.count(period) != len(partition):
+                    raise AssertionError(f"count mismatch for {period}")
+                if self._totals[period][0] != partition.total_cents():
+                    raise AssertionError(f"total mismatch for {period}")
+                if partition._names != sorted(set(partition._names)):
+                    raise AssertionError(f"names out of order in {period}")
+                bit = 1 << self._slots[period]
+                if any(not self._periods_of.get(name, 0) & bit for name in partition):
+                    raise AssertionError(f"name index misses names in {period}")
+            if not set(self._partitions) <= set(self._totals):
+                raise AssertionError("partition loaded for an unknown period")
+            if not self._dirty <= set(self._partitions):
+                raise AssertionError("modified partition was dropped")
+
+class Categories(dict):
+    """category -> [expense names], plus member sets and name -> categories"""
+
+    def __init__(self, data=None):
+        super().__init__()
+        self._members = {}
+        self._categories_of = {}
+        self._order = {}
+        self._next_order = 0
+        for category, names in (data or {}).items():
+            self[category] = names
+
+    def __setitem__(self, category, names):
+        if category in self:
+            self._unindex(category)
+        else:
+            self._order[category] = self._next_order
+            self._next_order += 1
+        # Interned, so a name is stored once however many months and
+        # categories hold it
+        names = [sys.intern(name) for name in names]
+        super().__setitem__(category, names)
+        self._members[category] = set()
+        for name in names:
+            self._index(category, name)
+
+    def __delitem__(self, category):
+        self._unindex(category)
+        del self._order[category]
+        super().__delitem__(category)
+
+    def pop(self, category, *default):
+        if category not in self:
+            return super().pop(category, *default)
+        names = self[category]
+        del self[category]
+        return names
+
+    def setdefault(self, category, default=None):
+        if category not in self:
+            self[category] = default or []
+        return self[category]
+
+    def update(self, *args, **kwargs):
+        for category, names in dict(*args, **kwargs).items():
+            self[category] = names
+
+    def clear(self):
+        super().clear()
+        self._members.clear()
+        self._categories_of.clear()
+        self._order.clear()
+
+    def _index(self, category, name):
+        self._members[category].add(name)
+        self._categories_of.setdefault(name, set()).add(category)
+
+    def _unindex(self, category):
+        for name in self._members.pop(category, ()):
+            owners = self._categories_of[name]
+            owners.discard(category)
+            if not owners:
+                del self._categories_of[name]
+
+    def add_member(self, category, name):
+        """Append name to category; False if it was already a member"""
+        if category not in self:
+            self[category] = []
+        if name in self._members[category]:
+            return False
+        name = sys.intern(name)
+        super().__getitem__(category).append(name)
+        self._index(category, name)
+        return True
+
+    def members(self, category):
+        return self._members.get(category, set())
+
+    def position(self, category):
+        """Where category sits: its index in iteration order and its tie-break order"""
+        return list(self).index(category), self._order[category]
+
+    def reinsert(self, category, names, position):
+        """Put a removed category back at a position() taken before it went"""
+        index, order = position
+        later = [(other, super(Categories, self).pop(other)) for other in list(self)[index:]]
+        self[category] = names
+        self._order[category] = order
+        for other, other_names in later:
+            super().__setitem__(other, other_names)
+
+    def category_of(self, name, default=None):
+        """The category name belongs to; the last-added category wins on ties"""
+        owners = self._categories_of.get(name)
+        if not owners:
+            return default
+        return max(owners, key=self._order.__getitem__)
+
+    def check_invariants(self):
+        """Recompute every index from scratch and compare"""
+        categories_of = {}
+        for category, names in self.items():
+            if set(names) != self._members.get(category):
+                raise AssertionError(f"member set out of date for {category}")
+            for name in names:
+                categories_of.setdefault(name, set()).add(category)
+        if categories_of != self._categories_of or set(self._members) != set(self):
+            raise AssertionError("category index out of date")
+
+def category_of(categories, name, default=None):
+    if isinstance(categories, Categories):
+        return categories.category_of(name, default)
+    category = default
+    for category_name, expense_list in categories.items():
+        if name in expense_list:
+            category = category_name
+    return category
+
+def _set_expense(expenses, month, name, amount):
+    if isinstance(expenses, Expenses):
+        expenses.set_amount(month, name, amount)
+        return
     if month not in expenses:
         expenses[month] = {}
-    expenses[month][expense] = amount
+    expenses[month][name] = amount
 
+def _delete_expense(expenses, month, name):
+    if isinstance(expenses, Expenses):
+        return expenses.delete_amount(month, name)
+    if month in expenses and name in expenses[month]:
+        del expenses[month][name]
+        return True
+    return False
+
+def _add_to_category(categories, category, name):
+    if isinstance(categories, Categories):
+        return categories.add_member(category, name)
+    if category not in categories:
+        categories[category] = []
+    if name in categories[category]:
+        return False
+    categories[category].append(name)
+    return True
+
+# Expenses
+@_mutator
+def add_expense(expenses, month, expense, amount):
+    month = period_key(month)
+    _set_expense(expenses, month, expense, amount)
+    _record_expense_change(month, expense)
+    _journal("set", month, expense, amount)
+
+@_mutator
 def update_expense(expenses, month, name, new_amount):
-    month = month.lower()
-    expenses[month][name] = new_amount
+    month = period_key(month)
+    if month not in expenses:
+        raise KeyError(month)
+    _set_expense(expenses, month, name, new_amount)
+    _record_expense_change(month, name)
+    _journal("set", month, name, new_amount)
 
+@_mutator
 def delete_expense(expenses, month, expense):
-    month = month.lower()
-    if month in expenses and expense in expenses[month]:
-        del expenses[month][expense]
+    month = period_key(month)
+    if _delete_expense(expenses, month, expense):
+        _record_expense_change(month, expense)
+        _journal("del", month, expense)
 
 def list_expenses(expenses, month=None):
     if month:
-        return expenses.get(month.lower(), {})
-    return expenses
+        return plain(expenses.get(period_key(month), {}))
+    return {period: plain(month_expenses) for period, month_expenses in expenses.items()}
 
 def monthly_summary(expenses, month):
-    month_expenses = expenses.get(month.lower(), {})
+    if isinstance(expenses, Expenses):
+        return expenses.total(period_key(month))
+    month_expenses = expenses.get(period_key(month), {})
     return sum(month_expenses.values())
+
+def expense_count(expenses, month=None):
+    """Expenses in month, or in every month, without loading partitions"""
+    months = [period_key(month)] if month else list(expenses)
+    if isinstance(expenses, Expenses):
+        return sum(expenses.count(period) for period in months)
+    return sum(len(expenses.get(period, {})) for period in months)
+
+def periods_in(expenses, from_year=None, to_year=None):
+    """The periods with expenses within the year range, without loading them"""
+    return [period for period in expenses if in_years(period, from_year, to_year)]
 # Categories
+@_mutator
 def add_category(categories, category):
+    _record_category_change(categories.get(category, []), category)
     categories[category] = []
+    _journal("cat", category, [])
 
+@_mutator
 def delete_category(categories, category):
     if category in categories:
+        _record_category_change(categories[category], category)
         del categories[category]
+        _journal("cat_del", category)
 
+@_mutator
 def add_expense_to_category(categories, category, name):
-    if category not in categories:
-        categories[category] = []
-    
-    if name not in categories[category]:
-        categories[category].append(name)
+    if _add_to_category(categories, category, name):
+        _record_category_change([name], category)
+        _journal("cat_add", category, name)
 
 def filter_by_category(categories, category):
     if category not in categories:
         return set()
     
+    if isinstance(categories, Categories):
+        return set(categories.members(category))
+
     category_items = set(categories[category])
 
     return category_items
 
-def category_expenses(expenses, categories, category):
+def category_expenses(expenses, categories, category, from_year=None, to_year=None):
     if category not in categories:
         return {}
     
     category_expenses = {}
+
+    if isinstance(expenses, Expenses) and isinstance(categories, Categories):
+        periods = periods_in(expenses, from_year, to_year)
+        for month, expense_name, amount in expenses.select(set(categories.members(category)), periods):
+            if month not in category_expenses:
+                category_expenses[month] = {}
+            category_expenses[month][expense_name] = amount
+        return category_expenses
+
     expense_names = set(categories[category])
 
     for month, month_expenses in expenses.items():
+        if not in_years(month, from_year, to_year):
+            continue
         for expense_name, amount in month_expenses.items():
             if expense_name in expense_names:
                 if month not in category_expenses:
@@ -81,18 +1423,26 @@ def category_expenses(expenses, categories, category):
     
     return category_expenses
 # Budgets   
+@_mutator
 def set_budget(budgets, month, limit):
-    budgets[month.lower()] = limit
+    month = period_key(month)
+    budgets[month] = limit
+    _record_budget_change([month])
+    _journal("budget", month, limit)
 
+@_mutator
 def adjust_budget(budgets, month, new_budget):
-    budgets[month.lower()] = new_budget
+    month = period_key(month)
+    budgets[month] = new_budget
+    _record_budget_change([month])
+    _journal("budget", month, new_budget)
 
 def get_budget(budgets, month):
-    return budgets.get(month.lower(), None)
+    return budgets.get(period_key(month), None)
 
 def check_budget(expenses, budgets, month):
     total_spent = monthly_summary(expenses, month)
-    budget = budgets.get(month.lower(), 0)
+    budget = budgets.get(period_key(month), 0)
     remaining = budget - total_spent
 
     return {
@@ -101,77 +1451,398 @@ def check_budget(expenses, budgets, month):
         "remaining": remaining
     }
 
+def check_all_budgets(expenses, budgets, from_year=None, to_year=None):
+    """Budget status for every period that has expenses or a budget"""
+    months = [month for month in budgets if in_years(month, from_year, to_year)]
+    months.extend(month for month in periods_in(expenses, from_year, to_year)
+                  if month not in budgets)
+    return {month: check_budget(expenses, budgets, month) for month in months}
+
+@_mutator
 def clear_expenses(expenses, categories, budgets):
     expenses.clear()
+    _record_full_change()
+    _journal("clear", "expenses")
     save_data(expenses, categories, budgets)
 
+@_mutator
 def clear_categories(expenses, categories, budgets):
     categories.clear()
+    _record_full_change()
+    _journal("clear", "categories")
     save_data(expenses, categories, budgets)
 
+@_mutator
 def clear_budgets(expenses, categories, budgets):
     budgets.clear()
+    _record_budget_change()
+    _journal("clear", "budgets")
     save_data(expenses, categories, budgets)
 
+@_mutator
 def clear_all_data(expenses, categories, budgets):
     expenses.clear()
     categories.clear()
     budgets.clear()
+    _record_full_change()
+    _journal("clear", "expenses")
+    _journal("clear", "categories")
+    _journal("clear", "budgets")
     save_data(expenses, categories, budgets)
 
+def bootstrap_data(expenses, categories, budgets, from_year=None, to_year=None):
+    """Everything the dashboard needs at startup, copied consistently.
+
+    Expenses, totals and budgets are limited to the year range, so only the
+    partitions in it are loaded; "years" lists every year with data.
+    """
+    with _journal_lock:
+        periods = periods_in(expenses, from_year, to_year)
+        years = {int(period[:4]) for period in expenses}
+        years.update(int(period[:4]) for period in budgets)
+        return {
+            "expenses": {month: plain(expenses[month]) for month in periods},
+            "categories": {category: list(names) for category, names in categories.items()},
+            "budgets": {month: limit for month, limit in budgets.items()
+                        if in_years(month, from_year, to_year)},
+            "totals": {month: monthly_summary(expenses, month) for month in periods},
+            "budget_status": check_all_budgets(expenses, budgets, from_year, to_year),
+            "years": sorted(years),
+        }
+
+# Batches. A batch maps an ordered list of {"op": ..., field: value} dicts
+# onto the mutators above and applies them all-or-nothing under one hold of
+# the journal lock: before each step the cells it touches are remembered, and
+# a failure puts them back and drops the batch's unsaved journal records.
+# Callers persist once afterwards.
+# op -> (data it changes, mutator, fields passed to it in order)
+BATCH_OPERATIONS = {
+    "add_expense": ("expenses", add_expense, ("month", "name", "amount")),
+    "update_expense": ("expenses", update_expense, ("month", "name", "amount")),
+    "delete_expense": ("expenses", delete_expense, ("month", "name")),
+    "add_category": ("categories", add_category, ("category",)),
+    "delete_category": ("categories", delete_category, ("category",)),
+    "add_expense_to_category": ("categories", add_expense_to_category, ("category", "name")),
+    "set_budget": ("budgets", set_budget, ("month", "amount")),
+    "adjust_budget": ("budgets", adjust_budget, ("month", "amount")),
+}
+
+def _parse_operation(index, operation):
+    """Validate one batch entry up front; returns (op, args)"""
+    if not isinstance(operation, dict) or operation.get("op") not in BATCH_OPERATIONS:
+        raise ValueError(f"Operation {index}: unknown or missing op")
+    op = operation["op"]
+    args = []
+    for field in BATCH_OPERATIONS[op][2]:
+        value = operation.get(field)
+        if field == "amount":
+            # float() would take JSON true as 1.0, and numeric strings too
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"Operation {index} ({op}): amount must be a number, not {value!r}")
+            try:
+                value = _parse_amount(value)
+            except ValueError:
+                raise ValueError(f"Operation {index} ({op}): invalid amount {value!r}")
+        elif not isinstance(value, str) or not value:
+            raise ValueError(f"Operation {index} ({op}): missing {field}")
+        elif field == "month":
+            try:
+                value = period_key(value, operation.get("year"))
+            except ValueError as e:
+                raise ValueError(f"Operation {index} ({op}): {e}")
+        args.append(value)
+    return op, args
+
+def _expense_cell(expenses, month, name, *_):
+    return month in expenses, expenses.get(month, {}).get(name)
+
+def _restore_expense(expenses, cell, month, name, *_):
+    had_month, amount = cell
+    if amount is not None:
+        _set_expense(expenses, month, name, amount)
+        return
+    _delete_expense(expenses, month, name)
+    if not had_month:
+        expenses.pop(month, None)
+
+def _category_cell(categories, category, *_):
+    if category not in categories:
+        return None
+    return list(categories[category]), categories.position(category)
+
+def _restore_category(categories, cell, category, *_):
+    if cell is None:
+        categories.pop(category, None)
+    elif category in categories:
+        categories[category] = cell[0]
+    else:
+        # Deleted by the batch: back where it was, so order and ties are unchanged
+        categories.reinsert(category, *cell)
+
+def _budget_cell(budgets, month, *_):
+    return budgets.get(month)
+
+def _restore_budget(budgets, cell, month, *_):
+    if cell is None:
+        budgets.pop(month, None)
+    else:
+        budgets[month] = cell
+
+_BATCH_CELLS = {
+    "expenses": (_expense_cell, _restore_expense),
+    "categories": (_category_cell, _restore_category),
+    "budgets": (_budget_cell, _restore_budget),
+}
+
+def _batch_result(target, data, args):
+    if target == "expenses":
+        month, name = args[0], args[1]
+        return {"month": month, "name": name, "amount": data.get(month, {}).get(name)}
+    if target == "categories":
+        category = args[0]
+        return {"category": category,
+                "expenses": list(data[category]) if category in data else None}
+    return {"month": args[0], "budget": data.get(args[0])}
+
+@_mutator
+def apply_batch(expenses, categories, budgets, operations):
+    """Apply a list of operations atomically; returns one result per operation.
+
+    Raises ValueError naming the failing operation, leaving the data untouched.
+    """
+    global _journal_seq
+    calls = [_parse_operation(index, operation) for index, operation in enumerate(operations)]
+    data = {"expenses": expenses, "categories": categories, "budgets": budgets}
+    pending, seq = len(_pending_records), _journal_seq
+    undo = []
+    results = []
+    for index, (op, args) in enumerate(calls):
+        target, mutator, _ = BATCH_OPERATIONS[op]
+        remember, restore = _BATCH_CELLS[target]
+        undo.append((restore, data[target], remember(data[target], *args), args))
+        try:
+            mutator(data[target], *args)
+        except Exception as e:
+            for restore, target_data, cell, cell_args in reversed(undo):
+                restore(target_data, cell, *cell_args)
+            del _pending_records[pending:]
+            # Renumber from seq, since other workers only replay records above
+            # the last one they applied, but still move the version past any
+            # seen while the batch was half applied
+            _journal_seq = seq
+            _journal("rollback")
+            _record_rollback()
+            raise ValueError(f"Operation {index} ({op}) failed: {e!r}") from e
+        results.append(_batch_result(target, data[target], args))
+    return results
+
+# CSV import. Files are read through csv.DictReader in chunks of
+# IMPORT_CHUNK_SIZE rows, so only one chunk is ever held in memory. Each chunk
+# is validated, applied under the journal lock and journaled as one record.
+IMPORT_CHUNK_SIZE = 5000
+MAX_REPORTED_REJECTS = 100
+
+CSV_COLUMNS = {
+    "expenses": ("Month", "Expense", "Amount"),
+    "categories": ("Category", "Expenses"),
+    "budgets": ("Month", "Limit"),
+}
+
+def _parse_amount(value):
+    amount = float(value)
+    if not math.isfinite(amount):
+        raise ValueError(f"invalid amount {value!r}")
+    # Range-checked here, so a chunk never fails halfway through being applied
+    to_cents(amount)
+    return amount
+
+def _parse_row(kind, row):
+    if kind == "expenses":
+        month, name = row["Month"].strip(), row["Expense"]
+        if not month or not name:
+            raise ValueError("Month and Expense are required")
+        return period_key(month), name, _parse_amount(row["Amount"])
+    if kind == "categories":
+        if not row["Category"]:
+            raise ValueError("Category is required")
+        return row["Category"], row["Expenses"].split(",") if row["Expenses"] else []
+    month = row["Month"].strip()
+    if not month:
+        raise ValueError("Month is required")
+    return period_key(month), _parse_amount(row["Limit"])
+
+@_mutator
+def _apply_chunk(expenses, categories, budgets, kind, rows, record_changes):
+    if kind == "expenses":
+        for month, name, amount in rows:
+            _set_expense(expenses, month, name, amount)
+            if record_changes:
+                _record_expense_change(month, name)
+        if not record_changes:
+            _record_bulk_change()
+        _journal("set_many", [list(row) for row in rows], rows=len(rows))
+    elif kind == "categories":
+        for category, names in rows:
+            _record_category_change(categories.get(category, []), category)
+            categories[category] = names
+            _record_category_change(names)
+            _journal("cat", category, names)
+    else:
+        for month, limit in rows:
+            budgets[month] = limit
+            _journal("budget", month, limit)
+        _record_budget_change([month for month, _ in rows])
+
+def import_csv_stream(expenses, categories, budgets, kind, stream,
+                      on_chunk=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """Import one CSV (expenses, categories or budgets) from a text stream.
+
+    on_chunk, if given, is called as on_chunk(rows, apply) for each batch of
+    parsed expense rows (month, name, amount) and must call apply() to put
+    them into the tracker. Those rows are treated as loaded into analytics
+    and are not added to the change log.
+    Returns a report with imported/rejected counts and the first rejected
+    rows with their line numbers.
+    """
+    report = {"kind": kind, "imported": 0, "rejected": 0, "errors": []}
+
+    def reject(line, error):
+        report["rejected"] += 1
+        if len(report["errors"]) < MAX_REPORTED_REJECTS:
+            report["errors"].append({"line": line, "error": str(error)})
+
+    reader = csv.DictReader(stream)
+    missing = [column for column in CSV_COLUMNS[kind] if column not in (reader.fieldnames or ())]
+    if missing:
+        reject(1, f"missing columns: {', '.join(missing)}")
+        return report
+
+    chunk = []
+    rows = iter(reader)
+    while True:
+        try:
+            row = next(rows, None)
+        except csv.Error as e:
+            reject(reader.line_num, e)
+            break
+        if row is not None:
+            try:
+                chunk.append(_parse_row(kind, row))
+            except (ValueError, TypeError, AttributeError) as e:
+                reject(reader.line_num, e)
+        if chunk and (row is None or len(chunk) >= chunk_size):
+            if on_chunk is not None and kind == "expenses":
+                on_chunk(chunk, functools.partial(
+                    _apply_chunk, expenses, categories, budgets, kind, chunk, False))
+            else:
+                _apply_chunk(expenses, categories, budgets, kind, chunk, True)
+            report["imported"] += len(chunk)
+            chunk = []
+        if row is None:
+            break
+    return report
+
 def import_from_csv(expenses, categories, budgets):
-    try:
-        with open("expenses.csv", "r") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                month = row["Month"].lower()
-                if month not in expenses:
-                    expenses[month] = {}
-                expenses[month][row["Expense"]] = float(row["Amount"])
-    except FileNotFoundError:
-        print("expenses.csv not found, skipping...")
-    except Exception as e:
-        print(f"Error: importing expenses {e}")
-    try:
-        with open("categories.csv", "r") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                categories[row["Category"]] = row["Expenses"].split(",") if row["Expenses"] else []
-    except FileNotFoundError:
-        print("categories.csv not found, skipping...")
-    except Exception as e:
-        print(f"Error: importing categories {e}")
-    try:
-        with open("budgets.csv", "r") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                budgets[row["Month"].lower()] = float(row["Limit"])
-    except FileNotFoundError:
-        print("budgets.csv not found, skipping...")
-    except Exception as e:
-        print(f"Error: importing budgets {e}")
+    """Import expenses.csv, categories.csv and budgets.csv from the working directory"""
+    reports = {}
+    for kind in ("expenses", "categories", "budgets"):
+        try:
+            with open(f"{kind}.csv", "r", newline="") as f:
+                reports[kind] = import_csv_stream(expenses, categories, budgets, kind, f)
+        except FileNotFoundError:
+            print(f"{kind}.csv not found, skipping...")
+        except Exception as e:
+            print(f"Error: importing {kind} {e}")
+    return reports
+
+# Export. Rows are produced by generators and joined into batches of
+# EXPORT_BATCH_ROWS, so a response can stream without building the file in
+# memory. Each month's items are copied under the journal lock before being
+# walked, so concurrent edits can't break the iteration.
+EXPORT_BATCH_ROWS = 1000
+
+class _LineWriter:
+    """File-like target that hands csv.writer's output straight back"""
+    def write(self, line):
+        return line
+
+def _batched(lines, size=EXPORT_BATCH_ROWS):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+def iter_expenses(expenses, categories=None, month=None, category=None):
+    """Yield (month, name, amount), optionally filtered by month and category"""
+    month = period_key(month) if month else None
+    if category is not None:
+        names = filter_by_category(categories, category)
+        if isinstance(expenses, Expenses):
+            yield from expenses.select(set(names), [month] if month else None)
+            return
+
+    with _journal_lock:
+        months = [month] if month else list(expenses)
+    for expense_month in months:
+        with _journal_lock:
+            items = list(expenses.get(expense_month, {}).items())
+        for name, amount in items:
+            if category is None or name in names:
+                yield expense_month, name, amount
+
+def export_csv(expenses, categories, budgets, kind="expenses", month=None, category=None):
+    """Yield one of the three CSV exports in batches of text"""
+    writer = csv.writer(_LineWriter())
+
+    def lines():
+        yield writer.writerow(CSV_COLUMNS[kind])
+        if kind == "expenses":
+            for row in iter_expenses(expenses, categories, month, category):
+                yield writer.writerow(row)
+        elif kind == "categories":
+            with _journal_lock:
+                items = [(name, list(names)) for name, names in categories.items()
+                         if category is None or name == category]
+            for name, names in items:
+                yield writer.writerow([name, ",".join(names)])
+        else:
+            with _journal_lock:
+                items = [(name, limit) for name, limit in budgets.items()
+                         if not month or name == period_key(month)]
+            for name, limit in items:
+                yield writer.writerow([name, limit])
+
+    return _batched(lines())
+
+def export_ndjson(expenses, categories, budgets, month=None, category=None):
+    """Yield expenses, categories and budgets as newline-delimited JSON records"""
+    def lines():
+        for expense_month, name, amount in iter_expenses(expenses, categories, month, category):
+            yield json.dumps({"type": "expense", "month": expense_month,
+                              "expense": name, "amount": amount}) + "\n"
+        with _journal_lock:
+            category_items = [(name, list(names)) for name, names in categories.items()
+                              if category is None or name == category]
+            budget_items = [(name, limit) for name, limit in budgets.items()
+                            if not month or name == period_key(month)]
+        for name, names in category_items:
+            yield json.dumps({"type": "category", "category": name, "expenses": names}) + "\n"
+        for name, limit in budget_items:
+            yield json.dumps({"type": "budget", "month": name, "limit": limit}) + "\n"
+
+    return _batched(lines())
 
 def export_to_csv(expenses, categories, budgets):
     try: 
-        with open("expenses.csv", "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(["Month", "Expense", "Amount"])
-            for month, month_expenses in expenses.items():
-                for expense, amount in month_expenses.items():
-                    writer.writerow([month, expense, amount])
-        with open("categories.csv", "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(["Category", "Expenses"])
-            for category, exp_list in categories.items():
-                writer.writerow([category, ",".join(exp_list)])
-        with open("budgets.csv", "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(["Month", "Limit"])
-            for month, limit in budgets.items():
-                writer.writerow([month, limit])
+        for kind in ("expenses", "categories", "budgets"):
+            with open(f"{kind}.csv", "w", newline="") as f:
+                f.writelines(export_csv(expenses, categories, budgets, kind))
         print("Data exported successfully!")
         return True
     except Exception as e:
         print(f"Error exporting data: {e}")
         return False
-
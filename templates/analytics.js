@@ -33,10 +33,11 @@ async function initializeCharts() {
 // Refresh analytics data from backend
 async function refreshAnalyticsData() {
     try {
+        const year = `?year=${selectedYear()}`;
         const [trends, breakdown, insights] = await Promise.all([
-            fetch('/analytics/monthly_trends').then(r => r.json()),
-            fetch('/analytics/category_breakdown').then(r => r.json()),
-            fetch('/analytics/insights').then(r => r.json())
+            fetch('/analytics/monthly_trends' + year).then(r => r.json()),
+            fetch('/analytics/category_breakdown' + year).then(r => r.json()),
+            fetch('/analytics/insights' + year).then(r => r.json())
         ]);
         
         analyticsCache = {
@@ -55,6 +56,17 @@ async function refreshAnalyticsData() {
     }
 }
 
+// Take analytics rows pushed by the server ({trends, breakdown, insights} for
+// the selected year) instead of fetching them; redraw if they are on screen
+async function applyAnalyticsRows(rows, redraw) {
+    analyticsCache = { ...rows, lastUpdated: new Date() };
+    if (redraw) {
+        await createMonthlyTrendChart();
+        await createCategoryBreakdownChart();
+        await createBudgetComparisonChart();
+    }
+}
+
 // Enhanced Monthly Trends Chart with backend data
 async function createMonthlyTrendChart() {
     const ctx = document.getElementById('monthlyTrendChart');
@@ -74,10 +86,11 @@ async function createMonthlyTrendChart() {
         const monthOrder = ['January', 'February', 'March', 'April', 'May', 'June', 
                            'July', 'August', 'September', 'October', 'November', 'December'];
         
-        // Ensure all months are represented
+        // Ensure all months of the selected year are represented
+        const year = selectedYear();
         const orderedData = monthOrder.map(month => {
             const found = monthlyData.find(item => 
-                item.month.toLowerCase() === month.toLowerCase()
+                periodKey(item.month, year) === periodKey(month, year)
             );
             return {
                 month: month,
@@ -318,7 +331,7 @@ function calculateMonthlyTotalsFromFrontend() {
                        'july', 'august', 'september', 'october', 'november', 'december'];
     
     return monthOrder.map(month => {
-        const monthExpenses = window.expenses[month] || {};
+        const monthExpenses = window.expenses[periodKey(month, selectedYear())] || {};
         const total = Object.values(monthExpenses)
             .reduce((sum, amount) => sum + parseFloat(amount || 0), 0);
         
@@ -383,7 +396,7 @@ function calculateBudgetComparison() {
     let monthlyTotals;
     if (analyticsCache.trends && analyticsCache.trends.length > 0) {
         monthlyTotals = analyticsCache.trends.reduce((acc, item) => {
-            acc[item.month.toLowerCase()] = item.total;
+            acc[item.month] = item.total;
             return acc;
         }, {});
     } else {
@@ -391,8 +404,9 @@ function calculateBudgetComparison() {
     }
     
     monthOrder.forEach(month => {
-        const spent = monthlyTotals[month] || 0;
-        const budget = parseFloat((window.budgets && window.budgets[month]) || 0);
+        const period = periodKey(month, selectedYear());
+        const spent = monthlyTotals[period] || 0;
+        const budget = parseFloat((window.budgets && window.budgets[period]) || 0);
         
         // Only include months that have either expenses or budgets
         if (spent > 0 || budget > 0) {
@@ -576,7 +590,7 @@ function performBasicSearch(searchParams) {
     
     for (const [expenseMonth, monthExpenses] of Object.entries(window.expenses)) {
         // Filter by month if specified
-        if (month && expenseMonth.toLowerCase() !== month.toLowerCase()) {
+        if (month && expenseMonth !== periodKey(month, selectedYear())) {
             continue;
         }
         
@@ -18,7 +18,8 @@
                 
                 // Allow form to submit normally, then handle post-submission
                 setTimeout(async () => {
-                    if (window.app) {
+                    // With the event stream open, the change arrives by itself
+                    if (window.app && !window.app.state.live) {
                         await window.app.syncAnalytics();
                         window.app.updateUI();
                     }
@@ -44,7 +45,7 @@
                 }
                 
                 setTimeout(async () => {
-                    if (window.app) {
+                    if (window.app && !window.app.state.live) {
                         await window.app.syncAnalytics();
                         window.app.updateUI();
                     }
@@ -70,7 +71,7 @@
                 }
                 
                 setTimeout(async () => {
-                    if (window.app) {
+                    if (window.app && !window.app.state.live) {
                         await window.app.syncAnalytics();
                         window.app.updateUI();
                     }
@@ -159,12 +160,8 @@
                     showToast('Analytics synced successfully!', 'success');
                 } else {
                     // Fallback to direct API call
-                    const response = await fetch('/sync_analytics');
-                    if (response.ok) {
-                        showToast('Analytics synced successfully!', 'success');
-                    } else {
-                        throw new Error('Sync failed');
-                    }
+                    await waitForJob(await fetch('/sync_analytics'));
+                    showToast('Analytics synced successfully!', 'success');
                 }
             } catch (error) {
                 console.error('Analytics sync error:', error);
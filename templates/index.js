@@ -1,3 +1,43 @@
+const MONTH_NAMES = ['january', 'february', 'march', 'april', 'may', 'june',
+                     'july', 'august', 'september', 'october', 'november', 'december'];
+
+// Expenses and budgets are keyed by "YYYY-MM" periods; a month name
+// resolves against the given year
+function periodKey(month, year) {
+    if (/^\d{4}-\d{2}$/.test(month)) return month;
+    const number = MONTH_NAMES.indexOf(month.toLowerCase()) + 1;
+    return `${year}-${String(number).padStart(2, '0')}`;
+}
+
+// Syncs, imports and exports run as background jobs: their response describes
+// the job, and its URL answers with ?wait=<seconds> once it finishes
+async function waitForJob(response) {
+    let job = await response.json();
+    if (!job.id) {
+        throw new Error(job.error || `Request failed: ${response.status}`);
+    }
+    while (job.status === 'queued' || job.status === 'running') {
+        const poll = await fetch(`${job.url}?wait=10`);
+        job = await poll.json();
+        if (!poll.ok) {
+            throw new Error(job.error || `Job status failed: ${poll.status}`);
+        }
+    }
+    if (job.status === 'failed') {
+        throw new Error(job.error);
+    }
+    return job;
+}
+
+// The number in a /bootstrap "version" or event id ("<boot>-<n>" or "<n>")
+function dataVersion(tag) {
+    return Number(String(tag).split('-').pop());
+}
+
+function selectedYear() {
+    return typeof app !== 'undefined' ? app.state.currentYear : new Date().getFullYear();
+}
+
 // Enhanced ExpenseApp class with analytics integration
 class ExpenseApp {
     constructor() {
@@ -6,9 +46,15 @@ class ExpenseApp {
             categories: {},
             budgets: {},
             currentMonth: 'january',
+            currentYear: new Date().getFullYear(),
+            years: [],
+            version: 0,
+            versionTag: null,
+            live: false,
             loading: false,
             analyticsReady: false
         };
+        this.events = null;
         
         this.analyticsEndpoints = {
             sync: '/sync_analytics',
@@ -26,6 +72,87 @@ class ExpenseApp {
         await this.loadAllData();
         await this.syncAnalytics();
         this.setupEventListeners();
+        this.connectEvents();
+        this.updateUI();
+    }
+
+    // Server-sent deltas keep the state current after every write, from this
+    // tab or any other; until the stream is open, edits re-fetch instead
+    connectEvents() {
+        if (!window.EventSource || this.events) return;
+        const version = encodeURIComponent(this.state.versionTag || '');
+        this.events = new EventSource(`/events?version=${version}`);
+        this.events.addEventListener('open', () => { this.state.live = true; });
+        this.events.addEventListener('error', () => { this.state.live = false; });
+        this.events.addEventListener('delta', event => this.applyDelta(JSON.parse(event.data)));
+        this.events.addEventListener('resync', () => this.resync());
+    }
+
+    async resync() {
+        await this.loadAllData();
+        this.updateUI();
+    }
+
+    applyDelta(delta) {
+        if (delta.version <= this.state.version) return;
+        if (delta.since > this.state.version) {
+            // Missed a change in between
+            this.resync();
+            return;
+        }
+        const year = `${this.state.currentYear}-`;
+        const inYear = month => month.startsWith(year);
+
+        for (const [month, name, amount] of delta.expenses) {
+            if (!inYear(month)) continue;
+            const monthExpenses = this.state.expenses[month] || (this.state.expenses[month] = {});
+            if (amount === null) {
+                delete monthExpenses[name];
+            } else {
+                monthExpenses[name] = amount;
+            }
+        }
+        for (const [month, limit] of Object.entries(delta.budgets)) {
+            if (!inYear(month)) continue;
+            if (limit === null) {
+                delete this.state.budgets[month];
+            } else {
+                this.state.budgets[month] = limit;
+            }
+        }
+        for (const [month, status] of Object.entries(delta.budget_status)) {
+            if (inYear(month)) this.state.budgetStatus[month] = status;
+        }
+        for (const [category, names] of Object.entries(delta.categories)) {
+            if (names === null) {
+                delete this.state.categories[category];
+            } else {
+                this.state.categories[category] = names;
+            }
+        }
+        const years = Object.keys(delta.totals).map(month => parseInt(month, 10));
+        if (years.some(year => !this.state.years.includes(year))) {
+            this.state.years = [...new Set([...this.state.years, ...years])].sort();
+            this.updateYearSelector();
+        }
+        this.state.version = delta.version;
+
+        this.updateExpensesList();
+        this.updateMonthlySummary();
+        const rows = delta.analytics[this.state.currentYear];
+        if (rows && typeof applyAnalyticsRows === 'function') {
+            applyAnalyticsRows(rows, this.isAnalyticsTabActive());
+            if (this.isAnalyticsTabActive()) {
+                this.updateInsightsFromBackend(rows.insights);
+            }
+        }
+    }
+
+    // After a write: the event stream brings the result when it is open
+    async refreshAfterWrite(months) {
+        if (this.state.live) return;
+        await Promise.all(months.map(month => this.loadMonthData(month)));
+        await this.syncAnalytics();
         this.updateUI();
     }
     
@@ -37,37 +164,22 @@ class ExpenseApp {
         this.showGlobalLoading(true);
         
         try {
-            // Use your existing endpoints to load data
-            const [expensesRes, categoriesRes, budgetsRes] = await Promise.all([
-                this.fetchMonthExpenses('january'), // Start with January
-                fetch('/list_categories'),
-                fetch('/list_budgets')
-            ]);
-            
-            // Load all months for complete analytics
-            const allMonths = ['january', 'february', 'march', 'april', 'may', 'june',
-                             'july', 'august', 'september', 'october', 'november', 'december'];
-            
-            const monthlyData = await Promise.all(
-                allMonths.map(async (month) => {
-                    try {
-                        const response = await fetch(`/list_expense/${month}`);
-                        const data = await response.json();
-                        return { [month]: data };
-                    } catch (error) {
-                        console.warn(`Failed to load ${month} expenses:`, error);
-                        return { [month]: {} };
-                    }
-                })
-            );
-            
-            // Merge monthly data
-            this.state.expenses = monthlyData.reduce((acc, monthData) => {
-                return { ...acc, ...monthData };
-            }, {});
-            
-            this.state.categories = await categoriesRes.json();
-            this.state.budgets = await budgetsRes.json();
+            // One request for everything in the selected year; the browser
+            // revalidates it by ETag, so an unchanged reload costs a single 304
+            const response = await fetch(`/bootstrap?year=${this.state.currentYear}`, { cache: 'no-cache' });
+            if (!response.ok) {
+                throw new Error(`Bootstrap failed: ${response.status}`);
+            }
+            const data = await response.json();
+
+            this.state.expenses = data.expenses;
+            this.state.categories = data.categories;
+            this.state.budgets = data.budgets;
+            this.state.budgetStatus = data.budget_status;
+            this.state.years = data.years;
+            this.state.versionTag = data.version;
+            this.state.version = dataVersion(data.version);
+            this.updateYearSelector();
             
             console.log('All data loaded:', {
                 expenses: Object.keys(this.state.expenses).length + ' months',
@@ -88,11 +200,7 @@ class ExpenseApp {
     async syncAnalytics() {
         try {
             console.log('Syncing data to analytics...');
-            const response = await fetch(this.analyticsEndpoints.sync);
-            
-            if (!response.ok) {
-                throw new Error(`Analytics sync failed: ${response.status}`);
-            }
+            await waitForJob(await fetch(this.analyticsEndpoints.sync));
             
             this.state.analyticsReady = true;
             console.log('Analytics sync completed');
@@ -115,10 +223,11 @@ class ExpenseApp {
         }
         
         try {
+            const year = `?year=${this.state.currentYear}`;
             const [trends, breakdown, insights] = await Promise.all([
-                fetch(this.analyticsEndpoints.trends).then(r => r.json()),
-                fetch(this.analyticsEndpoints.breakdown).then(r => r.json()),
-                fetch(this.analyticsEndpoints.insights).then(r => r.json())
+                fetch(this.analyticsEndpoints.trends + year).then(r => r.json()),
+                fetch(this.analyticsEndpoints.breakdown + year).then(r => r.json()),
+                fetch(this.analyticsEndpoints.insights + year).then(r => r.json())
             ]);
             
             // Update global variables for analytics.js compatibility
@@ -177,6 +286,7 @@ class ExpenseApp {
         try {
             const formData = new FormData();
             formData.append('month', month);
+            formData.append('year', this.state.currentYear);
             formData.append('name', name);
             formData.append('amount', amount);
             
@@ -186,10 +296,7 @@ class ExpenseApp {
             });
             
             if (response.ok) {
-                // Reload data and sync analytics
-                await this.loadMonthData(month);
-                await this.syncAnalytics();
-                this.updateUI();
+                await this.refreshAfterWrite([month]);
             }
             
         } catch (error) {
@@ -202,15 +309,13 @@ class ExpenseApp {
             const formData = new FormData();
             formData.append('amount', newAmount);
             
-            const response = await fetch(`/update_expense/${month}/${encodeURIComponent(name)}`, {
+            const response = await fetch(`/update_expense/${this.periodKey(month)}/${encodeURIComponent(name)}`, {
                 method: 'POST',
                 body: formData
             });
             
             if (response.ok) {
-                await this.loadMonthData(month);
-                await this.syncAnalytics();
-                this.updateUI();
+                await this.refreshAfterWrite([month]);
             }
             
         } catch (error) {
@@ -220,25 +325,50 @@ class ExpenseApp {
     
     async deleteExpense(month, name) {
         try {
-            const response = await fetch(`/delete_expense/${month}/${encodeURIComponent(name)}`);
+            const response = await fetch(`/delete_expense/${this.periodKey(month)}/${encodeURIComponent(name)}`);
             
             if (response.ok) {
-                await this.loadMonthData(month);
-                await this.syncAnalytics();
-                this.updateUI();
+                await this.refreshAfterWrite([month]);
             }
             
         } catch (error) {
             console.error('Error deleting expense:', error);
         }
     }
-    
+
+    // Apply many edits in one round trip, e.g.
+    // [{op: 'add_expense', month: 'march', name: 'Rent', amount: 900}]
+    // Month names are taken to be in the selected year
+    async applyBatch(operations) {
+        try {
+            operations = operations.map(op => op.month ? {...op, month: this.periodKey(op.month)} : op);
+            const response = await fetch('/batch', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(operations)
+            });
+            const result = await response.json();
+
+            if (!response.ok) {
+                throw new Error(result.error);
+            }
+
+            const months = new Set(operations.filter(op => op.month).map(op => op.month));
+            await this.refreshAfterWrite([...months]);
+            return result;
+
+        } catch (error) {
+            console.error('Error applying batch:', error);
+        }
+    }
+
     // Load specific month data
     async loadMonthData(month) {
         try {
-            const response = await fetch(`/list_expense/${month}`);
+            const period = this.periodKey(month);
+            const response = await fetch(`/list_expense/${period}`);
             const monthData = await response.json();
-            this.state.expenses[month] = monthData;
+            this.state.expenses[period] = monthData;
         } catch (error) {
             console.error(`Error loading ${month} data:`, error);
         }
@@ -254,12 +384,13 @@ class ExpenseApp {
             const params = new URLSearchParams();
             if (query) params.append('query', query);
             if (category) params.append('category', category);
-            if (month) params.append('month', month);
+            if (month) params.append('month', this.periodKey(month));
             if (minAmount) params.append('min_amount', minAmount);
             if (maxAmount) params.append('max_amount', maxAmount);
             
             const response = await fetch(`${this.analyticsEndpoints.search}?${params}`);
-            return await response.json();
+            const page = await response.json();
+            return page.results || [];
             
         } catch (error) {
             console.error('Search error:', error);
@@ -299,6 +430,34 @@ class ExpenseApp {
         }
     }
     
+    async selectYear(year) {
+        this.state.currentYear = parseInt(year, 10);
+        await this.loadAllData();
+        this.updateUI();
+    }
+
+    updateYearSelector() {
+        const selector = document.getElementById('year-selector');
+        if (!selector) return;
+        const years = new Set([...this.state.years, new Date().getFullYear(), this.state.currentYear]);
+        selector.innerHTML = '';
+        for (const year of [...years].sort()) {
+            const option = document.createElement('option');
+            option.value = year;
+            option.textContent = year;
+            option.selected = year === this.state.currentYear;
+            selector.appendChild(option);
+        }
+        // The add-expense and budget forms post month names; the year goes alongside
+        document.querySelectorAll('.form-year').forEach(input => {
+            input.value = this.state.currentYear;
+        });
+    }
+
+    periodKey(month) {
+        return periodKey(month, this.state.currentYear);
+    }
+
     selectMonth(month, element) {
         this.state.currentMonth = month;
         
@@ -328,7 +487,7 @@ class ExpenseApp {
     }
     
     updateExpensesList() {
-        const currentExpenses = this.state.expenses[this.state.currentMonth] || {};
+        const currentExpenses = this.state.expenses[this.periodKey(this.state.currentMonth)] || {};
         const expensesList = document.getElementById('expensesList');
         
         if (Object.keys(currentExpenses).length === 0) {
@@ -370,13 +529,15 @@ class ExpenseApp {
         }
     }
     
+    // Totals and budgets come from the bootstrapped state, which every
+    // edit refreshes, so switching months needs no requests
     async updateMonthlySummary() {
         try {
-            const response = await fetch(`/monthly_summary/${this.state.currentMonth}`);
-            const summary = await response.json();
+            const monthExpenses = this.state.expenses[this.periodKey(this.state.currentMonth)] || {};
+            const total = Object.values(monthExpenses).reduce((sum, amount) => sum + parseFloat(amount), 0);
             
             document.getElementById('monthlyTotal').textContent = 
-                '$' + parseFloat(summary.total || 0).toFixed(2);
+                '$' + total.toFixed(2);
             
             await this.loadBudgetForMonth(this.state.currentMonth);
         } catch (error) {
@@ -386,14 +547,13 @@ class ExpenseApp {
     
     async loadBudgetForMonth(month) {
         try {
-            const response = await fetch(`/get_budget/${month}`);
-            const budgetData = await response.json();
+            const budgetValue = this.state.budgets[this.periodKey(month)];
             
             document.getElementById('monthlyBudget').textContent = 
-                '$' + parseFloat(budgetData.budget || 0).toFixed(2);
+                '$' + parseFloat(budgetValue || 0).toFixed(2);
             
             const totalSpent = parseFloat(document.getElementById('monthlyTotal').textContent.replace('$', ''));
-            const budget = parseFloat(budgetData.budget || 0);
+            const budget = parseFloat(budgetValue || 0);
             const remaining = budget - totalSpent;
             
             document.getElementById('monthlyRemaining').textContent = '$' + remaining.toFixed(2);
@@ -466,12 +626,15 @@ function selectMonth(month, element) {
     app.selectMonth(month, element);
 }
 
+function selectYear(year) {
+    app.selectYear(year);
+}
+
 // Export/Import functions
 async function importData() {
     try {
-        const response = await fetch('/import_from_csv');
-        const result = await response.json();
-        alert(result.message);
+        const job = await waitForJob(await fetch('/import_from_csv'));
+        alert(job.result.message);
     } catch (error) {
         console.error('Error importing data:', error);
         alert('Error importing data. Please try again.');
@@ -480,10 +643,10 @@ async function importData() {
 
 
 async function exportData() {
+    // Written by a job, then downloaded; ?kind=categories|budgets for the other files
     try {
-        const response = await fetch('/export_to_csv');
-        const result = await response.json();
-        alert(result.message);
+        const job = await waitForJob(await fetch('/export_to_csv'));
+        window.location.href = job.download;
     } catch (error) {
         console.error('Error exporting data:', error);
         alert('Error exporting data. Please try again.');
@@ -0,0 +1,92 @@
+import os
+import sys
+import json
+import math
+import random
+import subprocess
+
+import pytest
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "server")
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+# Every mutator rechecks the running totals and indexes (read at import)
+os.environ.setdefault("TRACKER_CHECK_INVARIANTS", "1")
+
+import tracker
+import analytics
+
+PERIODS = [f"{year}-{month:02d}" for year in (2024, 2025, 2026) for month in range(1, 13)]
+
+def generate(expenses, categories, count=5000, names=800, category_count=12, seed=1):
+    """Random expenses over PERIODS, most of their names in a category"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        tracker.add_expense(expenses, rng.choice(PERIODS),
+                            f"item {rng.randrange(names)} x{rng.randrange(5)}",
+                            round(rng.uniform(1, 500), 2))
+    known = sorted({name for month in expenses.values() for name in month})
+    for index in range(category_count):
+        for name in rng.sample(known, len(known) // (category_count + 2)):
+            tracker.add_expense_to_category(categories, f"cat{index}", name)
+
+def close(a, b):
+    """Equal, up to float rounding"""
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(close(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return isinstance(b, list) and len(a) == len(b) and all(close(x, y) for x, y in zip(a, b))
+    if isinstance(a, float) or isinstance(b, float):
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+    return a == b
+
+def load_from_disk(directory, env=None):
+    """[expenses, categories, budgets], as plain data, as a new process loads them"""
+    code = ("import json, tracker; e, c, b = tracker.load_data(); "
+            "print(json.dumps([tracker.list_expenses(e), c, b]))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=directory, check=True,
+                            capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONPATH=SERVER_DIR, **(env or {})))
+    return json.loads(result.stdout.splitlines()[-1])
+
+@pytest.fixture(scope="session")
+def workdir(tmp_path_factory):
+    """A scratch working directory holding the session's data.json and analytics.db"""
+    path = tmp_path_factory.mktemp("tracker")
+    # Not changed back: background writers keep using paths relative to it
+    # (tracker's filename defaults) after the session ends
+    os.chdir(path)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(tracker, "DATA_FILE", str(path / "data.json"))
+        patch.setattr(analytics, "DB_FILE", str(path / "analytics.db"))
+        yield path
+        tracker.flush(timeout=10)
+        analytics.close_connections()
+
+@pytest.fixture(scope="session")
+def dataset(workdir):
+    """(expenses, categories) of a generated dataset, synced to analytics.db"""
+    expenses, categories = tracker.Expenses(), tracker.Categories()
+    generate(expenses, categories)
+    analytics.setup_analytics_db()
+    # Other tests may have taken changes from the shared change log
+    tracker.mark_full_resync()
+    analytics.sync_data_to_analytics(expenses, categories)
+    return expenses, categories
+
+@pytest.fixture
+def fresh_db(workdir, tmp_path, monkeypatch):
+    """Point analytics at an empty analytics.db for one test"""
+    analytics.close_connections()
+    monkeypatch.setattr(analytics, "DB_FILE", str(tmp_path / "analytics.db"))
+    monkeypatch.setattr(analytics, "_schema_ready", False)
+    analytics.setup_analytics_db()
+    yield
+    analytics.close_connections()
+    tracker.mark_full_resync()
+
+@pytest.fixture(scope="session")
+def client(workdir):
+    """Flask test client; app loads data.json from the working directory on import"""
+    import app
+    return app.app.test_client()
@@ -0,0 +1,70 @@
+"""The ASGI adapter's handling of event streams"""
+import asyncio
+import time
+from urllib.parse import urlencode
+
+def scope(path, method="GET", query=""):
+    return {"type": "http", "method": method, "path": path, "query_string": query.encode(),
+            "headers": [(b"content-type", b"application/x-www-form-urlencoded")]}
+
+async def request(asgi, path, method="GET", body=b""):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi.app(scope(path, method), receive, send)
+    return sent
+
+async def open_stream(asgi):
+    """Start an /events request; returns (task, received chunks, disconnect event)"""
+    chunks, gone = [], asyncio.Event()
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message.get("body"):
+            chunks.append(message["body"])
+
+    return asyncio.ensure_future(asgi.app(scope("/events"), receive, send)), chunks, gone
+
+async def until(condition, timeout=5):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "timed out"
+        await asyncio.sleep(0.02)
+
+def test_idle_streams_hold_no_threads_and_end_on_disconnect(client):
+    import asgi
+    import events
+
+    async def main():
+        streams = [await open_stream(asgi) for _ in range(asgi.EXECUTOR_WORKERS + 4)]
+        await until(lambda: all(chunks for _, chunks, _ in streams))
+
+        started = time.monotonic()
+        sent = await request(asgi, "/list_budgets")
+        assert sent[0]["status"] == 200
+        assert time.monotonic() - started < 0.5
+
+        body = urlencode({"month": "2026-01", "name": "asgi-stream", "amount": "5"}).encode()
+        assert (await request(asgi, "/add_expense", "POST", body))[0]["status"] < 400
+        await until(lambda: all(b"event: " in b"".join(chunks) for _, chunks, _ in streams))
+
+        for task, _, gone in streams:
+            gone.set()
+        await asyncio.wait_for(asyncio.gather(*(task for task, _, _ in streams)), 5)
+
+    before = len(events._subscribers)
+    asyncio.run(main())
+    assert len(events._subscribers) == before
@@ -0,0 +1,60 @@
+"""Atomic /batch mutations"""
+import pytest
+
+import tracker
+
+def test_failed_batch_restores_deleted_category_in_place():
+    expenses, budgets = tracker.Expenses(), {}
+    categories = tracker.Categories({"food": ["bread"], "home": ["rent", "bread"], "fun": []})
+    before = (list(categories.items()), categories.category_of("bread"))
+    operations = [
+        {"op": "delete_category", "category": "home"},
+        {"op": "add_expense", "month": "2025-01", "name": "rent", "amount": 900},
+        # No such month: fails while running, after the others were applied
+        {"op": "update_expense", "month": "2030-05", "name": "rent", "amount": 1},
+    ]
+    with pytest.raises(ValueError, match="Operation 2"):
+        tracker.apply_batch(expenses, categories, budgets, operations)
+    assert (list(categories.items()), categories.category_of("bread")) == before
+    assert "2025-01" not in expenses
+
+def test_batch_runs_each_operation():
+    expenses, categories, budgets = tracker.Expenses(), tracker.Categories(), {}
+    results = tracker.apply_batch(expenses, categories, budgets, [
+        {"op": "add_expense", "month": "2025-01", "name": "rent", "amount": 900},
+        {"op": "add_expense_to_category", "category": "home", "name": "rent"},
+        {"op": "set_budget", "month": "2025-01", "amount": 1000},
+        {"op": "delete_expense", "month": "2025-01", "name": "rent"},
+    ])
+    assert results[0] == {"month": "2025-01", "name": "rent", "amount": 900.0}
+    assert categories == {"home": ["rent"]} and budgets == {"2025-01": 1000.0}
+    assert results[3]["amount"] is None
+    with pytest.raises(ValueError, match="unknown or missing op"):
+        tracker.apply_batch(expenses, categories, budgets, [{"op": "save_data"}])
+
+def test_failed_batch_moves_the_version_past_any_seen_midway(monkeypatch):
+    expenses, categories, budgets = tracker.Expenses(), tracker.Categories(), {}
+    seen = []
+
+    def add_expense(*args):
+        tracker.add_expense(*args)
+        seen.append(tracker.data_version())
+
+    monkeypatch.setitem(tracker.BATCH_OPERATIONS, "add_expense",
+                        ("expenses", add_expense, ("month", "name", "amount")))
+    before = tracker.data_version()
+    with pytest.raises(ValueError):
+        tracker.apply_batch(expenses, categories, budgets, [
+            {"op": "add_expense", "month": "2025-01", "name": "rent", "amount": 900},
+            {"op": "add_expense", "month": "2025-01", "name": "food", "amount": 10},
+            {"op": "update_expense", "month": "2030-05", "name": "rent", "amount": 1},
+        ])
+    assert tracker.data_version() > max([before] + seen)
+
+@pytest.mark.parametrize("amount", [True, False, "12", None, [1], {"value": 1}])
+def test_batch_amount_must_be_a_number(amount):
+    expenses, categories, budgets = tracker.Expenses(), tracker.Categories(), {}
+    with pytest.raises(ValueError, match="amount must be a number"):
+        tracker.apply_batch(expenses, categories, budgets, [
+            {"op": "add_expense", "month": "2025-01", "name": "rent", "amount": amount}])
+    assert "2025-01" not in expenses
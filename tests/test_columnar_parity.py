@@ -0,0 +1,97 @@
+"""The columnar engine answers every analytics query as the SQLite one does"""
+import pytest
+
+pytest.importorskip("numpy")
+
+import tracker
+import analytics
+import columnar
+from conftest import close
+
+YEAR_RANGES = [
+    {},
+    {"from_year": 2025, "to_year": 2025},
+    {"from_year": 2025},
+    {"to_year": 2024},
+    {"from_year": 2030},
+]
+
+SEARCHES = [
+    {},
+    {"query": "item 12"},
+    {"query": "ite"},
+    {"query": "x3", "category": "cat1"},
+    {"category": "Uncategorized"},
+    {"month": "2025-03", "min_amount": 100, "max_amount": 200},
+    {"query": "item 1", "from_year": 2025, "to_year": 2026},
+    {"to_year": 2024, "min_amount": 450},
+]
+
+@pytest.fixture(scope="module")
+def engines(dataset):
+    """(SQLite connection, columnar frame) over the same data"""
+    # Rebuild the frame from this dataset, whatever an earlier test synced
+    tracker.mark_full_resync()
+    columnar.sync_data_to_analytics(*dataset)
+    with analytics.snapshot() as (conn, _), columnar.snapshot() as (frame, _):
+        yield conn, frame
+
+def by_category(rows):
+    # Equal totals may come out in either order
+    return sorted(rows, key=lambda row: row["category"])
+
+@pytest.mark.parametrize("years", YEAR_RANGES)
+@pytest.mark.parametrize("name", ["get_monthly_trends", "get_spending_insights",
+                                  "get_analytics_summary", "get_expense_trends_by_category"])
+def test_same_results(engines, name, years):
+    conn, frame = engines
+    expected = getattr(analytics, name)(**years, conn=conn)
+    assert close(expected, getattr(columnar, name)(**years, conn=frame))
+
+@pytest.mark.parametrize("years", YEAR_RANGES)
+def test_same_category_breakdown(engines, years):
+    conn, frame = engines
+    expected = analytics.get_category_breakdown(**years, conn=conn)
+    actual = columnar.get_category_breakdown(**years, conn=frame)
+    assert close(by_category(expected), by_category(actual))
+    assert [row["total"] for row in actual] == sorted((row["total"] for row in actual), reverse=True)
+
+@pytest.mark.parametrize("years", YEAR_RANGES)
+@pytest.mark.parametrize("category", ["cat3", "Uncategorized", "missing"])
+def test_same_category_trends(engines, category, years):
+    conn, frame = engines
+    expected = analytics.get_expense_trends_by_category(category, **years, conn=conn)
+    assert close(expected, columnar.get_expense_trends_by_category(category, **years, conn=frame))
+
+def all_pages(engine, conn, filters, limit):
+    rows, cursor, pages = [], None, 0
+    while True:
+        page = engine.search_expenses(**filters, limit=limit, cursor=cursor, conn=conn)
+        assert len(page["results"]) <= limit
+        rows += page["results"]
+        pages += 1
+        cursor = page["next_cursor"]
+        if not cursor:
+            return rows, pages
+
+@pytest.mark.parametrize("filters", SEARCHES)
+def test_same_search_results_across_pages(engines, filters):
+    conn, frame = engines
+    expected, pages = all_pages(analytics, conn, filters, 500)
+    actual, _ = all_pages(columnar, frame, filters, 500)
+
+    def key(row):
+        return row["month"], row["expense_name"], row["amount"], row["category"]
+    # Rows added in the same second may tie on date_added; the set must match
+    assert sorted(map(key, expected)) == sorted(map(key, actual))
+    assert len({key(row) for row in actual}) == len(actual)
+    if len(expected) > 500:
+        assert pages > 1
+
+def test_search_page_limits(engines):
+    conn, frame = engines
+    for engine, handle in ((analytics, conn), (columnar, frame)):
+        page = engine.search_expenses(query="item", limit=7, conn=handle)
+        assert len(page["results"]) == 7 and page["next_cursor"]
+        with pytest.raises(ValueError):
+            engine.search_expenses(cursor="not a cursor", conn=handle)
@@ -0,0 +1,30 @@
+"""Publishing data deltas to event stream subscribers"""
+import threading
+import time
+
+def test_changes_survive_a_failed_build(client, monkeypatch):
+    import app
+    import events
+    import tracker
+
+    subscriber = events.subscribe(app.build_delta, app.data_etag, tracker.data_version())
+    # Earlier tests may have left a full resync pending, which skips _build
+    events.publish()
+    failed = threading.Event()
+
+    def failing(changes):
+        failed.set()
+        raise RuntimeError("build failed")
+
+    try:
+        monkeypatch.setattr(events, "_build", failing)
+        client.post("/add_expense", data={"month": "2026-03", "name": "kept", "amount": "7"})
+        assert failed.wait(5)
+        monkeypatch.setattr(events, "_build", app.build_delta)
+        events.notify()
+        end = time.monotonic() + 5
+        while not any("event: delta" in text and "kept" in text for text in list(subscriber.pending)):
+            assert time.monotonic() < end, list(subscriber.pending)
+            time.sleep(0.05)
+    finally:
+        events.unsubscribe(subscriber)
@@ -0,0 +1,76 @@
+"""Streaming CSV imports and the analytics bulk load"""
+import io
+
+import tracker
+import analytics
+from conftest import close, generate, load_from_disk
+
+def analytics_state():
+    results, cursor = [], None
+    while True:
+        page = analytics.search_expenses(query="item", limit=1000, cursor=cursor)
+        results += page["results"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    return {
+        "summary": analytics.get_analytics_summary(),
+        "trends": analytics.get_expense_trends_by_category(),
+        "search": sorted((row["month"], row["expense_name"], row["amount"], row["category"])
+                         for row in results),
+    }
+
+def test_bulk_load_matches_full_sync(fresh_db):
+    expenses, categories, budgets = tracker.Expenses(), tracker.Categories(), {}
+    generate(expenses, categories, count=500, names=100)
+    tracker.mark_full_resync()
+    analytics.sync_data_to_analytics(expenses, categories)
+
+    existing = [(month, name) for month in sorted(expenses) for name in expenses[month]][:40]
+    lines = ["Month,Expense,Amount"]
+    lines += [f"{month},{name},7.25" for month, name in existing]
+    lines += [f"2025-0{1 + i % 9},item new {i},{i}.5" for i in range(120)]
+    # A later row for the same expense and month wins
+    lines += ["2025-01,item new 0,99.0"]
+    with analytics.bulk_loader(categories) as load:
+        report = tracker.import_csv_stream(expenses, categories, budgets, "expenses",
+                                           io.StringIO("\n".join(lines) + "\n"),
+                                           on_chunk=load, chunk_size=50)
+    assert report["imported"] == len(lines) - 1 and report["rejected"] == 0
+    assert expenses["2025-01"]["item new 0"] == 99.0
+    loaded = analytics_state()
+
+    tracker.mark_full_resync()
+    analytics.sync_data_to_analytics(expenses, categories)
+    assert close(loaded, analytics_state())
+
+def test_bulk_load_lets_syncs_in_between_batches(fresh_db):
+    expenses, categories, budgets = tracker.Expenses(), tracker.Categories(), {}
+    tracker.mark_full_resync()
+    analytics.sync_data_to_analytics(expenses, categories)
+    synced = []
+
+    def on_chunk(rows, apply):
+        load(rows, apply)
+        # Another request's sync runs between batches instead of waiting for the import
+        tracker.add_expense(expenses, "2025-02", f"typed {len(synced)}", 1.0)
+        synced.append(analytics.sync_data_to_analytics(expenses, categories))
+
+    text = "Month,Expense,Amount\n" + "".join(f"2025-01,item {i},2.0\n" for i in range(30))
+    with analytics.bulk_loader(categories) as load:
+        tracker.import_csv_stream(expenses, categories, budgets, "expenses", io.StringIO(text),
+                                  on_chunk=on_chunk, chunk_size=10)
+    assert synced == sorted(synced) and synced[-1] == tracker.data_version()
+    assert analytics.get_monthly_trends() == [
+        {"month": "2025-01", "total": 60.0}, {"month": "2025-02", "total": 3.0}]
+
+def test_out_of_range_amount_is_rejected_with_its_line(workdir):
+    expenses, categories, budgets = tracker.Expenses(), tracker.Categories(), {}
+    text = "Month,Expense,Amount\n2023-07,rent,900\n2023-07,huge,1e300\n2023-07,food,12.5\n"
+    report = tracker.import_csv_stream(expenses, categories, budgets, "expenses", io.StringIO(text))
+    assert report["imported"] == 2 and report["rejected"] == 1
+    assert report["errors"][0]["line"] == 3 and "1e+300" in report["errors"][0]["error"]
+    assert tracker.plain(expenses["2023-07"]) == {"food": 12.5, "rent": 900.0}
+    # The rows that were applied were saved too
+    tracker.save_data(expenses, categories, budgets, durable=True)
+    assert load_from_disk(workdir)[0]["2023-07"] == {"food": 12.5, "rent": 900.0}
@@ -0,0 +1,24 @@
+"""Write-behind persistence of tracker mutations"""
+import os
+import time
+
+import pytest
+
+import tracker
+
+pytestmark = pytest.mark.skipif(tracker.SHARED_STATE or not tracker.WRITE_BEHIND,
+                                reason="needs the write-behind writer")
+
+def test_durable_save_reports_write_errors(tmp_path):
+    expenses, categories, budgets = tracker.Expenses(), tracker.Categories(), {}
+    filename = str(tmp_path / "missing" / "data.json")
+    tracker.add_expense(expenses, "2025-01", "rent", 100.0)
+    start = time.monotonic()
+    with pytest.raises(OSError):
+        tracker.save_data(expenses, categories, budgets, filename, durable=True)
+    assert time.monotonic() - start < tracker.DURABLE_TIMEOUT
+
+    # The writer kept the records and saves them once it can
+    (tmp_path / "missing").mkdir()
+    assert tracker.flush(timeout=10)
+    assert os.path.exists(tracker.journal_path(filename))
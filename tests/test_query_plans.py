@@ -0,0 +1,76 @@
+"""EXPLAIN QUERY PLAN checks for the analytics read queries"""
+import pytest
+
+import analytics
+
+YEAR_RANGES = [{}, {"from_year": 2025, "to_year": 2025}, {"from_year": 2025}, {"to_year": 2024}]
+
+# Ranked by a summed total, so they sort the (at most a few hundred) summary
+# rows they read; no index can hand those out in order
+RANKED = ("category_breakdown", "insights_highest_month", "insights_top_category")
+
+def captured(monkeypatch, call):
+    """(name, EXPLAIN QUERY PLAN) of every query call() runs"""
+    seen = []
+    query = analytics._query
+
+    def record(conn, name, sql, params=()):
+        seen.append((name, sql, tuple(params)))
+        return query(conn, name, sql, params)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(analytics, "_query", record)
+        call()
+    return [(name, analytics.explain(sql, params)) for name, sql, params in seen]
+
+def summary_reads():
+    for years in YEAR_RANGES:
+        analytics.get_analytics_summary(**years)
+        analytics.get_expense_trends_by_category(**years)
+        analytics.get_expense_trends_by_category("cat3", **years)
+
+def test_period_ordered_reads_need_no_sort(dataset, monkeypatch):
+    plans = [(name, plan) for name, plan in captured(monkeypatch, summary_reads)
+             if not name.startswith(RANKED)]
+    assert {"monthly_trends", "category_trends", "category_trends_all"} <= {name for name, _ in plans}
+    for name, plan in plans:
+        assert not any("TEMP B-TREE" in step for step in plan), (name, plan)
+
+def test_ranked_reads_only_sort_for_order_by(dataset, monkeypatch):
+    for name, plan in captured(monkeypatch, summary_reads):
+        if name.startswith(RANKED):
+            assert [step for step in plan if "TEMP B-TREE" in step] in (
+                [], ["USE TEMP B-TREE FOR ORDER BY"]), (name, plan)
+
+def test_summary_reads_stay_off_expense_table(dataset, monkeypatch):
+    for name, plan in captured(monkeypatch, summary_reads):
+        # The summary tables are WITHOUT ROWID: a read never leaves the primary key
+        assert not any("expense_analytics" in step or "USING INDEX" in step
+                       for step in plan), (name, plan)
+
+def test_search_pages_read_in_date_order(dataset, monkeypatch):
+    def pages():
+        page = analytics.search_expenses(limit=10)
+        analytics.search_expenses(limit=10, cursor=page["next_cursor"])
+        analytics.search_expenses(month="2025-03")
+
+    for name, plan in captured(monkeypatch, pages):
+        # The cursor page seeks into the index where the last page stopped
+        assert len(plan) == 1 and "USING INDEX idx_expense_analytics_date_added" in plan[0], plan
+
+@pytest.mark.parametrize("filters", [
+    {"from_year": 2025, "to_year": 2025},
+    {"category": "cat1"},
+    {"min_amount": 100, "max_amount": 200},
+    {"query": "item 12"},
+])
+def test_filtered_search_uses_an_index(dataset, monkeypatch, filters):
+    # A selective filter is read through its index and only its matches are sorted
+    for name, plan in captured(monkeypatch, lambda: analytics.search_expenses(**filters)):
+        table_steps = [step for step in plan if "expense_analytics" in step]
+        assert table_steps and all(step.startswith("SEARCH") for step in table_steps), plan
+
+@pytest.mark.parametrize("table", sorted(analytics.AGGREGATE_TABLES))
+def test_summary_rebuild_uses_covering_index(dataset, table):
+    plan = analytics.explain(analytics._aggregate_select(table))
+    assert len(plan) == 1 and "USING COVERING INDEX" in plan[0], plan
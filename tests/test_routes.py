@@ -0,0 +1,135 @@
+"""Request handling in the Flask routes"""
+import os
+import time
+
+import pytest
+
+@pytest.mark.parametrize("path", [
+    "/analytics/monthly_trends",
+    "/analytics/category_breakdown",
+    "/analytics/insights",
+    "/analytics/category_trends",
+    "/analytics/search_expenses",
+    "/analytics/get_analytics_summary",
+    "/check_all_budgets",
+])
+def test_bad_year_is_a_client_error(client, path):
+    response = client.get(path + "?year=abc")
+    assert response.status_code == 400
+    assert "abc" in response.get_json()["error"]
+    assert client.get(path + "?from_year=2025&to_year=2025").status_code == 200
+
+def test_old_export_files_are_removed(client, tmp_path, monkeypatch):
+    import app
+    monkeypatch.setattr(app, "EXPORT_DIR", str(tmp_path))
+    old, new = tmp_path / "old", tmp_path / "new"
+    old.write_text("x")
+    new.write_text("x")
+    stale = time.time() - app.EXPORT_MAX_AGE - 60
+    os.utime(old, (stale, stale))
+    job = client.get("/export_to_csv?kind=budgets&wait=30").get_json()
+    assert job["status"] == "done"
+    assert not old.exists() and new.exists()
+    assert client.get(job["download"]).status_code == 200
+    os.utime(tmp_path / job["id"], (stale, stale))
+    app.remove_old_exports()
+    assert client.get(job["download"]).status_code == 404
+
+def search_pages(client, query, limit, cursor=None):
+    """Every page of a search from cursor on, as lists of ids"""
+    pages = []
+    while True:
+        path = f"/analytics/search_expenses?query={query}&limit={limit}"
+        body = client.get(path + (f"&cursor={cursor}" if cursor else "")).get_json()
+        pages.append([row["id"] for row in body["results"]])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+
+def test_search_pages_are_stable(client):
+    for index in range(25):
+        client.post("/add_expense", data={"month": "2026-04", "name": f"pagestable {index}",
+                                          "amount": str(index + 1)})
+    pages = search_pages(client, "pagestable", 10)
+    assert [len(page) for page in pages] == [10, 10, 5]
+    ids = [row_id for page in pages for row_id in page]
+    assert len(set(ids)) == 25
+    rows = client.get("/analytics/search_expenses?query=pagestable&limit=100").get_json()["results"]
+    assert [row["id"] for row in rows] == ids
+    assert all((a["date_added"], a["id"]) > (b["date_added"], b["id"]) for a, b in zip(rows, rows[1:]))
+    assert search_pages(client, "pagestable", 10) == pages
+
+def test_search_cursor_survives_an_insert(client):
+    for index in range(12):
+        client.post("/add_expense", data={"month": "2026-05", "name": f"pageinsert {index}",
+                                          "amount": "1"})
+    first = client.get("/analytics/search_expenses?query=pageinsert&limit=5").get_json()
+    client.post("/add_expense", data={"month": "2026-05", "name": "pageinsert late",
+                                      "amount": "1"})
+    rest = search_pages(client, "pageinsert", 5, first["next_cursor"])
+    before = [row["id"] for row in first["results"]] + [i for page in rest for i in page]
+    assert len(before) == len(set(before)) == 12
+    # The new row is newest, so it starts a fresh first page and not an old cursor's
+    fresh = client.get("/analytics/search_expenses?query=pageinsert&limit=5").get_json()
+    assert fresh["results"][0]["expense_name"] == "pageinsert late"
+    assert fresh["results"][0]["id"] not in before
+
+def test_update_in_unknown_month_is_not_found(client):
+    response = client.post("/update_expense/1999-01/rent", data={"amount": "5"})
+    assert response.status_code == 404
+    assert "1999-01" in response.get_json()["error"]
+
+def test_batch_rejects_a_boolean_amount(client):
+    response = client.post("/batch", json=[
+        {"op": "add_expense", "month": "2026-07", "name": "flag", "amount": True}])
+    assert response.status_code == 400
+    assert "amount must be a number" in response.get_json()["error"]
+
+def test_batch_version_matches_bootstrap(client):
+    response = client.post("/batch", json=[
+        {"op": "add_expense", "month": "2026-07", "name": "rent", "amount": 900}])
+    assert response.status_code == 200
+    bootstrap = client.get("/bootstrap")
+    assert response.get_json()["version"] == bootstrap.get_json()["version"]
+
+def cache_lookups(result):
+    import app
+    return app.RESPONSE_CACHE_LOOKUPS._values.get((result,), 0)
+
+def test_response_cache_is_dropped_when_the_data_changes(client):
+    first = client.get("/list_budgets")
+    hits = cache_lookups("hit")
+    assert client.get("/list_budgets").get_data() == first.get_data()
+    assert cache_lookups("hit") == hits + 1
+    client.post("/set_budget", data={"month": "2026-08", "amount": "321"})
+    misses = cache_lookups("miss")
+    after = client.get("/list_budgets")
+    assert cache_lookups("miss") == misses + 1
+    assert after.get_json()["2026-08"] == 321.0
+    assert after.headers["ETag"] != first.headers["ETag"]
+
+def test_bootstrap_etag_revalidates_until_a_write(client):
+    first = client.get("/bootstrap")
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+    unchanged = client.get("/bootstrap", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304 and unchanged.get_data() == b""
+    client.post("/add_expense", data={"month": "2026-08", "name": "etag", "amount": "3"})
+    changed = client.get("/bootstrap", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.get_json()["version"] != first.get_json()["version"]
+    assert client.get("/bootstrap", headers={"If-None-Match": changed.headers["ETag"]}).status_code == 304
+
+def test_failed_import_reports_its_own_error_when_saving_fails(client, monkeypatch):
+    import tracker
+
+    def save_data(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(tracker, "save_data", save_data)
+    body = b"Month,Expense,Amount\n2026-09,bad,\xff\xfe\n"
+    job = client.post("/import_from_csv?kind=expenses&wait=30", data=body,
+                      content_type="text/csv").get_json()
+    assert job["status"] == "failed"
+    assert "decode" in job["error"] and "disk full" not in job["error"]
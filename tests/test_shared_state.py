@@ -0,0 +1,98 @@
+"""Shared-state mode: workers in separate processes writing one data.json"""
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from conftest import SERVER_DIR, load_from_disk
+
+# Reads commands as JSON lines and answers each with the data as it then sees it
+WORKER = """
+import sys, json, tracker
+expenses, categories, budgets = tracker.load_data()
+for line in sys.stdin:
+    command, *args = json.loads(line)
+    if command == "add":
+        tracker.add_expense(expenses, *args)
+    elif command == "budget":
+        tracker.set_budget(budgets, *args)
+    elif command == "batch":
+        try:
+            tracker.apply_batch(expenses, categories, budgets, args)
+        except ValueError:
+            pass
+    tracker.refresh()
+    print(json.dumps({
+        "version": tracker.data_version(),
+        "expenses": tracker.list_expenses(expenses),
+        "totals": {period: tracker.monthly_summary(expenses, period) for period in expenses},
+        "budgets": budgets,
+    }), flush=True)
+"""
+
+ENV = {"TRACKER_SHARED_STATE": "1", "TRACKER_COMPACT_EVERY": "20"}
+
+class Worker:
+    def __init__(self, directory):
+        self.process = subprocess.Popen(
+            [sys.executable, "-c", WORKER], cwd=directory, text=True,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            env=dict(os.environ, PYTHONPATH=SERVER_DIR, **ENV))
+
+    def send(self, *command):
+        self.process.stdin.write(json.dumps(command) + "\n")
+        self.process.stdin.flush()
+        line = self.process.stdout.readline()
+        assert line, "worker exited"
+        return json.loads(line)
+
+    def close(self):
+        self.process.stdin.close()
+        assert self.process.wait(10) == 0
+
+@pytest.fixture
+def workers(tmp_path):
+    started = [Worker(tmp_path), Worker(tmp_path)]
+    yield started
+    for worker in started:
+        worker.close()
+
+def test_workers_catch_up_with_each_other(workers, tmp_path):
+    first, second = workers
+    for index in range(30):
+        writer = first if index % 3 else second
+        writer.send("add", f"2026-0{index % 4 + 1}", f"item {index}", index + 0.25)
+    first.send("budget", "2026-01", 500.0)
+    seen = [first.send("refresh"), second.send("refresh")]
+    assert seen[0] == seen[1]
+    assert seen[0]["version"] > 0
+    assert sum(len(month) for month in seen[0]["expenses"].values()) == 30
+    assert seen[0]["totals"]["2026-01"] == pytest.approx(
+        sum(index + 0.25 for index in range(0, 30, 4)))
+    assert seen[0]["budgets"] == {"2026-01": 500.0}
+    # Compactions along the way left the same data on disk
+    expenses, _, budgets = load_from_disk(tmp_path, ENV)
+    assert expenses == seen[0]["expenses"] and budgets == seen[0]["budgets"]
+
+def test_a_worker_sees_writes_made_after_it_loaded(workers):
+    first, second = workers
+    before = second.send("refresh")
+    after = first.send("add", "2026-05", "rent", 900.0)
+    caught_up = second.send("refresh")
+    assert caught_up["version"] == after["version"] > before["version"]
+    assert caught_up["totals"]["2026-05"] == 900.0
+
+def test_a_failed_batch_neither_rewinds_the_version_nor_hides_later_writes(workers):
+    first, second = workers
+    before = first.send("add", "2026-06", "rent", 900.0)
+    failed = first.send("batch",
+                        {"op": "add_expense", "month": "2026-06", "name": "food", "amount": 10},
+                        {"op": "add_expense", "month": "2026-06", "name": "gym", "amount": 30},
+                        {"op": "update_expense", "month": "2030-01", "name": "x", "amount": 1})
+    assert failed["version"] > before["version"]
+    assert failed["expenses"] == before["expenses"]
+    written = second.send("add", "2026-06", "water", 20.0)
+    assert written["version"] > failed["version"]
+    assert first.send("refresh") == written
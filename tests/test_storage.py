@@ -0,0 +1,118 @@
+"""Partitioned expense storage and its name -> periods index"""
+import json
+import time
+import threading
+from array import array
+
+import pytest
+
+import tracker
+
+def load(path):
+    """(expenses, categories, budgets) from path, and the periods read from disk"""
+    loaded = []
+    read = tracker._read_partition
+
+    def loader(filename, period):
+        loaded.append(period)
+        return read(filename, period)
+
+    data = json.loads(path.read_text())
+    expenses = tracker.Expenses(loader=lambda period: loader(str(path), period),
+                                manifest=data["partitions"], name_index=data.get("names"))
+    return expenses, tracker.Categories(data["categories"]), loaded
+
+def write(path, months=24):
+    expenses, categories, budgets = tracker.Expenses(), tracker.Categories(), {}
+    for index in range(months):
+        period = f"{2024 + index // 12}-{index % 12 + 1:02d}"
+        for item in range(50):
+            tracker.add_expense(expenses, period, f"item {index}-{item}", 1.0)
+        tracker.add_expense(expenses, period, "rent", 900.0)
+    tracker.add_expense(expenses, "2025-03", "gym", 30.0)
+    tracker.add_expense(expenses, "2024-07", "gym", 30.0)
+    tracker.add_expense_to_category(categories, "fitness", "gym")
+    tracker.compact(expenses, categories, budgets, str(path))
+
+def test_category_lookup_reads_only_partitions_holding_members(tmp_path):
+    path = tmp_path / "data.json"
+    write(path)
+    expenses, categories, loaded = load(path)
+    assert tracker.category_expenses(expenses, categories, "fitness") == {
+        "2024-07": {"gym": 30.0}, "2025-03": {"gym": 30.0}}
+    assert sorted(loaded) == ["2024-07", "2025-03"]
+    assert list(tracker.iter_expenses(expenses, categories, category="fitness", month="2025-03")) == [
+        ("2025-03", "gym", 30.0)]
+    assert sorted(loaded) == ["2024-07", "2025-03"]
+
+def test_name_index_follows_changes(tmp_path):
+    path = tmp_path / "data.json"
+    write(path)
+    expenses, categories, loaded = load(path)
+    tracker.delete_expense(expenses, "2024-07", "gym")
+    tracker.add_expense(expenses, "2026-01", "gym", 31.0)
+    del expenses["2025-03"]
+    assert tracker.category_expenses(expenses, categories, "fitness") == {"2026-01": {"gym": 31.0}}
+    expenses.check_invariants()
+
+    tracker.compact(expenses, categories, {}, str(path))
+    expenses, categories, loaded = load(path)
+    assert tracker.category_expenses(expenses, categories, "fitness") == {"2026-01": {"gym": 31.0}}
+    assert loaded == ["2026-01"]
+
+def test_snapshot_without_name_index_is_indexed_on_load(tmp_path):
+    path = tmp_path / "data.json"
+    write(path)
+    data = json.loads(path.read_text())
+    del data["names"]
+    path.write_text(json.dumps(data))
+    expenses, categories, loaded = load(path)
+    # Every partition is read once to build the index, none is kept
+    assert len(loaded) == 24 and not expenses._partitions
+    assert tracker.category_expenses(expenses, categories, "fitness") == {
+        "2024-07": {"gym": 30.0}, "2025-03": {"gym": 30.0}}
+
+class PausingCents(array):
+    """A cents column that pauses between a write's two steps"""
+    midway = None
+
+    def insert(self, index, value):
+        self.midway.set()
+        time.sleep(0.2)
+        super().insert(index, value)
+
+    def pop(self, index):
+        self.midway.set()
+        time.sleep(0.2)
+        return super().pop(index)
+
+@pytest.mark.parametrize("write, args, after", [
+    ("set_amount", ("a", 1.0), [("a", 1.0), ("b", 2.0), ("d", 4.0)]),
+    ("delete_amount", ("b",), [("d", 4.0)]),
+])
+def test_partition_reads_never_see_half_a_write(write, args, after):
+    expenses = tracker.Expenses({"2025-01": {"b": 2.0, "d": 4.0}})
+    partition = expenses["2025-01"]
+    partition._cents = PausingCents("q", partition._cents)
+    partition._cents.midway = threading.Event()
+    writer = threading.Thread(target=getattr(expenses, write), args=("2025-01", *args))
+    writer.start()
+    assert partition._cents.midway.wait(5)
+    # Names and cents moved in step, or the read waited for the write
+    assert partition.get("d") == 4.0
+    assert partition.items() == after
+    writer.join()
+
+def test_migrated_totals_match_the_partitions(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracker, "_shared", None)
+    path = tmp_path / "data.json"
+    amounts = {"a": 12.333, "b": 0.105, "c": 7.777, "d": 0.1, "e": 0.2}
+    path.write_text(json.dumps({"expenses": {"january": amounts}, "categories": {}, "budgets": {}}))
+    expenses, _, _ = tracker.load_data(str(path))
+    period = next(iter(expenses.manifest()))
+    cents = sum(tracker.to_cents(amount) for amount in amounts.values())
+    assert tracker.to_cents(tracker.monthly_summary(expenses, period)) == cents
+    assert not expenses._partitions
+    # The same once the partition is read back from disk
+    assert tracker.plain(expenses[period])
+    expenses.check_invariants()
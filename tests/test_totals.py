@@ -0,0 +1,67 @@
+"""Running per-period totals, which every mutator rechecks under CHECK_INVARIANTS"""
+import io
+
+import pytest
+
+import tracker
+
+def assert_totals(expenses):
+    """Each period's running total and count match its amounts"""
+    for period, month in tracker.list_expenses(expenses).items():
+        assert expenses.count(period) == len(month)
+        assert tracker.to_cents(expenses.total(period)) == sum(map(tracker.to_cents, month.values()))
+    expenses.check_invariants()
+
+@pytest.fixture
+def data(workdir):
+    expenses, categories, budgets = tracker.Expenses(), tracker.Categories(), {}
+    tracker.add_expense(expenses, "2026-01", "rent", 900.0)
+    tracker.add_expense(expenses, "2026-01", "food", 12.34)
+    tracker.add_expense(expenses, "2026-02", "food", 0.1)
+    return expenses, categories, budgets
+
+def test_checks_are_on():
+    assert tracker.CHECK_INVARIANTS
+
+def test_add(data):
+    expenses = data[0]
+    tracker.add_expense(expenses, "2026-01", "gym", 0.2)
+    tracker.add_expense(expenses, "2026-03", "gym", 30.0)
+    assert_totals(expenses)
+    assert expenses.total("2026-01") == pytest.approx(912.54)
+
+def test_update(data):
+    expenses = data[0]
+    tracker.update_expense(expenses, "2026-01", "food", 0.07)
+    tracker.update_expense(expenses, "2026-02", "food", 99.99)
+    assert_totals(expenses)
+    assert expenses.total("2026-01") == pytest.approx(900.07)
+
+def test_delete(data):
+    expenses = data[0]
+    tracker.delete_expense(expenses, "2026-01", "rent")
+    tracker.delete_expense(expenses, "2026-02", "food")
+    tracker.delete_expense(expenses, "2026-02", "missing")
+    assert_totals(expenses)
+    assert expenses.total("2026-01") == pytest.approx(12.34)
+
+def test_import(data):
+    text = "Month,Expense,Amount\n2026-01,rent,950\n2026-01,water,0.3\n2026-04,rent,1000\n"
+    report = tracker.import_csv_stream(*data, "expenses", io.StringIO(text))
+    assert report["imported"] == 3
+    assert_totals(data[0])
+    assert data[0].total("2026-01") == pytest.approx(962.64)
+
+def test_clear(data):
+    expenses = data[0]
+    tracker.clear_expenses(*data)
+    assert_totals(expenses)
+    assert expenses.total("2026-01") == 0 and expenses.count("2026-01") == 0
+    tracker.add_expense(expenses, "2026-01", "rent", 900.0)
+    assert_totals(expenses)
+
+def test_a_drifted_total_fails_the_next_mutation(data):
+    expenses = data[0]
+    expenses._totals["2026-01"][0] += 1
+    with pytest.raises(AssertionError, match="total mismatch"):
+        tracker.add_expense(expenses, "2026-02", "gym", 30.0)